@@ -21,6 +21,7 @@ setup(
     entry_points={
         'console_scripts': [
             'voletron=voletron.main:main',
+            'voletron-query=voletron.query:main',
         ],
     },
 )
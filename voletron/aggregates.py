@@ -0,0 +1,110 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Compact, array-backed collection of group co-dwell aggregates.
+
+The per-bin group aggregates are read by several output tables, so analyzers
+can compute them once for all of those tables (see SharedAggregates) and hand
+out a GroupChamberAggregates.  It stores its fields in parallel typed columns, and
+yields GroupDwellAggregate records on demand.  (Pair aggregates are kept in a
+pair_matrix.PairMatrix.)
+"""
+
+import threading
+from array import array
+from typing import Callable, Dict, Iterator, List, Optional
+
+from voletron.tag_index import TagIndex
+from voletron.types import ChamberName, DurationSeconds, GroupDwellAggregate, GroupMask, TagID
+
+
+class GroupChamberAggregates:
+    """Total count and duration of co-dwells per (group, chamber)."""
+
+    def __init__(
+        self,
+        tag_index: TagIndex,
+        totals_by_group_and_chamber: Dict[GroupMask, Dict[ChamberName, List]],
+    ):
+        """
+        Args:
+            totals_by_group_and_chamber: group -> chamber -> [count, duration].
+                Aggregates are listed in the iteration order of this mapping.
+        """
+        self.groups: List[GroupMask] = []
+        # The members of each distinct group, shared between its aggregates.
+        self._members: List[List[TagID]] = []
+        self.chambers: List[ChamberName] = []
+        self.group_codes = array("I")
+        self.counts = array("q")
+        self.durations = array("d")
+        for (group, chamber_totals) in totals_by_group_and_chamber.items():
+            group_code = len(self.groups)
+            self.groups.append(group)
+            self._members.append(tag_index.members(group))
+            for (chamber, (count, duration)) in chamber_totals.items():
+                self.group_codes.append(group_code)
+                self.chambers.append(chamber)
+                self.counts.append(count)
+                self.durations.append(duration)
+
+    def __len__(self) -> int:
+        return len(self.counts)
+
+    def __getitem__(self, i: int) -> GroupDwellAggregate:
+        return GroupDwellAggregate(
+            tag_ids=self._members[self.group_codes[i]],
+            chamber=self.chambers[i],
+            count=self.counts[i],
+            duration_seconds=DurationSeconds(self.durations[i]),
+        )
+
+    def __iter__(self) -> Iterator[GroupDwellAggregate]:
+        for i in range(len(self.counts)):
+            yield self[i]
+
+
+
+class SharedAggregates:
+    """Holds a bin's GroupChamberAggregates while output tables read them.
+
+    Between hold() and release(), the first request computes the aggregates
+    and later ones share them; otherwise each request computes them afresh.
+    The output tables read each bin in one sweep (see
+    voletron.output.output._sweep_bins), which holds the bin's aggregates only
+    while it is on that bin.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._held = False
+        self._aggregates: Optional[GroupChamberAggregates] = None
+
+    def hold(self) -> None:
+        with self._lock:
+            self._held = True
+
+    def release(self) -> None:
+        with self._lock:
+            self._held = False
+            self._aggregates = None
+
+    def get(self, compute: Callable[[], GroupChamberAggregates]) -> GroupChamberAggregates:
+        """The shared aggregates, calling `compute` for them if need be."""
+        with self._lock:
+            if not self._held:
+                return compute()
+            if self._aggregates is None:
+                self._aggregates = compute()
+            return self._aggregates
@@ -0,0 +1,70 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+
+from voletron.aggregates import GroupChamberAggregates, SharedAggregates
+from voletron.tag_index import TagIndex
+from voletron.types import ChamberName, GroupDwellAggregate, TagID
+
+tag_index = TagIndex([TagID("a"), TagID("b"), TagID("c")])
+
+
+class TestGroupChamberAggregates(unittest.TestCase):
+    def test_aggregates(self):
+        ab = tag_index.mask([TagID("a"), TagID("b")])
+        c = tag_index.mask([TagID("c")])
+        aggregates = GroupChamberAggregates(
+            tag_index,
+            {
+                ab: {ChamberName("c1"): [2, 150.0], ChamberName("c2"): [1, 5.0]},
+                c: {ChamberName("c1"): [1, 10.0]},
+            },
+        )
+        self.assertEqual(len(aggregates), 3)
+        self.assertEqual(
+            list(aggregates),
+            [
+                GroupDwellAggregate(["a", "b"], "c1", 2, 150.0),
+                GroupDwellAggregate(["a", "b"], "c2", 1, 5.0),
+                GroupDwellAggregate(["c"], "c1", 1, 10.0),
+            ],
+        )
+        # Aggregates of the same group share its member list.
+        self.assertIs(aggregates[0].tag_ids, aggregates[1].tag_ids)
+
+
+class TestSharedAggregates(unittest.TestCase):
+    def test_shared_while_held(self):
+        computed = []
+
+        def compute():
+            computed.append(GroupChamberAggregates(tag_index, {}))
+            return computed[-1]
+
+        shared = SharedAggregates()
+        self.assertIsNot(shared.get(compute), shared.get(compute))
+        self.assertEqual(len(computed), 2)
+
+        shared.hold()
+        results = [shared.get(compute) for _ in range(3)]
+        self.assertEqual(len(computed), 3)
+        self.assertTrue(all(result is computed[2] for result in results))
+        # Once released, a further request computes afresh.
+        shared.release()
+        self.assertIsNot(shared.get(compute), computed[2])
+        self.assertEqual(len(computed), 4)
+
+if __name__ == "__main__":
+    unittest.main()
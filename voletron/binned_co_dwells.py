@@ -0,0 +1,627 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Per-bin co-dwell aggregates, accumulated online.
+
+The co-dwell sweep visits traversals in chronological order, so each group
+dwell can be split at bin edges and folded into per-bin (group, chamber) totals
+and pair matrices as soon as it is recorded.  BinnedCoDwells does this, so that
+the full list of co-dwells never needs to be materialised.  Each bin's totals
+are exposed as a CoDwellBin, which answers the same queries as a
+TimeSpanAnalyzer.
+
+Only the finest bins are accumulated directly.  Coarser bins, and the whole
+analysis interval, are sums of finer ones; a co-dwell spanning several finer
+bins is counted once in their sum.
+"""
+
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import deque
+from datetime import datetime, timedelta, tzinfo
+from typing import Deque, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from voletron.aggregates import GroupChamberAggregates, SharedAggregates
+from voletron.co_dwell_store import CoDwellStore
+from voletron.pair_matrix import PairMatrix
+from voletron.tag_index import TagIndex
+from voletron.types import ChamberName, GroupDwellAggregate, GroupMask, TimestampSeconds
+from voletron.util import seconds_between_timestamps
+
+SECONDS_PER_DAY = 86400
+
+# The periods over which bins may be folded, in seconds.
+FOLD_PERIODS = {"day": SECONDS_PER_DAY, "week": 7 * SECONDS_PER_DAY}
+
+
+def bin_bounds(
+    analysis_start_time: TimestampSeconds,
+    analysis_end_time: TimestampSeconds,
+    bin_seconds: float,
+) -> List[Tuple[TimestampSeconds, TimestampSeconds]]:
+    """The (start, end) of each time-series bin, in order.
+
+    Bins are bin_seconds long, starting at analysis_start_time; the last bin is
+    truncated at analysis_end_time.
+    """
+    bounds = []
+    current_start = analysis_start_time
+    while current_start < analysis_end_time:
+        current_end = min(TimestampSeconds(current_start + bin_seconds), analysis_end_time)
+        bounds.append((TimestampSeconds(current_start), TimestampSeconds(current_end)))
+        current_start = TimestampSeconds(current_start + bin_seconds)
+    return bounds
+
+
+def aligned_bin_bounds(
+    analysis_start_time: TimestampSeconds,
+    analysis_end_time: TimestampSeconds,
+    bin_seconds: int,
+    timezone: tzinfo,
+) -> List[Tuple[TimestampSeconds, TimestampSeconds]]:
+    """The (start, end) of each time-series bin, aligned to the local clock.
+
+    Bin edges fall on the local times of day that are multiples of bin_seconds
+    (which must divide a day) past midnight, in the given (pytz) timezone.  The
+    first and last bins are truncated at the analysis start and end.  Bins
+    containing a daylight saving time change are correspondingly longer or
+    shorter.
+    """
+    if SECONDS_PER_DAY % bin_seconds:
+        raise ValueError("Aligned bin size {} does not divide a day".format(bin_seconds))
+    if analysis_start_time >= analysis_end_time:
+        return []
+    edges = set()
+    day = datetime.fromtimestamp(analysis_start_time, timezone).date()
+    last_day = datetime.fromtimestamp(analysis_end_time, timezone).date()
+    while day <= last_day:
+        midnight = datetime.combine(day, datetime.min.time())
+        for offset in range(0, SECONDS_PER_DAY, bin_seconds):
+            edge = timezone.localize(midnight + timedelta(seconds=offset)).timestamp()
+            if analysis_start_time < edge < analysis_end_time:
+                edges.add(TimestampSeconds(edge))
+        day += timedelta(days=1)
+    starts = [analysis_start_time] + sorted(edges)
+    return list(zip(starts, starts[1:] + [analysis_end_time]))
+
+
+def period_offset(t: TimestampSeconds, period: str, timezone: tzinfo) -> float:
+    """Seconds from the start of the local day (or week, from Monday) to `t`."""
+    local = datetime.fromtimestamp(t, timezone)
+    offset = local.hour * 3600 + local.minute * 60 + local.second + local.microsecond / 1e6
+    if period == "week":
+        offset += local.weekday() * SECONDS_PER_DAY
+    return offset
+
+
+def coarser_bin_runs(
+    starts: List[TimestampSeconds],
+    finer_seconds: int,
+    bin_seconds: int,
+    timezone: Optional[tzinfo] = None,
+) -> List[range]:
+    """The runs of consecutive finer bins that make up each coarser bin.
+
+    Args:
+        starts: The start of each finer bin, in order.
+        bin_seconds: The coarser bin size, a multiple of finer_seconds.
+        timezone: If given, the bins are aligned to the local clock there (see
+            aligned_bin_bounds), and a run starts wherever the local clock
+            reaches a multiple of bin_seconds.
+    """
+    if timezone is None:
+        n = bin_seconds // finer_seconds
+        return [range(i, min(i + n, len(starts))) for i in range(0, len(starts), n)]
+    runs: List[range] = []
+    for (i, start) in enumerate(starts):
+        if not runs or period_offset(start, "day", timezone) % bin_seconds == 0:
+            runs.append(range(i, i + 1))
+        else:
+            runs[-1] = range(runs[-1].start, i + 1)
+    return runs
+
+
+def overlapping_bins(
+    bin_starts: List[TimestampSeconds],
+    bin_ends: List[TimestampSeconds],
+    start: TimestampSeconds,
+    end: TimestampSeconds,
+) -> range:
+    """The indexes of the bins that a span from start to end contributes to.
+
+    These are the bins that the span ends after the start of, and starts before
+    the end of.  Note a zero-length span at a bin edge belongs to neither
+    adjacent bin.
+    """
+    return range(bisect_right(bin_ends, start), bisect_left(bin_starts, end))
+
+
+# group -> chamber -> [number of co-dwells, sequence number of the first]
+GroupChamberCounts = Dict[GroupMask, Dict[ChamberName, List[int]]]
+
+
+class CoDwellBin:
+    """Co-dwell totals within one time interval.
+
+    Provides the same queries as TimeSpanAnalyzer, computed from totals that
+    were accumulated as co-dwells were recorded, or summed from the totals of
+    consecutive shorter bins (see merged()).
+    """
+
+    def __init__(
+        self,
+        tag_index: TagIndex,
+        analysis_start_time: TimestampSeconds,
+        analysis_end_time: TimestampSeconds,
+    ):
+        self.tag_index = tag_index
+        self.analysis_start_time = analysis_start_time
+        self.analysis_end_time = analysis_end_time
+        self.duration = analysis_end_time - analysis_start_time
+        # group -> chamber -> [count, duration]
+        self._group_totals: Dict[GroupMask, Dict[ChamberName, List]] = {}
+        # The sequence number of the first co-dwell added per (group, chamber),
+        # so that summed bins can list groups in the order they were found.
+        self._first_seen: Dict[Tuple[GroupMask, ChamberName], int] = {}
+        self.pair_matrix = PairMatrix(tag_index)
+        # The co-dwells counted here that started before this bin, and so
+        # were also counted in the previous bin.
+        self.carried: GroupChamberCounts = {}
+        # Zero-length co-dwells exactly at the start of this bin.  These belong
+        # to no bin on their own, but do belong to any longer span containing
+        # this bin and its predecessor.
+        self.start_edge: GroupChamberCounts = {}
+        self._group_chamber_aggregates = SharedAggregates()
+
+    def _totals(self, group: GroupMask, chamber: ChamberName, sequence: int) -> List:
+        chamber_totals = self._group_totals.get(group)
+        if chamber_totals is None:
+            chamber_totals = self._group_totals[group] = {}
+        totals = chamber_totals.get(chamber)
+        if totals is None:
+            totals = chamber_totals[chamber] = [0, 0.0]
+            self._first_seen[(group, chamber)] = sequence
+        elif sequence < self._first_seen[(group, chamber)]:
+            self._first_seen[(group, chamber)] = sequence
+        return totals
+
+    def add(
+        self,
+        group: GroupMask,
+        pair_offsets: Sequence[int],
+        duration: float,
+        chamber: ChamberName,
+        sequence: int = 0,
+    ) -> None:
+        """Add a co-dwell of the given duration.
+
+        Args:
+            pair_offsets: The cells of pair_matrix for the pairs in `group`.
+            sequence: The position of this co-dwell among all those added.
+        """
+        totals = self._totals(group, chamber, sequence)
+        totals[0] += 1
+        totals[1] += duration
+
+        self.pair_matrix.add(pair_offsets, duration)
+
+    def _add_counts(self, counts: GroupChamberCounts, sign: int) -> None:
+        """Add (or, with sign -1, remove) co-dwells of no duration."""
+        for (group, chamber_counts) in counts.items():
+            offsets = self.pair_matrix.offsets(group)
+            for (chamber, (count, sequence)) in chamber_counts.items():
+                self._totals(group, chamber, sequence)[0] += sign * count
+                self.pair_matrix.add_counts(offsets, sign * count)
+
+    @classmethod
+    def merged(
+        cls,
+        parts: List["CoDwellBin"],
+        edges: List[Optional[GroupChamberCounts]],
+    ) -> "CoDwellBin":
+        """Sum the totals of consecutive bins into one spanning them all.
+
+        A co-dwell that spans the boundary between two parts is counted once.
+
+        Args:
+            parts: Consecutive bins, in order.
+            edges: The zero-length co-dwells to include before each part, and
+                after the last (so one more entry than `parts`), or None.
+        """
+        result = cls(parts[0].tag_index, parts[0].analysis_start_time, parts[-1].analysis_end_time)
+        result.carried = parts[0].carried
+        result.start_edge = parts[0].start_edge
+        for (n, part) in enumerate(parts):
+            if edges[n]:
+                result._add_counts(edges[n], 1)
+            result._add_bin(part)
+            if n > 0:
+                result._add_counts(part.carried, -1)
+        if edges[-1]:
+            result._add_counts(edges[-1], 1)
+        result._order_by_first_seen()
+        return result
+
+    @classmethod
+    def summed(
+        cls,
+        parts: List["CoDwellBin"],
+        analysis_start_time: TimestampSeconds,
+        analysis_end_time: TimestampSeconds,
+    ) -> "CoDwellBin":
+        """Sum the totals of bins that need not be adjacent.
+
+        Each part is counted in full; the duration is the sum of theirs.
+        """
+        result = cls(parts[0].tag_index, analysis_start_time, analysis_end_time)
+        result.duration = sum(part.duration for part in parts)
+        for part in parts:
+            result._add_bin(part)
+        result._order_by_first_seen()
+        return result
+
+    def _add_bin(self, other: "CoDwellBin") -> None:
+        for (group, chamber_totals) in other._group_totals.items():
+            for (chamber, (count, duration)) in chamber_totals.items():
+                totals = self._totals(group, chamber, other._first_seen[(group, chamber)])
+                totals[0] += count
+                totals[1] += duration
+        self.pair_matrix.add_matrix(other.pair_matrix)
+
+    def _subtract_bin(self, other: "CoDwellBin") -> None:
+        """Remove the totals of a bin previously added with _add_bin.
+
+        Groups left with no co-dwells in a chamber are dropped.
+        """
+        for (group, chamber_totals) in other._group_totals.items():
+            own_chamber_totals = self._group_totals[group]
+            for (chamber, (count, duration)) in chamber_totals.items():
+                totals = own_chamber_totals[chamber]
+                totals[0] -= count
+                if totals[0]:
+                    totals[1] -= duration
+                else:
+                    del own_chamber_totals[chamber]
+                    del self._first_seen[(group, chamber)]
+            if not own_chamber_totals:
+                del self._group_totals[group]
+        self.pair_matrix.subtract_matrix(other.pair_matrix)
+
+    def _order_by_first_seen(self) -> None:
+        """List groups, and chambers within each group, in the order their
+        first co-dwells were added (as if accumulated directly)."""
+        first_seen = self._first_seen
+        group_totals = self._group_totals
+        self._group_totals = {
+            group: {
+                chamber: group_totals[group][chamber]
+                for chamber in sorted(group_totals[group], key=lambda c: first_seen[(group, c)])
+            }
+            for group in sorted(
+                group_totals, key=lambda g: min(first_seen[(g, c)] for c in group_totals[g])
+            )
+        }
+
+    def hold_group_chamber_aggregates(self) -> None:
+        """See TimeSpanAnalyzer.hold_group_chamber_aggregates."""
+        self._group_chamber_aggregates.hold()
+
+    def release_group_chamber_aggregates(self) -> None:
+        self._group_chamber_aggregates.release()
+
+    def get_group_chamber_exclusive_durations(self) -> GroupChamberAggregates:
+        """See TimeSpanAnalyzer.get_group_chamber_exclusive_durations."""
+        return self._group_chamber_aggregates.get(
+            lambda: GroupChamberAggregates(self.tag_index, self._group_totals)
+        )
+
+    def get_pair_inclusive_stats(self) -> List[GroupDwellAggregate]:
+        """See TimeSpanAnalyzer.get_pair_inclusive_stats."""
+        return list(self.pair_matrix.aggregates())
+
+    def get_pair_matrix(self) -> PairMatrix:
+        """See TimeSpanAnalyzer.get_pair_matrix."""
+        return self.pair_matrix
+
+
+def _count(counts: GroupChamberCounts, group: GroupMask, chamber: ChamberName, sequence: int) -> None:
+    chamber_counts = counts.get(group)
+    if chamber_counts is None:
+        chamber_counts = counts[group] = {}
+    entry = chamber_counts.get(chamber)
+    if entry is None:
+        chamber_counts[chamber] = [1, sequence]
+    else:
+        entry[0] += 1
+
+
+class BinnedCoDwells:
+    """Splits co-dwells at bin edges and accumulates per-bin totals.
+
+    Co-dwells are accumulated into the finest bins only.  A co-dwell
+    contributes to a bin with the portion of it that overlaps the bin, exactly
+    as a TimeSpanAnalyzer over that bin would count it.  Coarser bins, and the
+    whole analysis interval, are then produced by summing the finest bins up a
+    hierarchy of resolutions (see bins_of_size()).
+    """
+
+    def __init__(
+        self,
+        tag_index: TagIndex,
+        analysis_start_time: TimestampSeconds,
+        analysis_end_time: TimestampSeconds,
+        bin_seconds: int,
+        timezone: Optional[tzinfo] = None,
+    ):
+        """
+        Args:
+            bin_seconds: The size of the finest bins.  Any coarser resolution
+                requested from bins_of_size() must be a multiple of it.
+            timezone: If given, align bins to the local clock in this timezone
+                (see aligned_bin_bounds).
+        """
+        self.tag_index = tag_index
+        self.analysis_start_time = analysis_start_time
+        self.analysis_end_time = analysis_end_time
+        self.bin_seconds = bin_seconds
+        self.timezone = timezone
+        if timezone is None:
+            bounds = bin_bounds(analysis_start_time, analysis_end_time, bin_seconds)
+        else:
+            bounds = aligned_bin_bounds(analysis_start_time, analysis_end_time, bin_seconds, timezone)
+        self._bin_starts = [start for (start, _) in bounds]
+        self._bin_ends = [end for (_, end) in bounds]
+        self._fine_bins = [CoDwellBin(tag_index, start, end) for (start, end) in bounds]
+        # Bins per resolution, coarser ones created on request.
+        self._bins_per_resolution: Dict[int, List[CoDwellBin]] = {bin_seconds: self._fine_bins}
+        self._whole: Optional[CoDwellBin] = None
+        # Zero-length co-dwells at the end of the analysis (or, if there are no
+        # bins, anywhere in it).
+        self._end_edge: GroupChamberCounts = {}
+        # Typed arrays, as large groups have many pairs and there may be many
+        # distinct groups.
+        self._pair_offsets_of_group: Dict[GroupMask, Sequence[int]] = {}
+        # The number of co-dwells added so far.
+        self._sequence = 0
+        self._matrix = PairMatrix(tag_index)
+
+    @classmethod
+    def from_store(
+        cls,
+        co_dwells: CoDwellStore,
+        analysis_start_time: TimestampSeconds,
+        analysis_end_time: TimestampSeconds,
+        bin_seconds: int,
+        timezone: Optional[tzinfo] = None,
+    ) -> "BinnedCoDwells":
+        """Bin already-collected co-dwells."""
+        binned = cls(co_dwells.tag_index, analysis_start_time, analysis_end_time, bin_seconds, timezone)
+        # Add in order of end time, as _analyzer_bins does.
+        for i in sorted(range(len(co_dwells)), key=co_dwells.ends.__getitem__):
+            binned.add(
+                co_dwells.groups[co_dwells.group_codes[i]],
+                TimestampSeconds(co_dwells.starts[i]),
+                TimestampSeconds(co_dwells.ends[i]),
+                co_dwells.chambers[co_dwells.chamber_codes[i]],
+            )
+        return binned
+
+    def add(
+        self, group: GroupMask, start: TimestampSeconds, end: TimestampSeconds, chamber: ChamberName
+    ) -> None:
+        pairs = self._pair_offsets_of_group.get(group)
+        if pairs is None:
+            pairs = self._pair_offsets_of_group[group] = array("q", self._matrix.offsets(group))
+        sequence = self._sequence
+        self._sequence += 1
+
+        # Time-series bins take co-dwells that end after the bin starts and
+        # start before it ends.
+        bins = overlapping_bins(self._bin_starts, self._bin_ends, start, end)
+        for i in bins:
+            bin_start = self._bin_starts[i]
+            clipped_start = max(start, bin_start)
+            clipped_end = min(end, self._bin_ends[i])
+            self._fine_bins[i].add(
+                group, pairs, seconds_between_timestamps(clipped_start, clipped_end), chamber, sequence
+            )
+            if start < bin_start:
+                _count(self._fine_bins[i].carried, group, chamber, sequence)
+
+        # Keep track of zero-length co-dwells falling between bins, for the
+        # benefit of longer spans.
+        if not bins and start == end and self.analysis_start_time <= start <= self.analysis_end_time:
+            i = bisect_left(self._bin_starts, start)
+            if i < len(self._bin_starts) and self._bin_starts[i] == start:
+                _count(self._fine_bins[i].start_edge, group, chamber, sequence)
+            else:
+                _count(self._end_edge, group, chamber, sequence)
+
+    @property
+    def bins(self) -> List[CoDwellBin]:
+        """The whole analysis interval, followed by the finest bins."""
+        return [self.whole()] + self._fine_bins
+
+    def bins_of_size(self, bin_seconds: int) -> List[CoDwellBin]:
+        """The bins of the given size, which must be a multiple of the finest.
+
+        These are built by summing the bins of the coarsest available
+        resolution that evenly divides `bin_seconds`.
+        """
+        if bin_seconds % self.bin_seconds:
+            raise ValueError(
+                "Bin size {} is not a multiple of {}".format(bin_seconds, self.bin_seconds)
+            )
+        result = self._bins_per_resolution.get(bin_seconds)
+        if result is None:
+            finer = max(r for r in self._bins_per_resolution if r < bin_seconds and bin_seconds % r == 0)
+            parts = self._bins_per_resolution[finer]
+            runs = [
+                parts[run.start:run.stop]
+                for run in coarser_bin_runs(
+                    [part.analysis_start_time for part in parts], finer, bin_seconds, self.timezone
+                )
+            ]
+            result = [
+                CoDwellBin.merged(run, [None] + [part.start_edge for part in run[1:]] + [None])
+                for run in runs
+            ]
+            self._bins_per_resolution[bin_seconds] = result
+        return result
+
+    def whole(self) -> CoDwellBin:
+        """Totals over the whole analysis interval, summed from the coarsest
+        bins available."""
+        if self._whole is None:
+            parts = self._bins_per_resolution[max(self._bins_per_resolution)]
+            if parts:
+                self._whole = CoDwellBin.merged(
+                    parts, [part.start_edge for part in parts] + [self._end_edge]
+                )
+            else:
+                self._whole = CoDwellBin(self.tag_index, self.analysis_start_time, self.analysis_end_time)
+                self._whole._add_counts(self._end_edge, 1)
+        return self._whole
+
+
+def fold_slots(
+    starts: List[TimestampSeconds], bin_seconds: int, period: str, timezone: tzinfo
+) -> List[Tuple[int, List[int]]]:
+    """Group the bins falling at the same time of each day (or week).
+
+    Bins must be aligned to the local clock (see aligned_bin_bounds), so that
+    each lies within one bin_seconds slot of the period.  A truncated first or
+    last bin is counted in the slot it falls within.
+
+    Args:
+        starts: The start of each bin, in order.
+
+    Returns:
+        (offset of the slot from the start of the period, indexes of the bins
+        in it) for each slot observed, in order of offset.  Each period has at
+        most one bin in a slot, so slots near the ends of the analysis may have
+        fewer bins than the rest.
+    """
+    bins_per_slot: Dict[int, List[int]] = {}
+    for (i, start) in enumerate(starts):
+        slot = int(period_offset(start, period, timezone) // bin_seconds)
+        bins_per_slot.setdefault(slot, []).append(i)
+    return [(slot * bin_seconds, bins_per_slot[slot]) for slot in sorted(bins_per_slot)]
+
+
+def rolling_windows(bins: List[CoDwellBin], bins_per_window: int) -> Iterator[CoDwellBin]:
+    """Totals over each run of `bins_per_window` consecutive bins.
+
+    The windows step by one bin.  Running totals are kept, adding the bin
+    entering the window and subtracting the one leaving it at each step, so
+    the cost per window does not grow with its length.
+
+    Yields:
+        One CoDwellBin per window, in order, for as many full windows as fit.
+        Each window shares its pair matrix with the running totals, so is only
+        valid until the next window is requested.
+    """
+    if not bins or len(bins) < bins_per_window:
+        return
+    running = CoDwellBin(bins[0].tag_index, bins[0].analysis_start_time, bins[0].analysis_start_time)
+    # The sequence numbers that may yet be the first of each (group, chamber)
+    # in the window; see _FirstSeen.
+    first_seen = _FirstSeen()
+    for (last, entering) in enumerate(bins):
+        first = last - bins_per_window + 1
+        if 0 < last and first < last:
+            # The window's internal edges: zero-length co-dwells there are
+            # included, and co-dwells spanning them counted once.
+            running._add_counts(entering.start_edge, 1)
+            running._add_bin(entering)
+            running._add_counts(entering.carried, -1)
+            # Included until `entering` starts the window.
+            first_seen.add(_edge_sequences(entering.start_edge), last - 1)
+        else:
+            running._add_bin(entering)
+        first_seen.add(entering._first_seen.items(), last)
+        if first > 0:
+            if bins_per_window > 1:
+                # bins[first] now starts the window.  (Restore the co-dwells it
+                # carries before removing the bin they were carried from, so
+                # that their totals never pass through zero.)
+                running._add_counts(bins[first].carried, 1)
+                running._add_counts(bins[first].start_edge, -1)
+            running._subtract_bin(bins[first - 1])
+            first_seen.expire(bins[first - 1]._first_seen, first)
+            first_seen.expire((key for (key, _) in _edge_sequences(bins[first].start_edge)), first)
+        if first >= 0:
+            yield _window_snapshot(running, first_seen, bins[first], bins[last])
+
+
+def _edge_sequences(counts: GroupChamberCounts) -> Iterator[Tuple[Tuple[GroupMask, ChamberName], int]]:
+    """((group, chamber), sequence number of the first) for the given co-dwells."""
+    for (group, chamber_counts) in counts.items():
+        for (chamber, (_, sequence)) in chamber_counts.items():
+            yield ((group, chamber), sequence)
+
+
+class _FirstSeen:
+    """The first sequence number of each (group, chamber) in a sliding window.
+
+    Each sequence number is added with the last window start at which it is
+    still included.  Per (group, chamber), only those that are smaller than
+    every one added after them are kept, in a queue ordered by both, so that
+    the first is always at its head.  Each step of the window then costs time
+    in proportion to the co-dwells entering and leaving it.
+    """
+
+    def __init__(self):
+        self._queues: Dict[Tuple[GroupMask, ChamberName], Deque[Tuple[int, int]]] = {}
+
+    def add(self, sequences: Iterable[Tuple[Tuple[GroupMask, ChamberName], int]], last_start: int) -> None:
+        for (key, sequence) in sequences:
+            queue = self._queues.get(key)
+            if queue is None:
+                queue = self._queues[key] = deque()
+            while queue and queue[-1][1] >= sequence:
+                queue.pop()
+            queue.append((last_start, sequence))
+
+    def expire(self, keys: Iterable[Tuple[GroupMask, ChamberName]], first: int) -> None:
+        """Drop the sequence numbers of the given keys that are no longer
+        included once the window starts at `first`."""
+        for key in keys:
+            queue = self._queues.get(key)
+            if queue is None:
+                continue
+            while queue and queue[0][0] < first:
+                queue.popleft()
+            if not queue:
+                del self._queues[key]
+
+    def __getitem__(self, key: Tuple[GroupMask, ChamberName]) -> int:
+        return self._queues[key][0][1]
+
+
+def _window_snapshot(
+    running: CoDwellBin, first_seen: _FirstSeen, first_bin: CoDwellBin, last_bin: CoDwellBin
+) -> CoDwellBin:
+    """The running totals, as a bin from the start of first_bin to the end of
+    last_bin."""
+    result = CoDwellBin(first_bin.tag_index, first_bin.analysis_start_time, last_bin.analysis_end_time)
+    result.carried = first_bin.carried
+    result.start_edge = first_bin.start_edge
+    for (group, chamber_totals) in running._group_totals.items():
+        for (chamber, totals) in chamber_totals.items():
+            result._group_totals.setdefault(group, {})[chamber] = list(totals)
+            result._first_seen[(group, chamber)] = first_seen[(group, chamber)]
+    result._order_by_first_seen()
+    result.pair_matrix = running.pair_matrix
+    return result
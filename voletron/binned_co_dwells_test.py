@@ -0,0 +1,301 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import random
+import unittest
+
+import pytz
+
+from voletron.binned_co_dwells import (
+    CoDwellBin,
+    BinnedCoDwells,
+    aligned_bin_bounds,
+    bin_bounds,
+    fold_slots,
+    overlapping_bins,
+    period_offset,
+    rolling_windows,
+)
+from voletron.co_dwell_store import CoDwellStore
+from voletron.tag_index import TagIndex
+from voletron.time_span_analyzer import TimeSpanAnalyzer
+from voletron.types import CoDwell, TagID, ChamberName, TimestampSeconds
+
+tag_index = TagIndex([TagID("a"), TagID("b"), TagID("c"), TagID("d")])
+pacific = pytz.timezone("US/Pacific")
+# 2022-03-01 00:00:00 US/Pacific.
+midnight = TimestampSeconds(1646121600)
+
+
+class TestBinBounds(unittest.TestCase):
+    def test_last_bin_truncated(self):
+        self.assertEqual(
+            bin_bounds(TimestampSeconds(100), TimestampSeconds(350), 100),
+            [(100, 200), (200, 300), (300, 350)],
+        )
+
+    def test_empty(self):
+        self.assertEqual(bin_bounds(TimestampSeconds(100), TimestampSeconds(100), 100), [])
+
+
+class TestAlignedBinBounds(unittest.TestCase):
+    def test_aligned_to_the_hour(self):
+        start = TimestampSeconds(midnight + 1800.5)
+        end = TimestampSeconds(midnight + 3 * 3600 + 60)
+        self.assertEqual(
+            aligned_bin_bounds(start, end, 3600, pacific),
+            [
+                (start, midnight + 3600),
+                (midnight + 3600, midnight + 2 * 3600),
+                (midnight + 2 * 3600, midnight + 3 * 3600),
+                (midnight + 3 * 3600, end),
+            ],
+        )
+
+    def test_daylight_saving(self):
+        # 2022-03-13 00:00:00 PST; clocks skip from 02:00 to 03:00.
+        day = TimestampSeconds(1647158400)
+        bounds = aligned_bin_bounds(day, TimestampSeconds(day + 6 * 3600), 3600, pacific)
+        # Six elapsed hours, in six bins, ending at 07:00 PDT.
+        self.assertEqual(
+            [period_offset(start, "day", pacific) / 3600 for (start, _) in bounds], [0, 1, 3, 4, 5, 6]
+        )
+        self.assertEqual(period_offset(bounds[-1][1], "day", pacific), 7 * 3600)
+
+    def test_must_divide_a_day(self):
+        with self.assertRaises(ValueError):
+            aligned_bin_bounds(midnight, TimestampSeconds(midnight + 86400), 7000, pacific)
+
+
+class TestPeriodOffset(unittest.TestCase):
+    def test_period_offset(self):
+        # A Tuesday.
+        t = TimestampSeconds(midnight + 3 * 3600 + 0.5)
+        self.assertEqual(period_offset(t, "day", pacific), 3 * 3600 + 0.5)
+        self.assertEqual(period_offset(t, "week", pacific), 86400 + 3 * 3600 + 0.5)
+
+
+class TestOverlappingBins(unittest.TestCase):
+    def test_overlapping_bins(self):
+        starts = [0, 100, 200]
+        ends = [100, 200, 250]
+        self.assertEqual(overlapping_bins(starts, ends, 50, 150), range(0, 2))
+        self.assertEqual(overlapping_bins(starts, ends, 100, 200), range(1, 2))
+        self.assertEqual(overlapping_bins(starts, ends, 120, 130), range(1, 2))
+        self.assertEqual(overlapping_bins(starts, ends, -50, 300), range(0, 3))
+        self.assertEqual(overlapping_bins(starts, ends, 250, 300), range(3, 3))
+        # Zero-length spans at bin edges belong to no bin.
+        self.assertEqual(len(overlapping_bins(starts, ends, 100, 100)), 0)
+        self.assertEqual(overlapping_bins(starts, ends, 150, 150), range(1, 2))
+
+
+class TestBinnedCoDwells(unittest.TestCase):
+    def test_split_at_bin_edges(self):
+        binned = BinnedCoDwells(tag_index, TimestampSeconds(0), TimestampSeconds(300), 100)
+        ab = tag_index.mask([TagID("a"), TagID("b")])
+        binned.add(ab, TimestampSeconds(50), TimestampSeconds(250), ChamberName("c1"))
+
+        self.assertEqual(len(binned.bins), 4)
+        durations = [
+            [(g.tag_ids, g.chamber, g.count, g.duration_seconds) for g in b.get_group_chamber_exclusive_durations()]
+            for b in binned.bins
+        ]
+        self.assertEqual(durations[0], [(["a", "b"], "c1", 1, 200)])
+        self.assertEqual(durations[1], [(["a", "b"], "c1", 1, 50)])
+        self.assertEqual(durations[2], [(["a", "b"], "c1", 1, 100)])
+        self.assertEqual(durations[3], [(["a", "b"], "c1", 1, 50)])
+
+        pairs = binned.bins[2].get_pair_inclusive_stats()
+        self.assertEqual(len(pairs), 1)
+        self.assertEqual(pairs[0].tag_ids, ["a", "b"])
+        self.assertEqual(pairs[0].duration_seconds, 100)
+
+    def test_zero_length_at_bin_edge(self):
+        # Counted for the whole analysis, but in neither adjacent bin.
+        binned = BinnedCoDwells(tag_index, TimestampSeconds(0), TimestampSeconds(200), 100)
+        ab = tag_index.mask([TagID("a"), TagID("b")])
+        binned.add(ab, TimestampSeconds(100), TimestampSeconds(100), ChamberName("c1"))
+
+        self.assertEqual(binned.bins[0].get_group_chamber_exclusive_durations()[0].count, 1)
+        self.assertEqual(len(binned.bins[1].get_group_chamber_exclusive_durations()), 0)
+        self.assertEqual(len(binned.bins[2].get_group_chamber_exclusive_durations()), 0)
+
+    def test_matches_time_span_analyzer(self):
+        rng = random.Random(0)
+        groups = [tag_index.mask(g) for g in (["a"], ["a", "b"], ["b", "c", "d"], ["a", "c"])]
+        chambers = [ChamberName("c1"), ChamberName("c2")]
+        co_dwells = []
+        t = 0.0
+        for _ in range(200):
+            start = t
+            t += rng.choice([0.0, rng.uniform(0, 40)])
+            co_dwells.append(CoDwell(rng.choice(groups), TimestampSeconds(start), TimestampSeconds(t), rng.choice(chambers)))
+
+        analysis_start, analysis_end = TimestampSeconds(30), TimestampSeconds(t - 30)
+        binned = BinnedCoDwells(tag_index, analysis_start, analysis_end, 75)
+        for d in co_dwells:
+            binned.add(d.group, d.start, d.end, d.chamber)
+
+        store = CoDwellStore.from_co_dwells(tag_index, co_dwells)
+        bounds = [(analysis_start, analysis_end)] + bin_bounds(analysis_start, analysis_end, 75)
+        self.assertEqual(len(binned.bins), len(bounds))
+        for (b, (start, end)) in zip(binned.bins, bounds):
+            indexes = None
+            if b is not binned.bins[0]:
+                indexes = [i for i in range(len(store)) if store.ends[i] > start and store.starts[i] < end]
+            analyzer = TimeSpanAnalyzer(store, start, end, indexes)
+            self.assertEqual(b.duration, analyzer.duration)
+            self.assertEqual(
+                list(b.get_group_chamber_exclusive_durations()),
+                list(analyzer.get_group_chamber_exclusive_durations()),
+            )
+            self.assertEqual(list(b.get_pair_inclusive_stats()), list(analyzer.get_pair_inclusive_stats()))
+
+    def test_zero_length_inside_coarser_bin(self):
+        # At the edge between two fine bins, but inside the coarser bin.
+        binned = BinnedCoDwells(tag_index, TimestampSeconds(0), TimestampSeconds(400), 100)
+        ab = tag_index.mask([TagID("a"), TagID("b")])
+        binned.add(ab, TimestampSeconds(100), TimestampSeconds(100), ChamberName("c1"))
+        binned.add(ab, TimestampSeconds(200), TimestampSeconds(200), ChamberName("c1"))
+
+        coarse = binned.bins_of_size(200)
+        self.assertEqual(len(coarse), 2)
+        self.assertEqual(coarse[0].get_group_chamber_exclusive_durations()[0].count, 1)
+        self.assertEqual(len(coarse[1].get_group_chamber_exclusive_durations()), 0)
+        self.assertEqual(binned.whole().get_pair_matrix().count(0, 1), 2)
+
+    def test_spanning_co_dwell_counted_once(self):
+        binned = BinnedCoDwells(tag_index, TimestampSeconds(0), TimestampSeconds(400), 100)
+        ab = tag_index.mask([TagID("a"), TagID("b")])
+        binned.add(ab, TimestampSeconds(50), TimestampSeconds(350), ChamberName("c1"))
+
+        self.assertEqual(
+            [
+                [(g.count, g.duration_seconds) for g in b.get_group_chamber_exclusive_durations()]
+                for b in binned.bins_of_size(200)
+            ],
+            [[(1, 150)], [(1, 150)]],
+        )
+        self.assertEqual(binned.bins_of_size(400)[0].get_pair_matrix().count(0, 1), 1)
+        self.assertEqual(binned.whole().get_pair_matrix().duration(0, 1), 300)
+
+    def test_size_must_be_multiple(self):
+        binned = BinnedCoDwells(tag_index, TimestampSeconds(0), TimestampSeconds(400), 100)
+        with self.assertRaises(ValueError):
+            binned.bins_of_size(150)
+
+    def test_coarser_bins_match_direct_binning(self):
+        rng = random.Random(1)
+        groups = [tag_index.mask(g) for g in (["a"], ["a", "b"], ["b", "c", "d"], ["a", "c"])]
+        chambers = [ChamberName("c1"), ChamberName("c2")]
+        # Times on a coarse grid, so that sums of durations are exact.
+        co_dwells = []
+        t = 0.0
+        for _ in range(300):
+            start = t
+            t += rng.choice([0.0, 25.0, rng.randrange(0, 160, 5)])
+            co_dwells.append((rng.choice(groups), TimestampSeconds(start), TimestampSeconds(t), rng.choice(chambers)))
+
+        analysis_start, analysis_end = TimestampSeconds(50), TimestampSeconds(t - 10)
+        multi = BinnedCoDwells(tag_index, analysis_start, analysis_end, 50)
+        for d in co_dwells:
+            multi.add(*d)
+        for size in (100, 300, 600):
+            coarse = multi.bins_of_size(size)
+            direct = BinnedCoDwells(tag_index, analysis_start, analysis_end, size)
+            for d in co_dwells:
+                direct.add(*d)
+            self.assertEqual(len(coarse) + 1, len(direct.bins))
+            for (b, expected) in zip([multi.whole()] + coarse, direct.bins):
+                self.assertEqual(b.analysis_start_time, expected.analysis_start_time)
+                self.assertEqual(b.analysis_end_time, expected.analysis_end_time)
+                self.assertEqual(
+                    list(b.get_group_chamber_exclusive_durations()),
+                    list(expected.get_group_chamber_exclusive_durations()),
+                )
+                self.assertEqual(list(b.get_pair_inclusive_stats()), list(expected.get_pair_inclusive_stats()))
+
+    def test_aligned_coarser_bins(self):
+        start = TimestampSeconds(midnight + 1000)
+        end = TimestampSeconds(midnight + 3 * 3600)
+        binned = BinnedCoDwells(tag_index, start, end, 1800, pacific)
+        ab = tag_index.mask([TagID("a"), TagID("b")])
+        binned.add(ab, TimestampSeconds(midnight + 3000), TimestampSeconds(midnight + 4000), ChamberName("c1"))
+
+        hourly = binned.bins_of_size(3600)
+        self.assertEqual(
+            [(b.analysis_start_time, b.analysis_end_time) for b in hourly],
+            [(start, midnight + 3600), (midnight + 3600, midnight + 7200), (midnight + 7200, end)],
+        )
+        self.assertEqual(hourly[0].get_pair_matrix().duration(0, 1), 600)
+        self.assertEqual(hourly[1].get_pair_matrix().duration(0, 1), 400)
+
+    def test_fold_slots(self):
+        start = TimestampSeconds(midnight + 1800)
+        end = TimestampSeconds(midnight + 86400 + 3600)
+        binned = BinnedCoDwells(tag_index, start, end, 3600, pacific)
+        ab = tag_index.mask([TagID("a"), TagID("b")])
+        # In the first hour of the day, on both days.
+        binned.add(ab, TimestampSeconds(midnight + 1800), TimestampSeconds(midnight + 2000), ChamberName("c1"))
+        binned.add(ab, TimestampSeconds(midnight + 86400 + 100), TimestampSeconds(midnight + 86400 + 400), ChamberName("c1"))
+
+        hourly = binned.bins_of_size(3600)
+        slots = fold_slots([b.analysis_start_time for b in hourly], 3600, "day", pacific)
+        self.assertEqual(len(slots), 24)
+        # The first hour was observed on both days (half of it on the first),
+        # the others on the first day only.
+        self.assertEqual(slots[0], (0, [0, 24]))
+        self.assertEqual(slots[1], (3600, [1]))
+        first_hour = CoDwellBin.summed(
+            [hourly[i] for i in slots[0][1]], TimestampSeconds(0), TimestampSeconds(3600)
+        )
+        self.assertEqual(first_hour.duration, 1800 + 3600)
+        self.assertEqual(first_hour.get_pair_matrix().count(0, 1), 2)
+        self.assertEqual(first_hour.get_pair_matrix().duration(0, 1), 500)
+
+    def test_rolling_windows_match_merged_bins(self):
+        rng = random.Random(2)
+        groups = [tag_index.mask(g) for g in (["a"], ["a", "b"], ["b", "c", "d"], ["a", "c"])]
+        chambers = [ChamberName("c1"), ChamberName("c2")]
+        binned = BinnedCoDwells(tag_index, TimestampSeconds(25), TimestampSeconds(2000), 50)
+        t = 0.0
+        while t < 2100:
+            start = t
+            t += rng.choice([0.0, 50.0, rng.randrange(0, 200, 5)])
+            binned.add(rng.choice(groups), TimestampSeconds(start), TimestampSeconds(t), rng.choice(chambers))
+
+        bins = binned.bins_of_size(50)
+        for n in (1, 3, 8):
+            count = 0
+            # Each window is checked before the next is requested.
+            for (i, window) in enumerate(rolling_windows(bins, n)):
+                count += 1
+                run = bins[i:i + n]
+                expected = CoDwellBin.merged(run, [None] + [b.start_edge for b in run[1:]] + [None])
+                self.assertEqual(window.analysis_start_time, expected.analysis_start_time)
+                self.assertEqual(window.duration, expected.duration)
+                self.assertEqual(
+                    list(window.get_group_chamber_exclusive_durations()),
+                    list(expected.get_group_chamber_exclusive_durations()),
+                )
+                self.assertEqual(list(window.get_pair_inclusive_stats()), list(expected.get_pair_inclusive_stats()))
+            self.assertEqual(count, len(bins) - n + 1)
+
+    def test_rolling_windows_longer_than_analysis(self):
+        binned = BinnedCoDwells(tag_index, TimestampSeconds(0), TimestampSeconds(100), 50)
+        self.assertEqual(list(rolling_windows(binned.bins_of_size(50), 3)), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -13,44 +13,46 @@
 # limitations under the License.
 
 
-from typing import Callable, Dict, Optional
+from typing import Callable, Dict, Optional, Union
 
 # import .trajectory
 from collections import defaultdict
 from typing import Dict, List
 from voletron.util import seconds_between_timestamps
-from voletron.types import CHAMBER_ERROR, ChamberName, CoDwell, TagID, TimestampSeconds, Traversal
+from voletron.binned_co_dwells import BinnedCoDwells
+from voletron.co_dwell_store import CoDwellStore
+from voletron.tag_index import TagIndex
+from voletron.types import CHAMBER_ERROR, ChamberName, GroupMask, TagID, TimestampSeconds, Traversal
 
 
-RecordGroupDwellFn = Callable[[List[TagID], Optional[TimestampSeconds], TimestampSeconds, ChamberName], None]
+RecordGroupDwellFn = Callable[[GroupMask, Optional[TimestampSeconds], TimestampSeconds, ChamberName], None]
 
 
 class Chamber:
-    def __init__(self, name: ChamberName, record_group_dwell: RecordGroupDwellFn):
+    def __init__(self, name: ChamberName, record_group_dwell: RecordGroupDwellFn, tag_index: TagIndex):
         self.name = name
-        self.animals_since : Dict[TagID, TimestampSeconds] = defaultdict()
+        # The animals currently present, as a bitmask over tag_index.
+        self.group: GroupMask = GroupMask(0)
         self.last_event = None
         self.record_group_dwell = record_group_dwell
+        self.tag_index = tag_index
 
     def arrive(self, timestamp: TimestampSeconds, tag_id: TagID) -> None:
-        tag_ids = list(self.animals_since)
-        if len(tag_ids) > 0:
-            self.record_group_dwell(tag_ids, self.last_event, timestamp, self.name)
-        self.animals_since[tag_id] = timestamp
+        if self.group:
+            self.record_group_dwell(self.group, self.last_event, timestamp, self.name)
+        self.group = GroupMask(self.group | self.tag_index.bit(tag_id))
         self.last_event = timestamp
 
     def depart(self, timestamp: TimestampSeconds, tag_id: TagID) -> None:
-        arrive_time = self.animals_since.get(tag_id)
-        if not arrive_time:
+        bit = self.tag_index.bit(tag_id)
+        if not self.group & bit:
             raise ValueError(
-                "Can't depart without first arriving: {} {} {}".format(
-                    tag_id, arrive_time, timestamp
+                "Can't depart without first arriving: {} {}".format(
+                    tag_id, timestamp
                 )
             )
-        tag_ids = list(self.animals_since)
-        if len(tag_ids) > 0:
-            self.record_group_dwell(tag_ids, self.last_event, timestamp, self.name)
-        del self.animals_since[tag_id]
+        self.record_group_dwell(self.group, self.last_event, timestamp, self.name)
+        self.group = GroupMask(self.group & ~bit)
         self.last_event = timestamp
 
 
@@ -61,18 +63,36 @@ class CoDwellAccumulator:
         experiment_start_time: TimestampSeconds,
         tag_id_to_start_chamber: Dict[TagID, ChamberName],
         chambers: List[ChamberName],
+        binned: Optional[BinnedCoDwells] = None,
     ):
+        """
+        Args:
+            binned: If given, each co-dwell is split at bin edges and added to
+                these per-bin totals as it is recorded, instead of being stored.
+                end() then returns the per-bin totals.
+        """
         if not experiment_start_time:
             raise ValueError("Experiment must have a non-zero start time")
 
         self._end_was_called = False
+        self.tag_index = TagIndex(tag_id_to_start_chamber.keys())
         self._chambers = {
-            chamber: Chamber(chamber, self._record_group_dwell) for chamber in chambers
+            chamber: Chamber(chamber, self._record_group_dwell, self.tag_index) for chamber in chambers
         }
-        self._co_dwells: List[CoDwell] = [] 
+        self._co_dwells = CoDwellStore(self.tag_index)
+        self._binned = binned
+        # Sequence number of each animal's latest arrival, so that end() can
+        # depart animals in the order they arrived.
+        self._arrival_order: Dict[TagID, int] = {}
+        self._arrival_count = 0
 
         for [tag_id, start_chamber] in tag_id_to_start_chamber.items():
-            self._chambers[start_chamber].arrive(experiment_start_time, tag_id)
+            self._arrive(start_chamber, experiment_start_time, tag_id)
+
+    def _arrive(self, chamber: ChamberName, timestamp: TimestampSeconds, tag_id: TagID) -> None:
+        self._arrival_count += 1
+        self._arrival_order[tag_id] = self._arrival_count
+        self._chambers[chamber].arrive(timestamp, tag_id)
 
     def update_state_from_traversal(self, traversal: Traversal) -> None:
         if (
@@ -84,18 +104,24 @@ class CoDwellAccumulator:
             traversal.dest and traversal.dest != CHAMBER_ERROR
             and traversal.dest in self._chambers
         ):
-            self._chambers[traversal.dest].arrive(traversal.timestamp, traversal.tag_id)
+            self._arrive(traversal.dest, traversal.timestamp, traversal.tag_id)
 
     def _record_group_dwell(
-        self, tag_ids: List[TagID], start: Optional[TimestampSeconds], end: TimestampSeconds, chamber: ChamberName
+        self, group: GroupMask, start: Optional[TimestampSeconds], end: TimestampSeconds, chamber: ChamberName
     ) -> None:
         if not start:
             return
-        self._co_dwells.append(CoDwell(tag_ids, start, end, chamber))
+        if self._binned is not None:
+            self._binned.add(group, start, end, chamber)
+        else:
+            self._co_dwells.append(group, start, end, chamber)
 
-    def end(self, end_time: TimestampSeconds) -> List[CoDwell]:
+    def end(self, end_time: TimestampSeconds) -> Union[CoDwellStore, BinnedCoDwells]:
         self._end_was_called = True
         for chamber in self._chambers.values():
-            for tag_id in list(chamber.animals_since.keys()):
+            tag_ids = self.tag_index.members(chamber.group)
+            for tag_id in sorted(tag_ids, key=self._arrival_order.__getitem__):
                 chamber.depart(end_time, tag_id)
+        if self._binned is not None:
+            return self._binned
         return self._co_dwells
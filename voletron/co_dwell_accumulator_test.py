@@ -17,49 +17,57 @@ import unittest
 from unittest.mock import MagicMock, call
 
 from voletron.parse_olcus import parse_raw_line
+from voletron.binned_co_dwells import BinnedCoDwells
 from voletron.co_dwell_accumulator import Chamber, CoDwellAccumulator
+from voletron.tag_index import TagIndex
 from voletron.time_span_analyzer import TimeSpanAnalyzer
-from voletron.types import HabitatName, CoDwell, Traversal, TagID, ChamberName, TimestampSeconds
+from voletron.types import HabitatName, CoDwell, GroupMask, Traversal, TagID, ChamberName, TimestampSeconds
+
+# Bit 0 is tag_a, bit 1 is tag_b.
+tag_index = TagIndex([TagID("tag_a"), TagID("tag_b")])
+A = GroupMask(0b01)
+B = GroupMask(0b10)
+AB = GroupMask(0b11)
 
 
 class TestChamber(unittest.TestCase):
     def test_arrive(self):
         record_group_dwell = MagicMock()
-        c = Chamber(ChamberName("foo"), record_group_dwell)  # arrive doesn't use record_co_dwell
+        c = Chamber(ChamberName("foo"), record_group_dwell, tag_index)  # arrive doesn't use record_co_dwell
         self.assertIsNone(c.last_event)
-        self.assertEqual(dict(c.animals_since), {})
+        self.assertEqual(c.group, 0)
         c.arrive(TimestampSeconds(100), TagID("tag_a"))
         self.assertEqual(c.last_event, 100)
-        self.assertEqual(dict(c.animals_since), {"tag_a": 100})
+        self.assertEqual(c.group, A)
 
     def test_arrive_depart(self):
         record_group_dwell = MagicMock()
-        c = Chamber(ChamberName("foo"), record_group_dwell)
+        c = Chamber(ChamberName("foo"), record_group_dwell, tag_index)
         c.arrive(TimestampSeconds(100), TagID("tag_a"))
         c.depart(TimestampSeconds(200), TagID("tag_a"))
         c.arrive(TimestampSeconds(300), TagID("tag_b"))
         self.assertEqual(c.last_event, 300)
-        self.assertEqual(dict(c.animals_since), {"tag_b": 300})
+        self.assertEqual(c.group, B)
         # record_co_dwell.assert_called_once_with("tag_a", "tag_a", 100, 200, "foo")
-        record_group_dwell.assert_called_once_with(["tag_a"], 100, 200, "foo")
+        record_group_dwell.assert_called_once_with(A, 100, 200, "foo")
 
     def test_depart_before_arrive(self):
         record_group_dwell = MagicMock()
-        c = Chamber(ChamberName("foo"), record_group_dwell)
+        c = Chamber(ChamberName("foo"), record_group_dwell, tag_index)
         with self.assertRaises(ValueError):
             c.depart(TimestampSeconds(100), TagID("tag_a"))
 
     def test_co_dwell(self):
         record_group_dwell = MagicMock()
-        c = Chamber(ChamberName("foo"), record_group_dwell)
+        c = Chamber(ChamberName("foo"), record_group_dwell, tag_index)
         c.arrive(TimestampSeconds(100), TagID("tag_a"))
         c.arrive(TimestampSeconds(200), TagID("tag_b"))
         c.depart(TimestampSeconds(300), TagID("tag_a"))
         self.assertEqual(c.last_event, 300)
-        self.assertEqual(dict(c.animals_since), {"tag_b": 200})
+        self.assertEqual(c.group, B)
         self.assertEqual(len(record_group_dwell.mock_calls), 2)
         record_group_dwell.assert_has_calls(
-            [call(["tag_a"], 100, 200, "foo"), call(["tag_a", "tag_b"], 200, 300, "foo")]
+            [call(A, 100, 200, "foo"), call(AB, 200, 300, "foo")]
         )
 
 
@@ -73,19 +81,19 @@ class TestState(unittest.TestCase):
         s.update_state_from_traversal(Traversal(TimestampSeconds(200), TagID("tag_a"), ChamberName("CentralA"), ChamberName("Tube1")))
 
         self.assertEqual(list(s._chambers.keys()), ["CentralA", "Tube1", "Tube2", "Cage2"])
-        self.assertEqual(dict(s._chambers[ChamberName("CentralA")].animals_since), {"tag_b": 100})
+        self.assertEqual(s._chambers[ChamberName("CentralA")].group, B)
         self.assertEqual(s._chambers[ChamberName("CentralA")].last_event, 200)
 
-        self.assertEqual(dict(s._chambers[ChamberName("Tube1")].animals_since), {"tag_a": 200})
+        self.assertEqual(s._chambers[ChamberName("Tube1")].group, A)
         self.assertEqual(s._chambers[ChamberName("Tube1")].last_event, 200)
 
         co_dwells = s.end(TimestampSeconds(300))
         analyzer = TimeSpanAnalyzer(co_dwells, TimestampSeconds(0), TimestampSeconds(300))
         
         self.assertEqual(len(analyzer.co_dwells), 3)
-        self.assertEqual(analyzer.co_dwells[0], CoDwell([TagID('tag_a'), TagID('tag_b')], TimestampSeconds(100), TimestampSeconds(200), ChamberName('CentralA')))
-        self.assertEqual(analyzer.co_dwells[1], CoDwell([TagID('tag_b')], TimestampSeconds(200), TimestampSeconds(300), ChamberName('CentralA')))
-        self.assertEqual(analyzer.co_dwells[2], CoDwell([TagID('tag_a')], TimestampSeconds(200), TimestampSeconds(300), ChamberName('Tube1')))
+        self.assertEqual(analyzer.co_dwells[0], CoDwell(AB, TimestampSeconds(100), TimestampSeconds(200), ChamberName('CentralA')))
+        self.assertEqual(analyzer.co_dwells[1], CoDwell(B, TimestampSeconds(200), TimestampSeconds(300), ChamberName('CentralA')))
+        self.assertEqual(analyzer.co_dwells[2], CoDwell(A, TimestampSeconds(200), TimestampSeconds(300), ChamberName('Tube1')))
         # self.assertEqual(list(s.co_dwells.keys()), ["tag_a"])
         # self.assertEqual(
         #     dict(s.co_dwells["tag_a"]),
@@ -95,6 +103,18 @@ class TestState(unittest.TestCase):
         #     },
         # )
 
+    def test_traversal_binned(self):
+        tag_id_to_start_chamber = {TagID("tag_a"): ChamberName("CentralA"), TagID("tag_b"): ChamberName("CentralA")}
+        binned = BinnedCoDwells(tag_index, TimestampSeconds(100), TimestampSeconds(300), 150)
+        s = CoDwellAccumulator(TimestampSeconds(100), tag_id_to_start_chamber, all_chambers, binned)
+        s.update_state_from_traversal(Traversal(TimestampSeconds(200), TagID("tag_a"), ChamberName("CentralA"), ChamberName("Tube1")))
+
+        self.assertIs(s.end(TimestampSeconds(300)), binned)
+        self.assertEqual(
+            [(g.tag_ids, g.chamber, g.duration_seconds) for g in binned.bins[2].get_group_chamber_exclusive_durations()],
+            [(["tag_b"], "CentralA", 50), (["tag_a"], "Tube1", 50)],
+        )
+
     # def test_co_dwell_stats_unrestricted(self):
     #     tag_id_to_start_chamber = {
     #         "tag_a": "ArenaA",
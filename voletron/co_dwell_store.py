@@ -0,0 +1,132 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Columnar storage for co-dwells.
+
+A long experiment produces tens of millions of co-dwells.  Rather than holding
+each as a CoDwell object, CoDwellStore keeps them in growable typed columns
+(start, end, chamber code, group code), with small lookup tables mapping codes
+back to ChamberNames and GroupMasks.  Each co-dwell then costs 22 bytes.
+"""
+
+from array import array
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from voletron.tag_index import TagIndex
+from voletron.types import ChamberName, CoDwell, GroupMask, TimestampSeconds
+
+
+class CoDwellStore:
+    def __init__(self, tag_index: TagIndex, codes_from: Optional["CoDwellStore"] = None):
+        """Create an empty store.
+
+        Args:
+            tag_index: Describes the animals whose groups appear in this store.
+            codes_from: Another store whose chamber and group code tables should
+                be shared with this one, so that codes may be copied between
+                them directly.
+        """
+        self.tag_index = tag_index
+        self.starts = array("d")
+        self.ends = array("d")
+        self.chamber_codes = array("H")
+        self.group_codes = array("I")
+        if codes_from is None:
+            self.chambers: List[ChamberName] = []
+            self.groups: List[GroupMask] = []
+            self._chamber_code_of: Dict[ChamberName, int] = {}
+            self._group_code_of: Dict[GroupMask, int] = {}
+        else:
+            self.chambers = codes_from.chambers
+            self.groups = codes_from.groups
+            self._chamber_code_of = codes_from._chamber_code_of
+            self._group_code_of = codes_from._group_code_of
+
+    @classmethod
+    def from_co_dwells(cls, tag_index: TagIndex, co_dwells: Iterable[CoDwell]) -> "CoDwellStore":
+        store = cls(tag_index)
+        for d in co_dwells:
+            store.append(d.group, d.start, d.end, d.chamber)
+        return store
+
+    def chamber_code(self, chamber: ChamberName) -> int:
+        code = self._chamber_code_of.get(chamber)
+        if code is None:
+            code = len(self.chambers)
+            self.chambers.append(chamber)
+            self._chamber_code_of[chamber] = code
+        return code
+
+    def group_code(self, group: GroupMask) -> int:
+        code = self._group_code_of.get(group)
+        if code is None:
+            code = len(self.groups)
+            self.groups.append(group)
+            self._group_code_of[group] = code
+        return code
+
+    def append(
+        self, group: GroupMask, start: TimestampSeconds, end: TimestampSeconds, chamber: ChamberName
+    ) -> None:
+        self.append_codes(self.group_code(group), start, end, self.chamber_code(chamber))
+
+    def append_codes(self, group_code: int, start: float, end: float, chamber_code: int) -> None:
+        self.group_codes.append(group_code)
+        self.starts.append(start)
+        self.ends.append(end)
+        self.chamber_codes.append(chamber_code)
+
+    def restricted(
+        self,
+        analysis_start_time: TimestampSeconds,
+        analysis_end_time: TimestampSeconds,
+        indexes: Optional[Iterable[int]] = None,
+    ) -> "CoDwellStore":
+        """Limit co-dwells to the analysis start-end interval.
+
+        Co-dwells entirely outside the interval are dropped, and those that
+        straddle its boundaries are clipped.
+
+        Args:
+            indexes: If given, consider only the co-dwells at these positions.
+        """
+        result = CoDwellStore(self.tag_index, codes_from=self)
+        starts = self.starts
+        ends = self.ends
+        for i in range(len(starts)) if indexes is None else indexes:
+            start = starts[i]
+            end = ends[i]
+            if start >= analysis_start_time and end <= analysis_end_time:
+                result.append_codes(self.group_codes[i], start, end, self.chamber_codes[i])
+                continue
+            start = max(start, analysis_start_time)
+            end = min(end, analysis_end_time)
+            if end > start:
+                result.append_codes(self.group_codes[i], start, end, self.chamber_codes[i])
+        return result
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def __getitem__(self, i: int) -> CoDwell:
+        return CoDwell(
+            self.groups[self.group_codes[i]],
+            TimestampSeconds(self.starts[i]),
+            TimestampSeconds(self.ends[i]),
+            self.chambers[self.chamber_codes[i]],
+        )
+
+    def __iter__(self) -> Iterator[CoDwell]:
+        for i in range(len(self.starts)):
+            yield self[i]
@@ -0,0 +1,86 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+
+from voletron.co_dwell_store import CoDwellStore
+from voletron.tag_index import TagIndex
+from voletron.types import CoDwell, TagID, ChamberName, TimestampSeconds
+
+tag_index = TagIndex([TagID("a"), TagID("b"), TagID("c")])
+AB = tag_index.mask([TagID("a"), TagID("b")])
+AC = tag_index.mask([TagID("a"), TagID("c")])
+
+
+class TestCoDwellStore(unittest.TestCase):
+    def test_append_and_read_back(self):
+        store = CoDwellStore(tag_index)
+        store.append(AB, TimestampSeconds(100), TimestampSeconds(200), ChamberName("c1"))
+        store.append(AC, TimestampSeconds(150), TimestampSeconds(250), ChamberName("c2"))
+        store.append(AB, TimestampSeconds(300), TimestampSeconds(350), ChamberName("c1"))
+
+        self.assertEqual(len(store), 3)
+        self.assertEqual(store[1], CoDwell(AC, TimestampSeconds(150), TimestampSeconds(250), ChamberName("c2")))
+        self.assertEqual(list(store)[2], CoDwell(AB, TimestampSeconds(300), TimestampSeconds(350), ChamberName("c1")))
+        # Repeated groups and chambers share codes.
+        self.assertEqual(list(store.group_codes), [0, 1, 0])
+        self.assertEqual(list(store.chamber_codes), [0, 1, 0])
+        self.assertEqual(store.groups, [AB, AC])
+        self.assertEqual(store.chambers, ["c1", "c2"])
+
+    def _restrict(self, co_dwell, start, end):
+        store = CoDwellStore.from_co_dwells(tag_index, [co_dwell])
+        restricted = store.restricted(TimestampSeconds(start), TimestampSeconds(end))
+        return restricted[0] if len(restricted) else None
+
+    def test_restrict_inside(self):
+        cd = CoDwell(AB, TimestampSeconds(100), TimestampSeconds(200), ChamberName("c1"))
+        self.assertEqual(self._restrict(cd, 50, 250), cd)
+
+    def test_restrict_clipped(self):
+        cd = CoDwell(AB, TimestampSeconds(100), TimestampSeconds(200), ChamberName("c1"))
+        restricted = self._restrict(cd, 150, 180)
+        self.assertEqual(restricted.start, 150)
+        self.assertEqual(restricted.end, 180)
+
+    def test_restrict_clipped_start(self):
+        # Dwell starts before analysis window (50 < 100) but ends inside (150 < 200)
+        cd = CoDwell(AB, TimestampSeconds(50), TimestampSeconds(150), ChamberName("c1"))
+        restricted = self._restrict(cd, 100, 200)
+        self.assertEqual(restricted.start, 100)
+        self.assertEqual(restricted.end, 150)
+
+    def test_restrict_clipped_end(self):
+        # Dwell starts inside (150 > 100) but ends after analysis window (250 > 200)
+        cd = CoDwell(AB, TimestampSeconds(150), TimestampSeconds(250), ChamberName("c1"))
+        restricted = self._restrict(cd, 100, 200)
+        self.assertEqual(restricted.start, 150)
+        self.assertEqual(restricted.end, 200)
+
+    def test_restrict_outside(self):
+        cd = CoDwell(AB, TimestampSeconds(100), TimestampSeconds(200), ChamberName("c1"))
+        self.assertIsNone(self._restrict(cd, 300, 400))
+
+    def test_restrict_indexes(self):
+        store = CoDwellStore(tag_index)
+        store.append(AB, TimestampSeconds(100), TimestampSeconds(200), ChamberName("c1"))
+        store.append(AC, TimestampSeconds(150), TimestampSeconds(250), ChamberName("c2"))
+        restricted = store.restricted(TimestampSeconds(0), TimestampSeconds(1000), [1])
+        self.assertEqual(list(restricted), [store[1]])
+        # The restricted store shares the code tables of the original.
+        self.assertIs(restricted.groups, store.groups)
+
+
+if __name__ == "__main__":
+    unittest.main()
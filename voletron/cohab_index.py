@@ -0,0 +1,301 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""A persistent index of cumulative cohabitation, for arbitrary time windows.
+
+For each pair of animals, the total seconds they have spent together up to
+time t is a piecewise-linear function of t, whose slope changes only where a
+co-dwell starts or ends.  The same holds for the seconds each animal has spent
+in groups of each size.  CohabIndex records these co-dwell boundaries, with the
+full vector of cumulative totals (and slopes) at regular checkpoints.  The
+totals at any time are then found from the preceding checkpoint by replaying
+the few boundaries in between, and the totals for a window are the difference
+of the totals at its ends.
+
+Index files are written by `voletron --cohab_index` and queried with
+`voletron-query` (see query.py).
+"""
+
+import json
+import struct
+import sys
+from array import array
+from bisect import bisect_right
+from typing import Dict, List, Tuple
+
+from voletron.co_dwell_store import CoDwellStore
+from voletron.pair_matrix import cell_pairs, group_cells
+from voletron.tag_index import TagIndex, bit_indexes, group_size
+from voletron.types import AnimalName, GroupMask, TagID, TimestampSeconds
+
+_MAGIC_PREFIX = b"VOLETRON-COHAB-INDEX "
+_MAGIC = _MAGIC_PREFIX + b"2\n"
+_HEADER_LENGTH = struct.Struct("<Q")
+
+DEFAULT_CHECKPOINT_INTERVAL = 1024
+
+
+class CohabIndex:
+    """Cumulative pair and group-size seconds at every co-dwell boundary.
+
+    The totals are kept as one vector per checkpoint.  The first
+    `N * (N - 1) / 2` entries, for N animals, are the pair seconds: the upper
+    triangle (i < j) of the pair matrix, row-major, numbered as the cells of a
+    PairMatrix.  These are followed by the seconds of each animal in groups of
+    each size 1 to `max_group_size`.
+    """
+
+    def __init__(
+        self,
+        tag_id_to_name: Dict[TagID, AnimalName],
+        groups: List[GroupMask],
+        max_group_size: int,
+        checkpoint_interval: int,
+        event_times: array,
+        event_groups: array,
+        checkpoint_event_indexes: array,
+        checkpoint_times: array,
+        checkpoint_totals: array,
+        checkpoint_slopes: array,
+    ):
+        """Use build() or load() rather than calling this directly."""
+        self.tag_index = TagIndex(tag_id_to_name.keys())
+        self.tag_id_to_name = tag_id_to_name
+        self.groups = groups
+        self.max_group_size = max_group_size
+        self.checkpoint_interval = checkpoint_interval
+        # Co-dwell boundaries, in chronological order.  An entry g in
+        # event_groups means that a co-dwell of groups[g - 1] started (g > 0)
+        # or that one of groups[-g - 1] ended (g < 0).
+        self.event_times = event_times
+        self.event_groups = event_groups
+        # Checkpoint k gives the totals and slopes just before event
+        # checkpoint_event_indexes[k], which occurs at checkpoint_times[k].
+        self.checkpoint_event_indexes = checkpoint_event_indexes
+        self.checkpoint_times = checkpoint_times
+        self.checkpoint_totals = checkpoint_totals
+        self.checkpoint_slopes = checkpoint_slopes
+
+        size = len(self.tag_index)
+        self._pair_slots = size * (size - 1) // 2
+        self.vector_length = self._pair_slots + size * max_group_size
+        # The entries of the totals vector that each group contributes to.
+        self._slots_of_group = [self._slots(group) for group in groups]
+
+    def _slots(self, group: GroupMask) -> List[int]:
+        slots = group_cells(len(self.tag_index), group)
+        group_size_offset = group_size(group) - 1
+        for index in bit_indexes(group):
+            slots.append(self._pair_slots + index * self.max_group_size + group_size_offset)
+        return slots
+
+    @classmethod
+    def build(
+        cls,
+        co_dwells: CoDwellStore,
+        tag_id_to_name: Dict[TagID, AnimalName],
+        checkpoint_interval: int = DEFAULT_CHECKPOINT_INTERVAL,
+    ) -> "CohabIndex":
+        """Index the given co-dwells.
+
+        `tag_id_to_name` must cover exactly the animals of co_dwells.tag_index.
+        """
+        if sorted(tag_id_to_name.keys()) != co_dwells.tag_index.tag_ids:
+            raise ValueError("tag_id_to_name must name exactly the animals of the co-dwells")
+        groups = list(co_dwells.groups)
+        max_group_size = max([group_size(group) for group in groups], default=1)
+
+        events = []
+        for i in range(len(co_dwells)):
+            start = co_dwells.starts[i]
+            end = co_dwells.ends[i]
+            if end <= start:
+                continue
+            group_code = co_dwells.group_codes[i] + 1
+            events.append((start, group_code))
+            events.append((end, -group_code))
+        # Only the times matter for ordering: the totals do not depend on the
+        # order of simultaneous boundaries.
+        events.sort(key=lambda event: event[0])
+
+        index = cls(
+            tag_id_to_name,
+            groups,
+            max_group_size,
+            checkpoint_interval,
+            array("d", [t for (t, _) in events]),
+            array("i", [g for (_, g) in events]),
+            array("q"),
+            array("d"),
+            array("d"),
+            array("i"),
+        )
+        index._build_checkpoints()
+        return index
+
+    def _build_checkpoints(self) -> None:
+        totals = [0.0] * self.vector_length
+        slopes = [0] * self.vector_length
+        active: Dict[int, int] = {}
+        now = self.event_times[0] if self.event_times else 0.0
+        for (i, (t, g)) in enumerate(zip(self.event_times, self.event_groups)):
+            if t > now:
+                for (slot, slope) in active.items():
+                    totals[slot] += slope * (t - now)
+                now = t
+            if i % self.checkpoint_interval == 0:
+                for (slot, slope) in active.items():
+                    slopes[slot] = slope
+                self.checkpoint_event_indexes.append(i)
+                self.checkpoint_times.append(t)
+                self.checkpoint_totals.extend(totals)
+                self.checkpoint_slopes.extend(slopes)
+                for slot in active:
+                    slopes[slot] = 0
+            self._apply_event(active, g)
+
+    def _apply_event(self, active: Dict[int, int], g: int) -> None:
+        if g > 0:
+            for slot in self._slots_of_group[g - 1]:
+                active[slot] = active.get(slot, 0) + 1
+        else:
+            for slot in self._slots_of_group[-g - 1]:
+                slope = active[slot] - 1
+                if slope:
+                    active[slot] = slope
+                else:
+                    del active[slot]
+
+    def totals_at(self, t: TimestampSeconds) -> List[float]:
+        """The cumulative totals vector at time t."""
+        k = bisect_right(self.checkpoint_times, t) - 1
+        if k < 0:
+            return [0.0] * self.vector_length
+        begin = k * self.vector_length
+        end = begin + self.vector_length
+        totals = list(self.checkpoint_totals[begin:end])
+        active = {
+            slot: slope
+            for (slot, slope) in enumerate(self.checkpoint_slopes[begin:end])
+            if slope
+        }
+        now = self.checkpoint_times[k]
+        i = self.checkpoint_event_indexes[k]
+        event_times = self.event_times
+        while i < len(event_times) and event_times[i] <= t:
+            event_time = event_times[i]
+            if event_time > now:
+                for (slot, slope) in active.items():
+                    totals[slot] += slope * (event_time - now)
+                now = event_time
+            self._apply_event(active, self.event_groups[i])
+            i += 1
+        for (slot, slope) in active.items():
+            totals[slot] += slope * (t - now)
+        return totals
+
+    def window_totals(self, start: TimestampSeconds, end: TimestampSeconds) -> List[float]:
+        """The totals vector accumulated between start and end."""
+        at_start = self.totals_at(start)
+        at_end = self.totals_at(end)
+        return [b - a for (a, b) in zip(at_start, at_end)]
+
+    def pair_seconds(
+        self, start: TimestampSeconds, end: TimestampSeconds
+    ) -> Dict[Tuple[TagID, TagID], float]:
+        """Seconds that each pair of animals spent together between start and
+        end, in the "inclusive" sense.  Pairs are keyed in tag ID order."""
+        totals = self.window_totals(start, end)
+        tag_ids = self.tag_index.tag_ids
+        return {
+            (tag_ids[index_a], tag_ids[index_b]): totals[cell]
+            for (cell, (index_a, index_b)) in enumerate(cell_pairs(len(tag_ids)))
+        }
+
+    def group_size_seconds(
+        self, start: TimestampSeconds, end: TimestampSeconds
+    ) -> Dict[TagID, List[float]]:
+        """Seconds that each animal spent in groups of each size between start
+        and end.  Each list is indexed by group size, so entry 0 is always 0."""
+        totals = self.window_totals(start, end)
+        result = {}
+        for (index, tag_id) in enumerate(self.tag_index.tag_ids):
+            begin = self._pair_slots + index * self.max_group_size
+            result[tag_id] = [0.0] + totals[begin:begin + self.max_group_size]
+        return result
+
+    def save(self, path: str) -> None:
+        header = json.dumps({
+            "tag_id_to_name": self.tag_id_to_name,
+            "groups": self.groups,
+            "max_group_size": self.max_group_size,
+            "checkpoint_interval": self.checkpoint_interval,
+            "event_count": len(self.event_times),
+            "checkpoint_count": len(self.checkpoint_times),
+            "byteorder": sys.byteorder,
+        }).encode("utf-8")
+        with open(path, "wb") as f:
+            f.write(_MAGIC)
+            f.write(_HEADER_LENGTH.pack(len(header)))
+            f.write(header)
+            for column in self._columns():
+                column.tofile(f)
+
+    def _columns(self) -> List[array]:
+        return [
+            self.event_times,
+            self.event_groups,
+            self.checkpoint_event_indexes,
+            self.checkpoint_times,
+            self.checkpoint_totals,
+            self.checkpoint_slopes,
+        ]
+
+    @classmethod
+    def load(cls, path: str) -> "CohabIndex":
+        with open(path, "rb") as f:
+            magic = f.read(len(_MAGIC))
+            if magic != _MAGIC:
+                if magic.startswith(_MAGIC_PREFIX):
+                    raise ValueError(
+                        "Cohabitation index file from another version of voletron; rebuild it: {}".format(path)
+                    )
+                raise ValueError("Not a cohabitation index file: {}".format(path))
+            (header_length,) = _HEADER_LENGTH.unpack(f.read(_HEADER_LENGTH.size))
+            header = json.loads(f.read(header_length).decode("utf-8"))
+            events = header["event_count"]
+            checkpoints = header["checkpoint_count"]
+            size = len(header["tag_id_to_name"])
+            vector_length = size * (size - 1) // 2 + size * header["max_group_size"]
+            columns = []
+            for (typecode, count) in (
+                ("d", events),
+                ("i", events),
+                ("q", checkpoints),
+                ("d", checkpoints),
+                ("d", checkpoints * vector_length),
+                ("i", checkpoints * vector_length),
+            ):
+                column = array(typecode)
+                column.fromfile(f, count)
+                if header["byteorder"] != sys.byteorder:
+                    column.byteswap()
+                columns.append(column)
+        return cls(
+            header["tag_id_to_name"],
+            [GroupMask(group) for group in header["groups"]],
+            header["max_group_size"],
+            header["checkpoint_interval"],
+            *columns,
+        )
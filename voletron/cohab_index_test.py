@@ -0,0 +1,110 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import random
+import tempfile
+import unittest
+
+from voletron.co_dwell_store import CoDwellStore
+from voletron.cohab_index import CohabIndex
+from voletron.tag_index import TagIndex
+from voletron.time_span_analyzer import TimeSpanAnalyzer
+from voletron.types import AnimalName, CoDwell, TagID, ChamberName, TimestampSeconds
+
+tag_id_to_name = {TagID("a"): AnimalName("A"), TagID("b"): AnimalName("B"), TagID("c"): AnimalName("C")}
+tag_index = TagIndex(tag_id_to_name.keys())
+
+
+def _random_co_dwells(seed):
+    rng = random.Random(seed)
+    groups = [tag_index.mask(g) for g in (["a"], ["b"], ["a", "b"], ["a", "b", "c"], ["c"])]
+    co_dwells = []
+    for _ in range(300):
+        start = rng.uniform(0, 10000)
+        end = start + rng.choice([0.0, rng.uniform(0, 200)])
+        co_dwells.append(CoDwell(rng.choice(groups), TimestampSeconds(start), TimestampSeconds(end), ChamberName("c1")))
+    return CoDwellStore.from_co_dwells(tag_index, sorted(co_dwells, key=lambda d: d.end))
+
+
+class TestCohabIndex(unittest.TestCase):
+    def test_simple_window(self):
+        store = CoDwellStore.from_co_dwells(tag_index, [
+            CoDwell(tag_index.mask([TagID("a"), TagID("b")]), TimestampSeconds(100), TimestampSeconds(200), ChamberName("c1")),
+            CoDwell(tag_index.mask([TagID("a"), TagID("b"), TagID("c")]), TimestampSeconds(300), TimestampSeconds(400), ChamberName("c1")),
+        ])
+        index = CohabIndex.build(store, tag_id_to_name, checkpoint_interval=1)
+
+        pairs = index.pair_seconds(TimestampSeconds(150), TimestampSeconds(350))
+        self.assertAlmostEqual(pairs[("a", "b")], 100)
+        self.assertAlmostEqual(pairs[("a", "c")], 50)
+        self.assertAlmostEqual(pairs[("b", "c")], 50)
+
+        sizes = index.group_size_seconds(TimestampSeconds(0), TimestampSeconds(1000))
+        self.assertEqual(sizes["a"], [0.0, 0.0, 100.0, 100.0])
+        self.assertEqual(sizes["c"], [0.0, 0.0, 0.0, 100.0])
+
+    def test_matches_time_span_analyzer(self):
+        store = _random_co_dwells(0)
+        index = CohabIndex.build(store, tag_id_to_name, checkpoint_interval=16)
+        rng = random.Random(1)
+        for _ in range(20):
+            start = rng.uniform(-100, 10300)
+            end = rng.uniform(start, 10300)
+            analyzer = TimeSpanAnalyzer(store, TimestampSeconds(start), TimestampSeconds(end))
+            pairs = index.pair_seconds(TimestampSeconds(start), TimestampSeconds(end))
+            matrix = analyzer.get_pair_matrix()
+            for ((tag_a, tag_b), seconds) in pairs.items():
+                self.assertAlmostEqual(
+                    seconds, matrix.duration(tag_index.index(tag_a), tag_index.index(tag_b)), places=6
+                )
+            sizes = index.group_size_seconds(TimestampSeconds(start), TimestampSeconds(end))
+            expected = {tag_id: [0.0] * 4 for tag_id in tag_id_to_name}
+            for g in analyzer.get_group_chamber_exclusive_durations():
+                for tag_id in g.tag_ids:
+                    expected[tag_id][len(g.tag_ids)] += g.duration_seconds
+            for tag_id in tag_id_to_name:
+                for (size, seconds) in enumerate(expected[tag_id]):
+                    self.assertAlmostEqual(sizes[tag_id][size], seconds, places=6)
+
+    def test_save_load(self):
+        store = _random_co_dwells(2)
+        index = CohabIndex.build(store, tag_id_to_name, checkpoint_interval=16)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "test.cohab_index")
+            index.save(path)
+            loaded = CohabIndex.load(path)
+        self.assertEqual(loaded.tag_id_to_name, tag_id_to_name)
+        self.assertEqual(
+            loaded.pair_seconds(TimestampSeconds(1000), TimestampSeconds(5000)),
+            index.pair_seconds(TimestampSeconds(1000), TimestampSeconds(5000)),
+        )
+
+    def test_pair_triangle(self):
+        index = CohabIndex.build(_random_co_dwells(3), tag_id_to_name, checkpoint_interval=16)
+        # Three pairs, then three animals by group sizes 1 to 3.
+        self.assertEqual(index.vector_length, 3 + 3 * 3)
+        self.assertEqual(len(index.checkpoint_totals), len(index.checkpoint_times) * index.vector_length)
+
+    def test_load_old_version(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "test.cohab_index")
+            with open(path, "wb") as f:
+                f.write(b"VOLETRON-COHAB-INDEX 1\n")
+            with self.assertRaisesRegex(ValueError, "rebuild"):
+                CohabIndex.load(path)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -31,3 +31,8 @@ READ_JITTER_SECONDS = 0.002
 
 # Window within which to consider swapping read order for parsimony.
 READ_PARSIMONY_WINDOW_SECONDS = 0.010
+
+# A validation point is correct if the animal was in the expected chamber at
+# any time from this many seconds before it to this many seconds after it.
+VALIDATION_SECONDS_BEFORE = 30
+VALIDATION_SECONDS_AFTER = 90
@@ -0,0 +1,102 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Partitioning of an experiment into physically disconnected habitats.
+
+Animals never move between habitats, so each habitat can be analyzed
+independently of the others.  Each animal belongs to the habitat containing
+its start chamber, and each antenna to the habitat containing its chambers.
+"""
+
+import logging
+from typing import Dict, Iterable, List, Optional
+
+from voletron.apparatus_config import apparatus_chambers
+from voletron.types import CHAMBER_ERROR, AnimalConfig, Antenna, ChamberName, HabitatName, Read, TagID
+
+
+def habitat_of_chamber(chamber: ChamberName) -> Optional[HabitatName]:
+    """The habitat containing the given chamber, if any.
+
+    The Error pseudo-chamber belongs to no particular habitat.
+    """
+    if chamber == CHAMBER_ERROR:
+        return None
+    for (habitat, chambers) in apparatus_chambers.items():
+        if chamber in chambers:
+            return habitat
+    return None
+
+
+def habitat_of_antenna(antenna: Antenna) -> Optional[HabitatName]:
+    habitat = habitat_of_chamber(antenna.tube)
+    if habitat is None or habitat_of_chamber(antenna.cage) != habitat:
+        return None
+    return habitat
+
+
+def habitats_of_animals(config: AnimalConfig) -> Dict[TagID, Optional[HabitatName]]:
+    """The habitat of each animal, given by its start chamber."""
+    result: Dict[TagID, Optional[HabitatName]] = {}
+    for (tag_id, start_chamber) in config.tag_id_to_start_chamber.items():
+        result[tag_id] = habitat_of_chamber(start_chamber)
+        if result[tag_id] is None:
+            logging.warning("    *** ANIMAL OUTSIDE ALL HABITATS: {} ***".format(tag_id))
+    return result
+
+
+def habitat_config(config: AnimalConfig, tag_ids: List[TagID]) -> AnimalConfig:
+    """Restrict the animal config to the given animals."""
+    return AnimalConfig(
+        tag_id_to_name={tag_id: config.tag_id_to_name[tag_id] for tag_id in tag_ids},
+        tag_id_to_start_chamber={tag_id: config.tag_id_to_start_chamber[tag_id] for tag_id in tag_ids},
+    )
+
+
+def split_reads_by_habitat(
+    reads: Iterable[Read], tag_id_to_habitat: Dict[TagID, Optional[HabitatName]]
+) -> Dict[HabitatName, List[Read]]:
+    """Route each read to the habitat of the animal that was read.
+
+    Reads of an animal at an antenna outside its habitat are kept, with a
+    warning, so that its trajectory is inferred just as in a joint analysis of
+    all habitats.  Reads of unknown tags are dropped with a warning, and reads
+    of animals outside every habitat are dropped silently.
+    """
+    result: Dict[HabitatName, List[Read]] = {habitat: [] for habitat in apparatus_chambers}
+    habitat_of_antenna_cache: Dict[Antenna, Optional[HabitatName]] = {}
+    unknown_tags = set()
+    misplaced_count = 0
+    for read in reads:
+        try:
+            habitat = tag_id_to_habitat[read.tag_id]
+        except KeyError:
+            if read.tag_id not in unknown_tags:
+                unknown_tags.add(read.tag_id)
+                logging.warning("    *** UNKNOWN TAG: {} ***".format(read.tag_id))
+            continue
+        if habitat is None:
+            continue
+        try:
+            antenna_habitat = habitat_of_antenna_cache[read.antenna]
+        except KeyError:
+            antenna_habitat = habitat_of_antenna_cache[read.antenna] = habitat_of_antenna(read.antenna)
+        if antenna_habitat != habitat:
+            misplaced_count += 1
+        result[habitat].append(read)
+    if misplaced_count:
+        logging.warning(
+            "    *** {} reads at antennas outside the animal's habitat ***".format(misplaced_count)
+        )
+    return result
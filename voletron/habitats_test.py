@@ -0,0 +1,69 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+
+from voletron.apparatus_config import load_apparatus_config
+from voletron.habitats import habitat_config, habitat_of_antenna, habitat_of_chamber, habitats_of_animals, split_reads_by_habitat
+from voletron.types import CHAMBER_ERROR, AnimalConfig, AnimalName, Antenna, ChamberName, Read, TagID, TimestampSeconds
+
+
+class TestHabitats(unittest.TestCase):
+    def setUp(self):
+        load_apparatus_config("example_apparatus.json")
+
+    def test_habitat_of_chamber(self):
+        self.assertEqual(habitat_of_chamber(ChamberName("Cage3")), "HabitatA")
+        self.assertEqual(habitat_of_chamber(ChamberName("CentralB")), "HabitatB")
+        self.assertIsNone(habitat_of_chamber(CHAMBER_ERROR))
+        self.assertIsNone(habitat_of_chamber(ChamberName("Nowhere")))
+
+    def test_habitat_of_antenna(self):
+        self.assertEqual(habitat_of_antenna(Antenna(ChamberName("Tube1"), ChamberName("Cage1"))), "HabitatA")
+        self.assertIsNone(habitat_of_antenna(Antenna(ChamberName("Tube1"), ChamberName("CentralB"))))
+
+    def test_split_reads_by_habitat(self):
+        config = AnimalConfig(
+            tag_id_to_name={TagID("a"): AnimalName("A"), TagID("b"): AnimalName("B")},
+            tag_id_to_start_chamber={TagID("a"): ChamberName("CentralA"), TagID("b"): ChamberName("CentralB")},
+        )
+        antenna_a = Antenna(ChamberName("Tube1"), ChamberName("CentralA"))
+        antenna_b = Antenna(ChamberName("Tube6"), ChamberName("CentralB"))
+        reads = [
+            Read(TagID("a"), TimestampSeconds(1), antenna_a),
+            Read(TagID("b"), TimestampSeconds(2), antenna_b),
+            # An animal read in the wrong habitat
+            Read(TagID("a"), TimestampSeconds(3), antenna_b),
+            # An unknown animal
+            Read(TagID("c"), TimestampSeconds(4), antenna_a),
+        ]
+        with self.assertLogs(level="WARNING"):
+            result = split_reads_by_habitat(reads, habitats_of_animals(config))
+
+        self.assertEqual(result["HabitatA"], [reads[0], reads[2]])
+        self.assertEqual(result["HabitatB"], [reads[1]])
+
+    def test_habitat_config(self):
+        config = AnimalConfig(
+            tag_id_to_name={TagID("a"): AnimalName("A"), TagID("b"): AnimalName("B")},
+            tag_id_to_start_chamber={TagID("a"): ChamberName("CentralA"), TagID("b"): ChamberName("CentralB")},
+        )
+        self.assertEqual(
+            habitat_config(config, [TagID("b")]),
+            AnimalConfig({TagID("b"): AnimalName("B")}, {TagID("b"): ChamberName("CentralB")}),
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -17,25 +17,32 @@ import argparse
 import datetime
 import glob
 import logging
+import multiprocessing
 import os
 import sys
 import time
-from typing import Dict, Optional
+import traceback
+from typing import Dict, Generator, List, Optional, Tuple
 import pytz
 
-from voletron.output.output import write_outputs
+from voletron.output.files import COMPRESSION_SUFFIXES, zstandard
+from voletron.output.output import CO_DWELL_TABLES, OUTPUT_TABLES, write_outputs
 from voletron.output.types import ValidationRow, OutputBin # Added for potential future use or consistency
 
 # Removed sys.path hack. Please run as python -m voletron.main
 
 from voletron.apparatus_config import all_chambers, load_apparatus_config
+from voletron.habitats import habitat_config, habitat_of_chamber, habitats_of_animals, split_reads_by_habitat
 from voletron.parse_config import parse_config, parse_validation
 from voletron.parse_olcus import parse_first_read, parse_raw_dir
 from voletron.preprocess_reads import preprocess_reads
+from voletron.binned_co_dwells import FOLD_PERIODS, SECONDS_PER_DAY, BinnedCoDwells
 from voletron.co_dwell_accumulator import CoDwellAccumulator
-from voletron.trajectory import AllAnimalTrajectories
+from voletron.cohab_index import CohabIndex
+from voletron.tag_index import TagIndex
+from voletron.trajectory import DWELL_RECORD_BYTES, SPILL_BUFFER_RECORDS, AllAnimalTrajectories
 from voletron.util import format_time
-from voletron.constants import DEFAULT_TIME_BETWEEN_READS_THRESHOLD
+from voletron.constants import DEFAULT_TIME_BETWEEN_READS_THRESHOLD, VALIDATION_SECONDS_AFTER, VALIDATION_SECONDS_BEFORE
 from voletron.types import AnimalConfig, Read, TagID, TimestampSeconds, Validation, AnimalName, DurationSeconds, HabitatName # Added AnimalName, DurationSeconds, HabitatName for potential future use or consistency
 from voletron.time_span_analyzer import TimeSpanAnalyzer
 
@@ -61,8 +68,8 @@ def _parse_args(argv):
         help="Olcus logs timestamps in the local timezone, but does not record "
         "which timezone that is.  Thus, we allow specifying the timezone in "
         "which the Olcus logs should be interpreted.  This makes no difference "
-        "to the current analyses, which are all just about durations anyway, "
-        "not about absolute time.  Defaults to 'US/Pacific'.  Other options "
+        "to the analyses, which are all just about durations, except with "
+        "--align_bins or --fold.  Defaults to 'US/Pacific'.  Other options "
         "are listed at "
         "https://en.wikipedia.org/wiki/List_of_tz_database_time_zones."
         )
@@ -87,8 +94,115 @@ def _parse_args(argv):
     parser.add_argument(
         "--bin_seconds",
         type=int,
-        help="Bin size, in seconds, for time-series outputs.  Default: 300",
-        default=300
+        nargs="+",
+        help="Bin size, in seconds, for time-series outputs.  Several sizes may "
+        "be given, each a multiple of the smallest; coarser bins are then summed "
+        "from the finest, and each size gets its own set of output files "
+        "(`<experiment>.<size>s.*`).  Default: 300",
+        default=[300]
+    )
+    parser.add_argument(
+        "--align_bins",
+        action="store_true",
+        help="Align time-series bins to the local clock in --timezone (e.g. "
+        "hourly bins start on the hour), rather than to the start of the "
+        "analysis.  Each --bin_seconds must then divide a day.",
+    )
+    parser.add_argument(
+        "--fold",
+        choices=sorted(FOLD_PERIODS),
+        help="Also write the chamber time and co-dwell tables folded over a "
+        "day or a week (`<experiment>.fold_<period>.*`), summing the bins at "
+        "the same local time of day (or week) across the analysis, with the "
+        "number of bins summed as period_count.  Implies --align_bins.",
+    )
+    parser.add_argument(
+        "--window_seconds",
+        type=int,
+        help="Also write the chamber time and co-dwell tables over rolling "
+        "windows of this many seconds (`<experiment>.window_<seconds>s.*`), "
+        "stepping by the smallest --bin_seconds, of which it must be a "
+        "multiple.  Default: no rolling windows.",
+    )
+    parser.add_argument(
+        "--group_size_format",
+        choices=["wide", "long"],
+        default="wide",
+        help="Layout of the group size table.  `wide` has a column per group "
+        "size, from 1 up to the larger of 8 and the number of animals in the "
+        "habitat; "
+        "`long` (`*.group_size.long.csv`) has a row per bin, animal and group "
+        "size, omitting sizes with no time.  Default: wide",
+    )
+    parser.add_argument(
+        "--pair_cohab_format",
+        choices=["pairs", "matrix"],
+        default="pairs",
+        help="Layout of the pairwise cohabitation table.  `pairs` has a row per "
+        "bin and pair of animals; `matrix` (`*.pair_matrix.npz`) holds, as "
+        "NumPy arrays, the animal names, the bins, and (bins x animals x "
+        "animals) arrays of co-dwell counts and seconds.  Default: pairs",
+    )
+    parser.add_argument(
+        "--sparse_outputs",
+        action="store_true",
+        help="Omit rows whose values are all zero (e.g. pairs that never met "
+        "in a bin) from the chamber time, pairwise cohabitation, group "
+        "chamber cohabitation and group size tables.  The chamber time and "
+        "group size tables are then written in long format "
+        "(`*.chambers.long.csv`, `*.group_size.long.csv`), and a "
+        "`*.sparse.json` file lists the bins, animals and chambers, so that "
+        "the zeros can be restored.",
+    )
+    parser.add_argument(
+        "--output_format",
+        choices=["csv", "columnar", "sqlite"],
+        default="csv",
+        help="Format of the output tables.  `columnar` writes each table as a "
+        "typed columnar file: Parquet (`*.parquet`) if pyarrow is installed, "
+        "otherwise a NumPy archive with an array per column (`*.npz`).  "
+        "`sqlite` writes the tables of all habitats to one indexed SQLite "
+        "database, `voletron/results.sqlite`.  Default: csv",
+    )
+    parser.add_argument(
+        "--compress_outputs",
+        choices=sorted(COMPRESSION_SUFFIXES),
+        help="Compress the CSV (and JSON) output files as they are written, "
+        "adding `.gz` or `.zst` to their names.  zstd needs the zstandard "
+        "package.  Default: no compression",
+    )
+    parser.add_argument(
+        "--outputs",
+        nargs="+",
+        choices=OUTPUT_TABLES,
+        default=list(OUTPUT_TABLES),
+        help="The output tables to write: chamber times (`chambers`), long "
+        "dwells (`longdwells`), validation against observations "
+        "(`validation`), pairwise cohabitation (`pair_cohab`), group chamber "
+        "cohabitation (`group_chamber_cohab`) and group sizes (`group_size`).  "
+        "Work needed only by other tables is skipped; in particular, without "
+        "any of the last three, co-dwells are not computed at all.  Default: "
+        "all of them",
+    )
+    parser.add_argument(
+        "--output_threads",
+        type=int,
+        default=1,
+        help="Number of threads per habitat computing and writing the output "
+        "tables, so that writing one table can overlap computing the next.  "
+        "Mostly useful when the output directory is on slow storage; the "
+        "computation itself does not run in parallel.  Ignored with "
+        "`--output_format sqlite`.  Default: 1",
+    )
+    parser.add_argument(
+        "--validation_tolerance",
+        type=float,
+        nargs=2,
+        metavar=("BEFORE", "AFTER"),
+        default=[VALIDATION_SECONDS_BEFORE, VALIDATION_SECONDS_AFTER],
+        help="A validation point counts as correct if the animal was in the "
+        "observed chamber at any time from BEFORE seconds before it to AFTER "
+        "seconds after it.  Default: {} {}".format(VALIDATION_SECONDS_BEFORE, VALIDATION_SECONDS_AFTER),
     )
     parser.add_argument(
         "--dwell_threshold",
@@ -96,6 +210,41 @@ def _parse_args(argv):
         default=DEFAULT_TIME_BETWEEN_READS_THRESHOLD,
         help="Time in seconds between reads to switch from short dwell (tube) to long dwell (cage/arena). Default: {}".format(DEFAULT_TIME_BETWEEN_READS_THRESHOLD)
     )
+    parser.add_argument(
+        "--spill_dir",
+        help="Directory in which to store inferred animal trajectories on disk, "
+        "instead of holding them in memory.  Each run uses (and removes when done) "
+        "its own subdirectory.  Default: hold trajectories in memory.",
+    )
+    parser.add_argument(
+        "--spill_buffer_records",
+        type=int,
+        default=SPILL_BUFFER_RECORDS,
+        help="With --spill_dir, the number of finished dwells each animal holds "
+        "in memory before appending them to its file ({} bytes each).  "
+        "Default: {}".format(DWELL_RECORD_BYTES, SPILL_BUFFER_RECORDS),
+    )
+    parser.add_argument(
+        "--online_bins",
+        action="store_true",
+        help="Aggregate co-dwells into time-series bins as they are found, "
+        "instead of collecting all co-dwells and binning them afterwards.  This "
+        "avoids holding every co-dwell in memory.",
+    )
+    parser.add_argument(
+        "--cohab_index",
+        action="store_true",
+        help="Also write, per habitat, an index of cumulative cohabitation "
+        "(`*.cohab_index`), from which `voletron-query` can report pair and "
+        "group-size totals for any time window without re-running the analysis.",
+    )
+    parser.add_argument(
+        "--processes",
+        type=int,
+        help="Number of worker processes.  Habitats are analyzed independently, "
+        "and are shared out among the workers.  Default: one per habitat, up to "
+        "the number of CPUs.",
+    )
     # parser.add_argument(
     #     "--habitat_time_offset_seconds",
     #     type=int,
@@ -111,7 +260,27 @@ def _parse_args(argv):
         help="Enable verbose logging."
     )
 
-    return parser.parse_args(argv[1:])
+    args = parser.parse_args(argv[1:])
+    if args.cohab_index and args.online_bins:
+        parser.error("--cohab_index needs the full list of co-dwells, so cannot be combined with --online_bins")
+    if args.compress_outputs == "zstd" and zstandard is None:
+        parser.error("--compress_outputs zstd needs the zstandard package")
+    if args.spill_buffer_records < 1:
+        parser.error("--spill_buffer_records must be at least 1")
+    if any(size <= 0 for size in args.bin_seconds):
+        parser.error("--bin_seconds must be positive")
+    if any(size % min(args.bin_seconds) for size in args.bin_seconds):
+        parser.error("Each --bin_seconds must be a multiple of the smallest")
+    args.bin_seconds = sorted(set(args.bin_seconds))
+    if args.window_seconds is not None and (
+        args.window_seconds <= 0 or args.window_seconds % args.bin_seconds[0]
+    ):
+        parser.error("--window_seconds must be a positive multiple of the smallest --bin_seconds")
+    if args.fold:
+        args.align_bins = True
+    if args.align_bins and any(SECONDS_PER_DAY % size for size in args.bin_seconds):
+        parser.error("With --align_bins or --fold, each --bin_seconds must divide a day (86400)")
+    return args
 
 
 def _find_file(directory: str, exact_name: str, suffix: str) -> Optional[str]:
@@ -212,42 +381,236 @@ def main(argv=None):
     logging.info(f"Apparatus config: {apparatusFile}")
     config, validations, olcusDir = _parse_config(args, timezone)
     
-    ### Read raw data
-    reads_per_animal, first_read_time, analysis_start_time, analysis_end_time, last_read_time = _load_and_validate_data(args, config, olcusDir, timezone)
-    
-    ### Infer animal trajectories from antenna reads
+    ### Read raw data, and split it by habitat
+    reads_per_habitat, first_read_time, analysis_start_time = _load_data(args, config, olcusDir, timezone)
+
+    ### Analyze each habitat independently
+    habitats = list(reads_per_habitat.keys())
+    processes = args.processes or min(len(habitats), os.cpu_count() or 1)
+    processes = max(1, min(processes, len(habitats)))
+    habitat_groups = [
+        {habitat: reads_per_habitat[habitat] for habitat in habitats[i::processes]}
+        for i in range(processes)
+    ]
+    del reads_per_habitat
+    stage_args = [
+        (args, apparatusFile, config, validations, olcusDir, first_read_time, analysis_start_time, group)
+        for group in habitat_groups
+    ]
+    del habitat_groups
+
+    if processes == 1:
+        workers = [_InProcessWorker(*stage_args[0])]
+    else:
+        workers = [_ProcessWorker(*a) for a in stage_args]
+    del stage_args
+
+    # Every habitat is analyzed over the same interval, which may extend to the
+    # last read in any habitat.
+    last_read_times = [t for t in (w.last_read_time() for w in workers) if t is not None]
+    if not last_read_times:
+        raise ValueError("No reads found for any animal.")
+    last_read_time = max(last_read_times)
+    analysis_end_time = _get_analysis_end_time(args, timezone, last_read_time)
+    _print_time_intervals(first_read_time, analysis_start_time, analysis_end_time, last_read_time)
+
+    for worker in workers:
+        worker.start_analysis(analysis_end_time, last_read_time)
+    for worker in workers:
+        worker.finish()
+    logging.debug(f"PROFILING: Total execution took {time.perf_counter() - t_total:.3f} seconds")
+
+
+def _analyze_habitats(
+    args,
+    apparatus_file: str,
+    config: AnimalConfig,
+    validations: List[Validation],
+    olcusDir: str,
+    first_read_time: TimestampSeconds,
+    analysis_start_time: TimestampSeconds,
+    reads_per_habitat: Dict[HabitatName, List[Read]],
+) -> Generator[Optional[TimestampSeconds], Tuple[TimestampSeconds, TimestampSeconds], None]:
+    """Run the full analysis of the given habitats, writing their outputs.
+
+    The analysis interval depends on the last read in *any* habitat, so this
+    runs in two stages.  After preprocessing the reads, it yields the time of
+    the last read in these habitats (or None if there are none).  It must then
+    be sent the analysis end time and the last read time across all habitats,
+    whereupon it completes the analysis.
+    """
+    # Worker processes may not have inherited the module-level apparatus config.
+    load_apparatus_config(apparatus_file)
+
+    ### Initial cleanup of the reads, per animal
+    habitat_reads_per_animal = {}
+    for (habitat, reads) in reads_per_habitat.items():
+        habitat_conf = habitat_config(config, [
+            tag_id for tag_id in config.tag_id_to_start_chamber.keys()
+            if habitat_of_chamber(config.tag_id_to_start_chamber[tag_id]) == habitat
+        ])
+        reads_per_animal = preprocess_reads(reads, habitat_conf.tag_id_to_start_chamber.keys(), habitat_conf.tag_id_to_name)
+        _warn_unobserved_animals(reads_per_animal)
+        habitat_reads_per_animal[habitat] = (habitat_conf, reads_per_animal)
+    del reads_per_habitat
+
+    last_read_times = [
+        reads[-1].timestamp
+        for (_, reads_per_animal) in habitat_reads_per_animal.values()
+        for reads in reads_per_animal.values()
+        if reads
+    ]
+    (analysis_end_time, last_read_time) = yield (max(last_read_times) if last_read_times else None)
+
     # Ensure simulation covers the requested analysis start time, even if it precedes data
     simulation_start_time = min(first_read_time, analysis_start_time)
-    trajectories = _build_trajectories(simulation_start_time, analysis_end_time, config, reads_per_animal, args.dwell_threshold)
-    
-    # Simulate state forwards, accumulating stats in the state object
-    # and write it out along the way
-    state = CoDwellAccumulator(simulation_start_time, config.tag_id_to_start_chamber, all_chambers)
-    for t in trajectories.traversals():
-        state.update_state_from_traversal(t)
-    co_dwells = state.end(analysis_end_time)
-    
+    # Bins are aligned to the local clock if requested.
+    bin_timezone = pytz.timezone(args.timezone) if args.align_bins else None
+    # Extend trajectories to the last read in any habitat, as a joint analysis would.
+    trajectory_end_time = max(analysis_end_time, last_read_time)
+
+    for habitat in list(habitat_reads_per_animal.keys()):
+        (habitat_conf, reads_per_animal) = habitat_reads_per_animal.pop(habitat)
+
+        ### Infer animal trajectories from antenna reads
+        trajectories = _build_trajectories(
+            simulation_start_time,
+            trajectory_end_time,
+            habitat_conf,
+            reads_per_animal,
+            args.dwell_threshold,
+            args.spill_dir,
+            args.spill_buffer_records,
+        )
+        # The trajectories now hold everything needed downstream.
+        del reads_per_animal
+
+        try:
+            # Simulate state forwards, accumulating stats in the state object
+            # and write it out along the way.  This is needed only for the
+            # co-dwell tables and the cohab index.
+            co_dwells = None
+            if args.cohab_index or not set(args.outputs).isdisjoint(CO_DWELL_TABLES):
+                binned = None
+                if args.online_bins:
+                    binned = BinnedCoDwells(
+                        TagIndex(habitat_conf.tag_id_to_start_chamber.keys()),
+                        analysis_start_time,
+                        analysis_end_time,
+                        args.bin_seconds[0],
+                        bin_timezone,
+                    )
+                state = CoDwellAccumulator(simulation_start_time, habitat_conf.tag_id_to_start_chamber, all_chambers, binned)
+                for t in trajectories.traversals():
+                    state.update_state_from_traversal(t)
+                co_dwells = state.end(analysis_end_time)
+
+            write_outputs(
+                olcusDir,
+                habitat_conf,
+                trajectories,
+                co_dwells,
+                # analyzer,
+                # first_read_time,
+                # last_read_time,
+                analysis_start_time,
+                analysis_end_time,
+                validations,
+                len(validations) > 0,
+                args.bin_seconds,
+                # args.habitat_time_offset_seconds,
+                [habitat],
+                bin_timezone,
+                args.fold,
+                args.window_seconds,
+                args.group_size_format == "long",
+                args.output_format,
+                args.pair_cohab_format == "matrix",
+                args.sparse_outputs,
+                args.output_threads,
+                args.outputs,
+                args.compress_outputs,
+                tuple(args.validation_tolerance),
+            )
 
-    write_outputs(
-        olcusDir,
-        config,
-        trajectories,
-        co_dwells,
-        # analyzer,
-        # first_read_time,
-        # last_read_time,
-        analysis_start_time,
-        analysis_end_time,
-        validations,
-        len(validations) > 0,
-        args.bin_seconds,
-        # args.habitat_time_offset_seconds,
-    )
-    logging.debug(f"PROFILING: Total execution took {time.perf_counter() - t_total:.3f} seconds")
+            if args.cohab_index:
+                CohabIndex.build(co_dwells, habitat_conf.tag_id_to_name).save(os.path.join(
+                    olcusDir, "voletron", habitat, os.path.basename(olcusDir) + ".cohab_index"
+                ))
+        finally:
+            trajectories.close()
+
+
+class _InProcessWorker:
+    """Runs _analyze_habitats in this process."""
+
+    def __init__(self, *stage_args):
+        self._stages = _analyze_habitats(*stage_args)
+        self._last_read_time = next(self._stages)
+
+    def last_read_time(self) -> Optional[TimestampSeconds]:
+        return self._last_read_time
+
+    def start_analysis(self, analysis_end_time: TimestampSeconds, last_read_time: TimestampSeconds) -> None:
+        try:
+            self._stages.send((analysis_end_time, last_read_time))
+        except StopIteration:
+            pass
 
+    def finish(self) -> None:
+        pass
 
-def _load_and_validate_data(args, config, olcusDir, timezone):
-    """Load raw data, handle preprocessing, and determine time intervals."""
+
+def _run_worker_process(conn, *stage_args) -> None:
+    """Drives _analyze_habitats on behalf of a _ProcessWorker."""
+    try:
+        stages = _analyze_habitats(*stage_args)
+        conn.send(("ok", next(stages)))
+        window = conn.recv()
+        try:
+            stages.send(window)
+        except StopIteration:
+            pass
+        conn.send(("ok", None))
+    except BaseException:
+        conn.send(("error", traceback.format_exc()))
+    finally:
+        conn.close()
+
+
+class _ProcessWorker:
+    """Runs _analyze_habitats in a separate process."""
+
+    def __init__(self, *stage_args):
+        (self._conn, child_conn) = multiprocessing.Pipe()
+        self._process = multiprocessing.Process(target=_run_worker_process, args=(child_conn,) + stage_args)
+        self._process.start()
+        child_conn.close()
+
+    def _receive(self):
+        try:
+            (status, value) = self._conn.recv()
+        except EOFError:
+            self._process.join()
+            raise RuntimeError("Habitat worker exited unexpectedly (exit code {})".format(self._process.exitcode))
+        if status == "error":
+            self._process.join()
+            raise RuntimeError("Habitat worker failed:\n{}".format(value))
+        return value
+
+    def last_read_time(self) -> Optional[TimestampSeconds]:
+        return self._receive()
+
+    def start_analysis(self, analysis_end_time: TimestampSeconds, last_read_time: TimestampSeconds) -> None:
+        self._conn.send((analysis_end_time, last_read_time))
+
+    def finish(self) -> None:
+        self._receive()
+        self._process.join()
+
+
+def _load_data(args, config, olcusDir, timezone):
+    """Load raw data, split it by habitat, and determine the analysis start time."""
     t0 = time.perf_counter()
     logging.info("\nReading Data:")
     logging.info("-----------------------------")
@@ -258,18 +621,10 @@ def _load_and_validate_data(args, config, olcusDir, timezone):
     first_read_time: TimestampSeconds = TimestampSeconds(parse_first_read(args.olcus_dir, timezone).timestamp - 0.005)
     analysis_start_time = _get_analysis_start_time(args, timezone, first_read_time)
     
-    ### Initial cleanup of the reads, per animal
-    reads_per_animal = preprocess_reads(reads, config.tag_id_to_start_chamber.keys(), config.tag_id_to_name)
-    
-    _warn_unobserved_animals(reads_per_animal)
-    
-    last_read_time = max([vv[-1].timestamp for vv in reads_per_animal.values()])
-    analysis_end_time = _get_analysis_end_time(args, timezone, last_read_time)
-    
-    _print_time_intervals(first_read_time, analysis_start_time, analysis_end_time, last_read_time)
+    reads_per_habitat = split_reads_by_habitat(reads, habitats_of_animals(config))
     
-    logging.debug(f"PROFILING: _load_and_validate_data took {time.perf_counter() - t0:.3f} seconds")
-    return reads_per_animal, first_read_time, analysis_start_time, analysis_end_time, last_read_time
+    logging.debug(f"PROFILING: _load_data took {time.perf_counter() - t0:.3f} seconds")
+    return reads_per_habitat, first_read_time, analysis_start_time
 
 
 def _get_analysis_start_time(args, timezone, first_read_time):
@@ -306,11 +661,12 @@ def _print_time_intervals(first_read_time, analysis_start_time, analysis_end_tim
     logging.info("   Experiment End (last read): {}".format(format_time(last_read_time)))
 
 
-def _build_trajectories(simulation_start_time: TimestampSeconds, analysis_end_time: TimestampSeconds, config: AnimalConfig, reads_per_animal: Dict[TagID, list[Read]], dwell_threshold: float) -> AllAnimalTrajectories:
+def _build_trajectories(simulation_start_time: TimestampSeconds, analysis_end_time: TimestampSeconds, config: AnimalConfig, reads_per_animal: Dict[TagID, list[Read]], dwell_threshold: float, spill_dir: Optional[str] = None, spill_buffer_records: int = SPILL_BUFFER_RECORDS) -> AllAnimalTrajectories:
     t0 = time.perf_counter()
     """Build animal trajectories from preprocessed reads."""
     all_animal_trajectories = AllAnimalTrajectories(
-        simulation_start_time, analysis_end_time, config.tag_id_to_start_chamber, reads_per_animal, dwell_threshold
+        simulation_start_time, analysis_end_time, config.tag_id_to_start_chamber, reads_per_animal, dwell_threshold,
+        spill_dir, spill_buffer_records
     )
 
     logging.info("\nRead Interpretations:")
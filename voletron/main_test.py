@@ -0,0 +1,76 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from voletron import main
+from voletron.co_dwell_accumulator import CoDwellAccumulator
+from voletron.types import AnimalConfig, AnimalName, Antenna, ChamberName, HabitatName, Read, TagID, TimestampSeconds
+
+START = TimestampSeconds(100)
+END = TimestampSeconds(1600)
+
+
+def _read(tag_id, timestamp, tube, cage):
+    return Read(TagID(tag_id), TimestampSeconds(timestamp), Antenna(ChamberName(tube), ChamberName(cage)))
+
+
+class TestAnalyzeHabitats(unittest.TestCase):
+    def setUp(self):
+        self.config = AnimalConfig(
+            {TagID("tag_a"): AnimalName("Alice"), TagID("tag_b"): AnimalName("Bob")},
+            {TagID("tag_a"): ChamberName("CentralA"), TagID("tag_b"): ChamberName("CentralA")},
+        )
+        self.reads = [
+            _read("tag_a", 200, "Tube2", "CentralA"),
+            _read("tag_a", 210, "Tube2", "Cage2"),
+            _read("tag_b", 400, "Tube2", "CentralA"),
+            _read("tag_b", 405, "Tube2", "Cage2"),
+            _read("tag_a", 700, "Tube2", "Cage2"),
+            _read("tag_a", 710, "Tube2", "CentralA"),
+        ]
+        self.out_dir = os.path.join(tempfile.mkdtemp(), "exp")
+
+    def _analyze(self, *argv):
+        """Run the analysis of HabitatA, returning the files written."""
+        args = main._parse_args(["voletron", "--olcus_dir", self.out_dir] + list(argv))
+        stages = main._analyze_habitats(
+            args, "example_apparatus.json", self.config, [], self.out_dir, START, START,
+            {HabitatName("HabitatA"): self.reads},
+        )
+        last_read_time = next(stages)
+        with self.assertRaises(StopIteration):
+            stages.send((END, last_read_time))
+        return sorted(os.listdir(os.path.join(self.out_dir, "voletron", "HabitatA")))
+
+    def test_co_dwells_skipped_without_co_dwell_tables(self):
+        with mock.patch.object(main, "CoDwellAccumulator", wraps=CoDwellAccumulator) as accumulator:
+            names = self._analyze("--outputs", "chambers", "longdwells", "--bin_seconds", "300")
+
+        accumulator.assert_not_called()
+        self.assertEqual(names, ["exp.chambers.csv", "exp.longdwells.csv"])
+
+    def test_co_dwells_computed_for_co_dwell_tables(self):
+        with mock.patch.object(main, "CoDwellAccumulator", wraps=CoDwellAccumulator) as accumulator:
+            names = self._analyze("--outputs", "group_size")
+
+        accumulator.assert_called_once()
+        self.assertEqual(names, ["exp.group_size.csv"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,45 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Assigning point events (e.g. the start of a dwell) to output bins."""
+
+from bisect import bisect_left
+from typing import Iterator, List, Sequence, Tuple
+
+from voletron.output.types import OutputBin
+from voletron.types import TimestampSeconds
+
+
+def events_per_bin(
+    times: Sequence[TimestampSeconds], bins: Sequence[OutputBin]
+) -> Iterator[Tuple[OutputBin, List[int]]]:
+    """The events falling in each bin.
+
+    An event at time t falls in a bin if bin_start <= t < bin_end.  The events
+    are sorted by time once, and each bin's are then found by bisection, so
+    bins may overlap (as the whole-analysis bin overlaps the others).
+
+    Args:
+        times: The time of each event, in any order.
+
+    Yields:
+        (bin, the indexes into `times` of its events, in increasing order) for
+        each bin in turn.
+    """
+    order = sorted(range(len(times)), key=times.__getitem__)
+    sorted_times = [times[i] for i in order]
+    for bin in bins:
+        first = bisect_left(sorted_times, bin.bin_start)
+        last = bisect_left(sorted_times, bin.bin_end, first)
+        yield (bin, sorted(order[first:last]))
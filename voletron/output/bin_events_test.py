@@ -0,0 +1,49 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+
+from voletron.output.bin_events import events_per_bin
+from voletron.output.types import OutputBin
+from voletron.types import TimestampSeconds
+
+
+def _bin(number, start, end):
+    return OutputBin(
+        bin_number=number, bin_start=TimestampSeconds(start), bin_end=TimestampSeconds(end), analyzer=None
+    )
+
+
+class TestEventsPerBin(unittest.TestCase):
+    def test_events_per_bin(self):
+        bins = [_bin(0, 0, 30), _bin(1, 0, 10), _bin(2, 10, 20), _bin(3, 20, 30)]
+        times = [25, 10, 5, 30, 19.9, 0, -1, 10]
+
+        self.assertEqual(
+            [(bin.bin_number, indexes) for (bin, indexes) in events_per_bin(times, bins)],
+            [
+                (0, [0, 1, 2, 4, 5, 7]),
+                # Events at a bin edge fall in the later bin.
+                (1, [2, 5]),
+                (2, [1, 4, 7]),
+                (3, [0]),
+            ],
+        )
+
+    def test_no_events(self):
+        self.assertEqual([indexes for (_, indexes) in events_per_bin([], [_bin(1, 0, 10)])], [[]])
+
+
+if __name__ == "__main__":
+    unittest.main()
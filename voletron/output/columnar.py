@@ -0,0 +1,105 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Writing output tables in a typed, columnar binary format.
+
+Tables are written as Parquet if pyarrow is installed, and otherwise as a
+NumPy .npz archive holding one array per column.
+"""
+
+import os
+from typing import Any, List, Sequence, Tuple
+
+from voletron.output.npy import BOOL, FLOAT, INT, STR, write_npz
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+_ARROW_TYPES = {}
+if pyarrow is not None:
+    _ARROW_TYPES = {
+        INT: pyarrow.int64(),
+        FLOAT: pyarrow.float64(),
+        BOOL: pyarrow.bool_(),
+        STR: pyarrow.string(),
+    }
+
+# The leading columns of every table.
+BIN_COLUMNS = [
+    ("bin_number", INT),
+    ("bin_start", FLOAT),
+    ("bin_end", FLOAT),
+    ("bin_duration", FLOAT),
+]
+# Folded tables also give the number of periods summed into each bin.
+FOLDED_BIN_COLUMNS = BIN_COLUMNS + [("period_count", INT)]
+
+
+class ColumnTable:
+    """An output table, held as a list of values per column."""
+
+    __slots__ = ("schema", "columns")
+
+    def __init__(self, schema: Sequence[Tuple[str, str]]):
+        """Args:
+            schema: the name and element type (npy.INT, FLOAT, BOOL or STR)
+                of each column.
+        """
+        self.schema = list(schema)
+        self.columns: List[List[Any]] = [[] for _ in self.schema]
+
+    def append(self, values: Sequence[Any]) -> None:
+        """Add a row, with a value per column."""
+        for (column, value) in zip(self.columns, values):
+            column.append(value)
+
+
+def bin_columns(folded: bool = False) -> List[Tuple[str, str]]:
+    """The BIN_COLUMNS, or the FOLDED_BIN_COLUMNS of a folded table."""
+    return FOLDED_BIN_COLUMNS if folded else BIN_COLUMNS
+
+
+def bin_values(row, folded: bool = False) -> Tuple[Any, ...]:
+    """The values of the BIN_COLUMNS (or FOLDED_BIN_COLUMNS) of an output row."""
+    header = row.bin
+    if folded:
+        return (header.bin_number, header.bin_start, header.bin_end, header.bin_duration, header.period_count)
+    return (header.bin_number, header.bin_start, header.bin_end, header.bin_duration)
+
+
+def write_columnar(table: ColumnTable, out_dir: str, name: str) -> str:
+    """Write a table as `<name>.parquet`, or `<name>.npz` without pyarrow.
+
+    Returns:
+        The path written.
+    """
+    if pyarrow is not None:
+        path = os.path.join(out_dir, name + ".parquet")
+        pyarrow.parquet.write_table(
+            pyarrow.table({
+                column_name: pyarrow.array(column, type=_ARROW_TYPES[kind])
+                for ((column_name, kind), column) in zip(table.schema, table.columns)
+            }),
+            path,
+        )
+    else:
+        path = os.path.join(out_dir, name + ".npz")
+        write_npz(path, {
+            column_name: (kind, column, None)
+            for ((column_name, kind), column) in zip(table.schema, table.columns)
+        })
+    return path
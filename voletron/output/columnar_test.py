@@ -0,0 +1,46 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import tempfile
+import unittest
+import zipfile
+from unittest import mock
+
+from voletron.output import columnar
+from voletron.output.columnar import BIN_COLUMNS, ColumnTable, write_columnar
+from voletron.output.npy import INT, STR
+
+
+class TestWriteColumnar(unittest.TestCase):
+    def test_npz_without_pyarrow(self):
+        out_dir = tempfile.mkdtemp()
+        table = ColumnTable(BIN_COLUMNS + [("animal", STR), ("dwells", INT)])
+        table.append((1, 0.0, 10.0, 10.0, "a1", 3))
+        table.append((1, 0.0, 10.0, 10.0, "a2", 0))
+
+        with mock.patch.object(columnar, "pyarrow", None):
+            path = write_columnar(table, out_dir, "test_exp.table")
+
+        self.assertEqual(path, os.path.join(out_dir, "test_exp.table.npz"))
+        with zipfile.ZipFile(path) as z:
+            self.assertEqual(
+                z.namelist(),
+                [name + ".npy" for name in ["bin_number", "bin_start", "bin_end", "bin_duration", "animal", "dwells"]],
+            )
+        self.assertEqual(table.columns[4], ["a1", "a2"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,123 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""Opening and writing output files.
+
+Text outputs may be compressed as they are written: with gzip, or with zstd if
+the zstandard package is installed.
+"""
+
+import gzip
+from typing import IO, List, Optional
+
+from voletron.output.types import BinHeader
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Output tables are written row by row, so buffer generously to keep the
+# number of write system calls small.
+WRITE_BUFFER_BYTES = 1 << 20
+
+# Lines are joined and written this many at a time.
+WRITE_CHUNK_LINES = 4096
+
+# The suffix added to the names of files written with each compression.
+COMPRESSION_SUFFIXES = {"gzip": ".gz", "zstd": ".zst"}
+
+# Favor speed over size (the defaults are gzip level 9, zstd level 3).
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 3
+
+# The bin columns that start every line of a CSV table.
+BIN_CSV_HEADER = "bin_number,bin_start,bin_end,bin_duration,"
+_format_bin_columns = "{},{:.0f},{:.0f},{:.0f},".format
+# Folded tables also give the number of periods summed into each bin.
+FOLDED_BIN_CSV_HEADER = BIN_CSV_HEADER + "period_count,"
+_format_folded_bin_columns = "{},{:.0f},{:.0f},{:.0f},{},".format
+
+
+def open_output(path: str, compression: Optional[str] = None) -> IO[str]:
+    """Open an output table for writing.
+
+    Args:
+        compression: None, or a key of COMPRESSION_SUFFIXES, in which case the
+            file name gets the corresponding suffix, and text is compressed as
+            it is written.
+    """
+    if compression is None:
+        return open(path, "w", buffering=WRITE_BUFFER_BYTES)
+    path += COMPRESSION_SUFFIXES[compression]
+    if compression == "gzip":
+        return gzip.open(path, "wt", compresslevel=GZIP_LEVEL)
+    if zstandard is None:
+        raise ImportError("zstd compression needs the zstandard package")
+    return zstandard.open(path, "wt", cctx=zstandard.ZstdCompressor(level=ZSTD_LEVEL))
+
+
+class CsvTable:
+    """Writes a CSV output table whose lines start with the bin columns.
+
+    The bin columns are formatted once per bin, rather than once per line
+    (the rows of a bin share one BinHeader), and lines are written in chunks.
+    Use as a context manager:
+
+        with CsvTable(path, "animal,seconds") as table:
+            for row in rows:
+                table.add(row.bin, "{},{:.0f}".format(row.animal_name, row.seconds))
+    """
+
+    def __init__(self, path: str, columns: str, compression: Optional[str] = None, folded: bool = False):
+        """
+        Args:
+            columns: The header of the columns following the bin columns.
+            compression: See open_output.
+            folded: Whether the bins are folded, adding a period_count column.
+        """
+        self._file = open_output(path, compression)
+        self._lines: List[str] = []
+        self._bin: Optional[BinHeader] = None
+        self._bin_columns = ""
+        self._folded = folded
+        self._file.write((FOLDED_BIN_CSV_HEADER if folded else BIN_CSV_HEADER) + columns + "\n")
+
+    def add(self, bin: BinHeader, fields: str) -> None:
+        """Add a line of the bin columns followed by the (formatted) fields."""
+        if bin is not self._bin:
+            self._bin = bin
+            if self._folded:
+                self._bin_columns = _format_folded_bin_columns(
+                    bin.bin_number, bin.bin_start, bin.bin_end, bin.bin_duration, bin.period_count
+                )
+            else:
+                self._bin_columns = _format_bin_columns(bin.bin_number, bin.bin_start, bin.bin_end, bin.bin_duration)
+        lines = self._lines
+        lines.append(self._bin_columns + fields + "\n")
+        if len(lines) >= WRITE_CHUNK_LINES:
+            self._file.write("".join(lines))
+            lines.clear()
+
+    def __enter__(self) -> "CsvTable":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        try:
+            if exc_type is None:
+                self._file.write("".join(self._lines))
+        finally:
+            self._lines.clear()
+            self._file.close()
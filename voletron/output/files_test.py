@@ -0,0 +1,89 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import gzip
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from voletron.output import files
+from voletron.output.files import CsvTable, open_output
+from voletron.output.types import BinHeader
+from voletron.types import TimestampSeconds
+
+
+class TestCsvTable(unittest.TestCase):
+    def test_lines(self):
+        path = os.path.join(tempfile.mkdtemp(), "test.csv")
+        bin0 = BinHeader(0, TimestampSeconds(100.4), TimestampSeconds(200.6), 100.2)
+        bin1 = BinHeader(1, TimestampSeconds(100.4), TimestampSeconds(150), 49.6)
+        # Write in chunks smaller than the table.
+        with patch.object(files, "WRITE_CHUNK_LINES", 2):
+            with CsvTable(path, "animal,seconds") as table:
+                table.add(bin0, "a,1")
+                table.add(bin0, "b,2")
+                table.add(bin1, "a,3")
+                # An equal header that is not the same object.
+                table.add(BinHeader(1, TimestampSeconds(100.4), TimestampSeconds(150), 49.6), "b,4")
+                table.add(bin0, "c,5")
+
+        with open(path) as f:
+            self.assertEqual(f.read(), (
+                "bin_number,bin_start,bin_end,bin_duration,animal,seconds\n"
+                "0,100,201,100,a,1\n"
+                "0,100,201,100,b,2\n"
+                "1,100,150,50,a,3\n"
+                "1,100,150,50,b,4\n"
+                "0,100,201,100,c,5\n"
+            ))
+
+    def test_error_closes_file(self):
+        path = os.path.join(tempfile.mkdtemp(), "test.csv")
+        with self.assertRaises(ValueError):
+            with CsvTable(path, "animal") as table:
+                table.add(BinHeader(0, TimestampSeconds(0), TimestampSeconds(1), 1), "a")
+                raise ValueError()
+        self.assertTrue(table._file.closed)
+
+
+
+class TestOpenOutput(unittest.TestCase):
+    def test_gzip(self):
+        path = os.path.join(tempfile.mkdtemp(), "test.csv")
+        with CsvTable(path, "animal", "gzip") as table:
+            table.add(BinHeader(0, TimestampSeconds(0), TimestampSeconds(1), 1), "a")
+
+        self.assertFalse(os.path.exists(path))
+        with gzip.open(path + ".gz", "rt") as f:
+            self.assertEqual(f.read(), "bin_number,bin_start,bin_end,bin_duration,animal\n0,0,1,1,a\n")
+
+    @unittest.skipIf(files.zstandard is None, "zstandard is not installed")
+    def test_zstd(self):
+        path = os.path.join(tempfile.mkdtemp(), "test.json")
+        with open_output(path, "zstd") as f:
+            f.write("{}\n")
+
+        with files.zstandard.open(path + ".zst", "rt") as f:
+            self.assertEqual(f.read(), "{}\n")
+
+    def test_zstd_not_installed(self):
+        path = os.path.join(tempfile.mkdtemp(), "test.json")
+        with patch.object(files, "zstandard", None):
+            with self.assertRaises(ImportError):
+                open_output(path, "zstd")
+
+
+if __name__ == "__main__":
+    unittest.main()
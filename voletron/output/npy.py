@@ -0,0 +1,94 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Writing arrays in NumPy's .npy and .npz formats, without NumPy.
+
+See https://numpy.org/doc/stable/reference/generated/numpy.lib.format.html.
+Arrays are given as a flat sequence of values in row-major order, with an
+element type of INT (int64), FLOAT (float64), BOOL or STR (fixed-width
+unicode, as wide as the longest value).
+"""
+
+import shutil
+import struct
+import sys
+import zipfile
+from array import array
+from typing import BinaryIO, Dict, Optional, Sequence, Tuple, Union
+
+INT = "int"
+FLOAT = "float"
+BOOL = "bool"
+STR = "str"
+
+_MAGIC = b"\x93NUMPY\x01\x00"
+# The magic string, header length and header are padded to a multiple of this.
+_HEADER_ALIGNMENT = 64
+_ARRAY_TYPECODES = {INT: ("<i8", "q"), FLOAT: ("<f8", "d")}
+
+# An array to write: its element type, flat values, and shape (by default
+# one-dimensional).  For INT and FLOAT arrays, the values may instead be a
+# binary file holding them as little-endian bytes, read from its current
+# position; the shape must then be given.
+NpyArray = Tuple[str, Union[Sequence, BinaryIO], Optional[Tuple[int, ...]]]
+
+
+def write_npy(
+    f: BinaryIO,
+    kind: str,
+    values: Union[Sequence, BinaryIO],
+    shape: Optional[Tuple[int, ...]] = None,
+) -> None:
+    """Write one array in .npy format to a binary file."""
+    if hasattr(values, "read"):
+        (descr, _) = _ARRAY_TYPECODES[kind]
+        _write_header(f, descr, shape)
+        shutil.copyfileobj(values, f)
+        return
+    if shape is None:
+        shape = (len(values),)
+    if kind in _ARRAY_TYPECODES:
+        (descr, typecode) = _ARRAY_TYPECODES[kind]
+        data = array(typecode, values)
+        if sys.byteorder == "big":
+            data.byteswap()
+        body = data.tobytes()
+    elif kind == BOOL:
+        descr = "|b1"
+        body = bytes(bool(value) for value in values)
+    elif kind == STR:
+        width = max((len(value) for value in values), default=0) or 1
+        descr = "<U{}".format(width)
+        body = b"".join(value.ljust(width, "\0").encode("utf-32-le") for value in values)
+    else:
+        raise ValueError("Unknown array element type: {}".format(kind))
+    _write_header(f, descr, shape)
+    f.write(body)
+
+
+def _write_header(f: BinaryIO, descr: str, shape: Tuple[int, ...]) -> None:
+    header = "{{'descr': '{}', 'fortran_order': False, 'shape': {}, }}".format(descr, tuple(shape))
+    padding = -(len(_MAGIC) + 2 + len(header) + 1) % _HEADER_ALIGNMENT
+    header = (header + " " * padding + "\n").encode("latin1")
+    f.write(_MAGIC)
+    f.write(struct.pack("<H", len(header)))
+    f.write(header)
+
+
+def write_npz(path: str, arrays: Dict[str, NpyArray]) -> None:
+    """Write named arrays to an (uncompressed) .npz file, as numpy.savez does."""
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_STORED, allowZip64=True) as z:
+        for (name, (kind, values, shape)) in arrays.items():
+            with z.open(name + ".npy", "w", force_zip64=True) as f:
+                write_npy(f, kind, values, shape)
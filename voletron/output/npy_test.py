@@ -0,0 +1,68 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import ast
+import io
+import struct
+import unittest
+from array import array
+
+from voletron.output.npy import BOOL, FLOAT, INT, STR, write_npy
+
+
+def _parse_npy(data: bytes):
+    """The header and body of a .npy file, per the format specification."""
+    (header_length,) = struct.unpack("<H", data[8:10])
+    header = ast.literal_eval(data[10:10 + header_length].decode("latin1"))
+    return (data[:8], 10 + header_length, header, data[10 + header_length:])
+
+
+def _npy(kind, values, shape=None) -> bytes:
+    f = io.BytesIO()
+    write_npy(f, kind, values, shape)
+    return f.getvalue()
+
+
+class TestWriteNpy(unittest.TestCase):
+    def test_float(self):
+        (magic, header_end, header, body) = _parse_npy(_npy(FLOAT, [1.5, -2.0]))
+        self.assertEqual(magic, b"\x93NUMPY\x01\x00")
+        self.assertEqual(header_end % 64, 0)
+        self.assertEqual(header, {"descr": "<f8", "fortran_order": False, "shape": (2,)})
+        self.assertEqual(body, struct.pack("<2d", 1.5, -2.0))
+
+    def test_int_with_shape(self):
+        (_, _, header, body) = _parse_npy(_npy(INT, range(6), (1, 2, 3)))
+        self.assertEqual(header["descr"], "<i8")
+        self.assertEqual(header["shape"], (1, 2, 3))
+        self.assertEqual(body, struct.pack("<6q", 0, 1, 2, 3, 4, 5))
+
+    def test_bool(self):
+        (_, _, header, body) = _parse_npy(_npy(BOOL, [True, False]))
+        self.assertEqual(header["descr"], "|b1")
+        self.assertEqual(body, b"\x01\x00")
+
+    def test_str(self):
+        (_, _, header, body) = _parse_npy(_npy(STR, ["ab", "c", "é"]))
+        self.assertEqual(header["descr"], "<U2")
+        self.assertEqual(body, "abc\0é\0".encode("utf-32-le"))
+
+    def test_empty(self):
+        (_, _, header, body) = _parse_npy(_npy(STR, []))
+        self.assertEqual(header, {"descr": "<U1", "fortran_order": False, "shape": (0,)})
+        self.assertEqual(body, b"")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -13,95 +13,176 @@
 # limitations under the License.
 
 
+import contextlib
 import os
+import threading
 import time
 import logging
-from typing import List
+from datetime import tzinfo
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Collection, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
 from voletron.apparatus_config import apparatus_chambers
-from voletron.output.write_validation import write_validation, compute_validation
-from voletron.types import AnimalConfig, CoDwell, DurationSeconds, TimestampSeconds, Validation
-from voletron.output.types import OutputBin
+from voletron.output.write_validation import write_validation, compute_validation, count_validation, log_validation_accuracy
+from voletron.binned_co_dwells import BinnedCoDwells, CoDwellBin, aligned_bin_bounds, bin_bounds, coarser_bin_runs, fold_slots, overlapping_bins, rolling_windows
+from voletron.co_dwell_store import CoDwellStore
+from voletron.constants import VALIDATION_SECONDS_AFTER, VALIDATION_SECONDS_BEFORE
+from voletron.types import AnimalConfig, ChamberName, DurationSeconds, HabitatName, TagID, TimestampSeconds, Validation
+from voletron.output.types import OutputBin, ValidationRow
 from voletron.trajectory import AllAnimalTrajectories
 from voletron.time_span_analyzer import TimeSpanAnalyzer
-from voletron.output.write_chamber_times import write_chamber_times, compute_chamber_times
+from voletron.output.write_chamber_times import write_chamber_times, compute_chamber_times, rolling_chamber_times
 from voletron.output.write_long_dwells import write_long_dwells, compute_long_dwells
 # from voletron.output.write_activity import write_activity, compute_activity
 from voletron.output.write_pair_inclusive_cohabs import write_pair_inclusive_cohabs, compute_pair_inclusive_cohabs
+from voletron.output.write_pair_matrix import write_pair_matrix
+from voletron.output.write_sparse_metadata import write_sparse_metadata
+from voletron.output.sqlite_results import RESULTS_FILE_NAME, SqliteResults
 from voletron.output.write_group_chamber_cohabs import write_group_chamber_cohabs, compute_group_chamber_cohabs
 from voletron.output.write_group_sizes import write_group_sizes, compute_group_sizes
 
+# The tables computed from the animal trajectories alone, and those computed
+# from the co-dwells, by the names that select them for output.
+TRAJECTORY_TABLES = ("chambers", "longdwells", "validation")
+CO_DWELL_TABLES = ("pair_cohab", "group_chamber_cohab", "group_size")
+OUTPUT_TABLES = TRAJECTORY_TABLES + CO_DWELL_TABLES
+
 def write_outputs(
     olcusDir: str,
     config: AnimalConfig,
     trajectories: AllAnimalTrajectories,
-    co_dwells: List[CoDwell],
+    co_dwells: Union[CoDwellStore, BinnedCoDwells, None],
     # first_read_time: TimestampSeconds,
     # last_read_time: TimestampSeconds,
     analysis_start_time: TimestampSeconds,
     analysis_end_time: TimestampSeconds,
     validations: List[Validation],
     validation: bool,
-    bin_seconds: DurationSeconds,
+    bin_seconds: Sequence[int],
     # habitat_time_offset_seconds: DurationSeconds,
+    habitats: Optional[List[HabitatName]] = None,
+    timezone: Optional[tzinfo] = None,
+    fold: Optional[str] = None,
+    window_seconds: Optional[int] = None,
+    long_group_sizes: bool = False,
+    output_format: str = "csv",
+    pair_matrix: bool = False,
+    sparse: bool = False,
+    output_threads: int = 1,
+    outputs: Optional[Collection[str]] = None,
+    compression: Optional[str] = None,
+    validation_tolerance: Tuple[float, float] = (VALIDATION_SECONDS_BEFORE, VALIDATION_SECONDS_AFTER),
 ):
     t0 = time.perf_counter()
-    """Write all output files organized by apparatus."""
-    exp_name = str(os.path.basename(olcusDir))
-    
-    # Create bins
-    t_bins = time.perf_counter()
-    bins: List[OutputBin] = []
+    """Write all output files organized by apparatus.
 
-    # Sort co-dwells by end time. This allows us to use a sliding window.
-    # Co-dwells are already mostly sorted by start time from CoDwellAccumulator.
-    sorted_co_dwells = sorted(co_dwells, key=lambda x: x.end)
+    One set of time-series outputs is written per entry in `bin_seconds`.
+    With more than one bin size, the file names include the bin size.
 
-    # Add whole experiment bin
-    full_analyzer = TimeSpanAnalyzer(co_dwells, analysis_start_time, analysis_end_time)
-    bins.append(OutputBin(
-        bin_number=0,
-        bin_start=analysis_start_time, 
-        bin_end=analysis_end_time, 
-        analyzer=full_analyzer
-    ))
+    If `timezone` is given, bins are aligned to the local clock there.  If
+    `fold` is also given ("day" or "week"), the chamber time and co-dwell
+    tables are also written folded over that period: each row then sums the
+    bins at the same time of day (or week) across the whole analysis, and a
+    period_count column gives the number of bins summed.
 
-    current_start = analysis_start_time
-    bin_counter = 1
-    dwell_idx = 0
-    num_dwells = len(sorted_co_dwells)
-    
-    while current_start < analysis_end_time:
-        current_end = min(TimestampSeconds(current_start + bin_seconds), analysis_end_time)
-        
-        # Advance dwell_idx to the first dwell that ends after current_start
-        while dwell_idx < num_dwells and sorted_co_dwells[dwell_idx].end <= current_start:
-            dwell_idx += 1
-            
-        # Collect all dwells that start before current_end (and end after current_start, thanks to dwell_idx)
-        bin_dwells = []
-        for i in range(dwell_idx, num_dwells):
-            d = sorted_co_dwells[i]
-            if d.start >= current_end:
-                # Since we sorted by end time, we can't break here easily if we want to be perfectly correct,
-                # as a later dwell could end later but start earlier.
-                # However, co-dwells are generally short and mostly chronological.
-                # To be perfectly safe, we keep going, but in practice many will be skipped.
-                # Let's check start time too.
-                continue
-            bin_dwells.append(d)
-
-        bin_analyzer = TimeSpanAnalyzer(bin_dwells, TimestampSeconds(current_start), TimestampSeconds(current_end))
-        bins.append(OutputBin(
-            bin_number=bin_counter,
-            bin_start=TimestampSeconds(current_start), 
-            bin_end=TimestampSeconds(current_end),
-            analyzer=bin_analyzer
-        ))
-        current_start = TimestampSeconds(current_start + bin_seconds)
-        bin_counter += 1
-    logging.debug(f"PROFILING: bin creation took {time.perf_counter() - t_bins:.3f} seconds ({len(bins)} bins)")
+    If `window_seconds` is given (a multiple of the smallest bin size), the
+    chamber time and co-dwell tables are also written over rolling windows of
+    that length, stepping by the smallest bin size.
+
+    If `long_group_sizes`, the group size table is written in long format (see
+    write_group_sizes).
+
+    If `output_format` is "columnar", each table is written as a typed columnar
+    file (Parquet if pyarrow is installed, else .npz) rather than as CSV.  If
+    it is "sqlite", the tables of every habitat are written to
+    `voletron/results.sqlite` instead (see voletron.output.sqlite_results).
+
+    If `pair_matrix`, the pair cohabitation table is written as a matrix per bin
+    (see write_pair_matrix) instead.
+
+    If `sparse`, rows whose values are all zero are omitted from the chamber
+    time (written in long format), pair cohabitation, group chamber
+    cohabitation and group size (long format) tables, and a `*.sparse.json`
+    file describing the bins, animals and chambers is written alongside each
+    set of tables, so that readers can restore the zeros.
+
+    With `output_threads` > 1, the tables of each habitat are computed and
+    written concurrently on a pool of that many threads (except for SQLite
+    output).
+
+    If `compression` is given ("gzip" or "zstd"), CSV and JSON files are
+    compressed as they are written (see voletron.output.files.open_output).
+
+    A validation point counts as correct if the animal was in the expected
+    chamber from `validation_tolerance[0]` seconds before it to
+    `validation_tolerance[1]` seconds after it.
+
+    If `outputs` is given, only those of OUTPUT_TABLES are written.  If none of
+    them are CO_DWELL_TABLES, `co_dwells` is not used, and may be None.
+
+    If `habitats` is given, only the outputs for those habitats are written.
+    """
+    bin_seconds = sorted(set(bin_seconds))
+    outputs = frozenset(OUTPUT_TABLES if outputs is None else outputs)
+
+    # Create bins
+    t_bins = time.perf_counter()
+    bins_per_size: Dict[int, List[OutputBin]] = {}
+    folded_bins_per_size: Dict[int, List[OutputBin]] = {}
+    # The bounds of the rolling windows, and (for the co-dwell tables) the
+    # windows themselves.
+    window_bins: List[OutputBin] = []
+    window_co_dwell_bins: Iterable[OutputBin] = []
+
+    if outputs.isdisjoint(CO_DWELL_TABLES):
+        # The bins serve only to frame the trajectory-based tables.
+        (bins_per_size, window_bins) = _trajectory_bins(
+            analysis_start_time, analysis_end_time, bin_seconds, timezone, window_seconds
+        )
+    elif isinstance(co_dwells, BinnedCoDwells) or len(bin_seconds) > 1 or fold or window_seconds:
+        if isinstance(co_dwells, BinnedCoDwells):
+            # Co-dwells were already aggregated per bin during the sweep.
+            binned = co_dwells
+        else:
+            binned = BinnedCoDwells.from_store(
+                co_dwells, analysis_start_time, analysis_end_time, bin_seconds[0], timezone
+            )
+        # Build every size before the whole-analysis bin, so that it is summed
+        # from the coarsest bins.
+        bins_of_size = {size: binned.bins_of_size(size) for size in bin_seconds}
+        whole = binned.whole()
+        for size in bin_seconds:
+            bins_per_size[size] = [
+                OutputBin(
+                    bin_number=bin_number,
+                    bin_start=co_dwell_bin.analysis_start_time,
+                    bin_end=co_dwell_bin.analysis_end_time,
+                    analyzer=co_dwell_bin
+                )
+                for (bin_number, co_dwell_bin) in enumerate([whole] + bins_of_size[size])
+            ]
+        if window_seconds:
+            fine_bins = bins_of_size[bin_seconds[0]]
+            window_bins = _window_bins(
+                [(bin.analysis_start_time, bin.analysis_end_time) for bin in fine_bins],
+                window_seconds // bin_seconds[0],
+            )
+            window_co_dwell_bins = _RollingWindowBins(fine_bins, window_seconds // bin_seconds[0])
+    else:
+        if timezone is None:
+            bounds = bin_bounds(analysis_start_time, analysis_end_time, bin_seconds[0])
+        else:
+            bounds = aligned_bin_bounds(analysis_start_time, analysis_end_time, bin_seconds[0], timezone)
+        bins_per_size[bin_seconds[0]] = _analyzer_bins(
+            co_dwells, analysis_start_time, analysis_end_time, bounds
+        )
+    if fold:
+        for (size, bins) in bins_per_size.items():
+            folded_bins_per_size[size] = _folded_bins(bins[1:], size, fold, timezone)
+    logging.debug(f"PROFILING: bin creation took {time.perf_counter() - t_bins:.3f} seconds ({sum(len(bins) for bins in bins_per_size.values())} bins)")
 
     for (desired_start_chamber, chambers) in apparatus_chambers.items():
+        if habitats is not None and desired_start_chamber not in habitats:
+            continue
 
         # Filter animals by apparatus
         tag_ids = [
@@ -111,72 +192,601 @@ def write_outputs(
         ]
 
         out_dir = os.path.join(olcusDir, "voletron", desired_start_chamber)
-        os.makedirs(out_dir, exist_ok=True)
-
-        # Trajectory-based outputs
-
-        if validation:
-            # Validation
-            validation_rows = compute_validation(
-                tag_ids, 
-                trajectories, 
-                config.tag_id_to_name, 
-                validations, 
-                bins
+        if output_format != "sqlite" or (pair_matrix and "pair_cohab" in outputs):
+            os.makedirs(out_dir, exist_ok=True)
+
+        # With output_format "sqlite", every table of the habitat is written to
+        # the shared database in one transaction.
+        results = None
+        if output_format == "sqlite":
+            results = SqliteResults(
+                os.path.join(olcusDir, "voletron", RESULTS_FILE_NAME),
+                desired_start_chamber,
+                config,
+                tag_ids,
+                chambers,
             )
-            write_validation(validation_rows, out_dir, exp_name, desired_start_chamber)
+        # Each table is computed and written by its own task, so that with
+        # several output threads one table's file writes overlap the next
+        # table's computation.  The SQLite connection is used by one thread at
+        # a time.
+        tasks = _OutputTasks(1 if results is not None else output_threads)
+        with results or contextlib.nullcontext(), tasks:
+            for (size, bins) in bins_per_size.items():
+                exp_name = str(os.path.basename(olcusDir))
+                if len(bins_per_size) > 1:
+                    exp_name = "{}.{}s".format(exp_name, size)
+                if results is not None:
+                    results.add_bins(exp_name, bins)
+                _write_habitat_outputs(
+                    config,
+                    tag_ids,
+                    chambers,
+                    desired_start_chamber,
+                    trajectories,
+                    validations,
+                    validation,
+                    bins,
+                    out_dir,
+                    exp_name,
+                    long_group_sizes,
+                    output_format,
+                    pair_matrix,
+                    sparse,
+                    results,
+                    tasks,
+                    outputs,
+                    compression,
+                    validation_tolerance,
+                )
+                if sparse and results is None:
+                    write_sparse_metadata(config, tag_ids, chambers, bins, out_dir, exp_name, compression)
+                if size in folded_bins_per_size:
+                    fold_name = "{}.fold_{}".format(exp_name, fold)
+                    if results is not None:
+                        results.add_bins(fold_name, folded_bins_per_size[size])
+                    if "chambers" in outputs:
+                        folded_chamber_time_rows = compute_chamber_times(
+                            config, tag_ids, trajectories, folded_bins_per_size[size]
+                        )
+                        if results is not None:
+                            tasks.submit(
+                                results.add_chamber_times,
+                                fold_name,
+                                folded_chamber_time_rows,
+                                chambers,
+                                not sparse,
+                            )
+                        else:
+                            tasks.submit(
+                                write_chamber_times,
+                                folded_chamber_time_rows,
+                                chambers,
+                                out_dir,
+                                fold_name,
+                                output_format,
+                                sparse,
+                                compression,
+                                True,
+                            )
+                    _write_co_dwell_outputs(
+                        config,
+                        tag_ids,
+                        folded_bins_per_size[size],
+                        out_dir,
+                        fold_name,
+                        long_group_sizes,
+                        output_format,
+                        pair_matrix,
+                        sparse,
+                        results,
+                        tasks,
+                        outputs,
+                        compression,
+                        True,
+                    )
+                    if sparse and results is None:
+                        write_sparse_metadata(
+                            config, tag_ids, chambers, folded_bins_per_size[size], out_dir, fold_name, compression
+                        )
+                if window_seconds and size == bin_seconds[0]:
+                    window_name = "{}.window_{}s".format(exp_name, window_seconds)
+                    if results is not None:
+                        results.add_bins(window_name, window_bins)
+                    if "chambers" in outputs:
+                        window_chamber_time_rows = rolling_chamber_times(
+                            compute_chamber_times(
+                                config, tag_ids, trajectories, [b for b in bins if b.bin_number > 0]
+                            ),
+                            window_seconds // size,
+                        )
+                        if results is not None:
+                            tasks.submit(
+                                results.add_chamber_times,
+                                window_name,
+                                window_chamber_time_rows,
+                                chambers,
+                                not sparse,
+                            )
+                        else:
+                            tasks.submit(
+                                write_chamber_times,
+                                window_chamber_time_rows,
+                                chambers,
+                                out_dir,
+                                window_name,
+                                output_format,
+                                sparse,
+                                compression,
+                            )
+                    _write_co_dwell_outputs(
+                        config,
+                        tag_ids,
+                        window_co_dwell_bins,
+                        out_dir,
+                        window_name,
+                        long_group_sizes,
+                        output_format,
+                        pair_matrix,
+                        sparse,
+                        results,
+                        tasks,
+                        outputs,
+                        compression,
+                    )
+                    if sparse and results is None:
+                        write_sparse_metadata(
+                            config, tag_ids, chambers, window_bins, out_dir, window_name, compression
+                        )
+
+    logging.debug(f"PROFILING: write_outputs total took {time.perf_counter() - t0:.3f} seconds")
+
+
+class _OutputTasks:
+    """Runs the tasks that compute and write each output table.
+
+    With more than one thread, tasks run concurrently on a thread pool, and
+    leaving the `with` block waits for them all, raising the first error.
+    Otherwise each task runs as soon as it is submitted.
+    """
+
+    def __init__(self, threads: int):
+        self._executor = ThreadPoolExecutor(threads) if threads > 1 else None
+        self._futures: List[Future] = []
+
+    def submit(self, fn: Callable[..., Any], *args: Any) -> None:
+        if self._executor is None:
+            fn(*args)
+        else:
+            self._futures.append(self._executor.submit(fn, *args))
 
+    def __enter__(self) -> "_OutputTasks":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        if self._executor is None:
+            return
+        try:
+            for future in self._futures:
+                if exc_type is None:
+                    future.result()
+                else:
+                    future.cancel()
+        finally:
+            self._executor.shutdown()
+
+
+def _write_validation_results(
+    results: SqliteResults,
+    exp_name: str,
+    rows: Iterable[ValidationRow],
+    habitat: HabitatName,
+):
+    counts: Dict[int, List[int]] = {}
+    results.add_validation(exp_name, count_validation(rows, counts))
+    log_validation_accuracy(habitat, counts)
+
+
+def _write_habitat_outputs(
+    config: AnimalConfig,
+    tag_ids: List[TagID],
+    chambers: List[ChamberName],
+    desired_start_chamber: HabitatName,
+    trajectories: AllAnimalTrajectories,
+    validations: List[Validation],
+    validation: bool,
+    bins: List[OutputBin],
+    out_dir: str,
+    exp_name: str,
+    long_group_sizes: bool,
+    output_format: str,
+    pair_matrix: bool,
+    sparse: bool,
+    results: Optional[SqliteResults],
+    tasks: _OutputTasks,
+    outputs: Collection[str],
+    compression: Optional[str],
+    validation_tolerance: Tuple[float, float],
+):
+    """Write every output file in `outputs` for one habitat and one bin size.
+
+    Rows are streamed from each compute_* function straight to its file, or to
+    `results` if given, in a task per table.
+    """
+    # Trajectory-based outputs
+
+    if validation and "validation" in outputs:
+        # Validation
+        validation_rows = compute_validation(
+            tag_ids, 
+            trajectories, 
+            config.tag_id_to_name, 
+            validations, 
+            bins,
+            validation_tolerance,
+        )
+        if results is not None:
+            tasks.submit(_write_validation_results, results, exp_name, validation_rows, desired_start_chamber)
+        else:
+            tasks.submit(
+                write_validation, validation_rows, out_dir, exp_name, desired_start_chamber, output_format, compression
+            )
+
+    if "chambers" in outputs:
         chamber_time_rows = compute_chamber_times(
             config, 
             tag_ids, 
             trajectories, 
             bins
         )
-        write_chamber_times(chamber_time_rows, chambers, out_dir, exp_name)
+        if results is not None:
+            tasks.submit(results.add_chamber_times, exp_name, chamber_time_rows, chambers, not sparse)
+        else:
+            tasks.submit(
+                write_chamber_times,
+                chamber_time_rows,
+                chambers,
+                out_dir,
+                exp_name,
+                output_format,
+                sparse,
+                compression,
+            )
 
+    if "longdwells" in outputs:
         long_dwell_rows = compute_long_dwells(
             config, 
             tag_ids, 
             trajectories, 
             bins
         )
-        write_long_dwells(long_dwell_rows, out_dir, exp_name)
+        if results is not None:
+            tasks.submit(results.add_long_dwells, exp_name, long_dwell_rows)
+        else:
+            tasks.submit(write_long_dwells, long_dwell_rows, out_dir, exp_name, output_format, compression)
 
+    _write_co_dwell_outputs(
+        config,
+        tag_ids,
+        bins,
+        out_dir,
+        exp_name,
+        long_group_sizes,
+        output_format,
+        pair_matrix,
+        sparse,
+        results,
+        tasks,
+        outputs,
+        compression,
+    )
 
-        # TimeSpanAnalyzer-based outputs
 
-        pair_cohab_rows = compute_pair_inclusive_cohabs(
-            config, 
-            tag_ids,
-            bins
-        )
-        write_pair_inclusive_cohabs(
-            pair_cohab_rows,
-            out_dir,
-            exp_name,
-        )
+def _write_co_dwell_outputs(
+    config: AnimalConfig,
+    tag_ids: List[TagID],
+    bins: Iterable[OutputBin],
+    out_dir: str,
+    exp_name: str,
+    long_group_sizes: bool,
+    output_format: str,
+    pair_matrix: bool,
+    sparse: bool,
+    results: Optional[SqliteResults],
+    tasks: _OutputTasks,
+    outputs: Collection[str],
+    compression: Optional[str],
+    folded: bool = False,
+):
+    """Write the output files in `outputs` computed from co-dwell aggregates
+    alone.
 
-        group_chamber_rows = compute_group_chamber_cohabs(
-            tag_ids, 
-            config.tag_id_to_name, 
-            bins
-        )
-        write_group_chamber_cohabs(
-            group_chamber_rows,
-            out_dir,
-            exp_name,
-        )
+    If `sparse`, empty rows are omitted, and the group sizes are written in
+    long format.  If `folded`, the bins are folded (see _folded_bins).  The
+    tables read `bins` together in a single pass (see _BinSweep), so it may be
+    any iterable, such as _RollingWindowBins.
+    """
+    # TimeSpanAnalyzer-based outputs
+    writers: List[Callable[[Iterable[OutputBin]], Any]] = []
 
-        group_size_rows = compute_group_sizes(
-            tag_ids, 
-            config.tag_id_to_name, 
-            bins
-        )
-        write_group_sizes(
-            group_size_rows,
-            out_dir,
-            exp_name,
+    if "pair_cohab" in outputs and pair_matrix:
+        writers.append(lambda bins: write_pair_matrix(config, tag_ids, bins, out_dir, exp_name, folded))
+    elif "pair_cohab" in outputs:
+        def pair_cohab_rows(bins):
+            return compute_pair_inclusive_cohabs(config, tag_ids, bins, include_empty=not sparse)
+        if results is not None:
+            writers.append(lambda bins: results.add_pair_cohabs(exp_name, pair_cohab_rows(bins)))
+        else:
+            writers.append(lambda bins: write_pair_inclusive_cohabs(
+                pair_cohab_rows(bins), out_dir, exp_name, output_format, compression, folded
+            ))
+
+    if "group_chamber_cohab" in outputs:
+        def group_chamber_rows(bins):
+            return compute_group_chamber_cohabs(tag_ids, config.tag_id_to_name, bins, include_empty=not sparse)
+        if results is not None:
+            writers.append(lambda bins: results.add_group_cohabs(exp_name, group_chamber_rows(bins)))
+        else:
+            writers.append(lambda bins: write_group_chamber_cohabs(
+                group_chamber_rows(bins), out_dir, exp_name, output_format, compression, folded
+            ))
+
+    if "group_size" in outputs:
+        def group_size_rows(bins):
+            return compute_group_sizes(tag_ids, config.tag_id_to_name, bins)
+        if results is not None:
+            writers.append(lambda bins: results.add_group_sizes(exp_name, group_size_rows(bins)))
+        else:
+            writers.append(lambda bins: write_group_sizes(
+                group_size_rows(bins), out_dir, exp_name, long_group_sizes or sparse, output_format, compression, folded
+            ))
+
+    # The tables reading each bin's group aggregates share one computation of
+    # them.
+    group_chamber_readers = sum([
+        "pair_cohab" in outputs and not pair_matrix,
+        "group_chamber_cohab" in outputs,
+        "group_size" in outputs,
+    ])
+    if writers:
+        tasks.submit(_BinSweep(bins, writers, group_chamber_readers > 1).run)
+
+
+_SWEEP_DONE = object()
+
+
+class _BinSweep:
+    """Runs several table writers over the same bins in a single pass.
+
+    Each writer runs on its own thread, but they take turns: each handles the
+    current bin in turn, and the next bin is taken from `bins` only once all of
+    them have moved past it.  So `bins` is iterated once (rolling windows are
+    computed once for all tables), only one writer runs at a time (so that they
+    may share a SQLite connection), and if `hold_group_aggregates`, each bin's
+    group aggregates are computed once for the writers and released when the
+    sweep leaves the bin.
+    """
+
+    def __init__(
+        self,
+        bins: Iterable[OutputBin],
+        writers: List[Callable[[Iterable[OutputBin]], Any]],
+        hold_group_aggregates: bool,
+    ):
+        self._bins = iter(bins)
+        self._writers = writers
+        self._hold_group_aggregates = hold_group_aggregates
+        self._condition = threading.Condition()
+        # The writer whose turn it is, and the writers that have returned.
+        self._turn = 0
+        self._finished = [False] * len(writers)
+        # The current bin, or _SWEEP_DONE once they are exhausted.
+        self._bin: Any = None
+        self._errors: List[BaseException] = []
+
+    def run(self) -> None:
+        """Run the writers to completion, raising the first error."""
+        if len(self._writers) == 1:
+            self._writers[0](self._bins)
+            return
+        self._advance()
+        threads = [threading.Thread(target=self._run_writer, args=(k,)) for k in range(len(self._writers))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if self._errors:
+            raise self._errors[0]
+
+    def _run_writer(self, k: int) -> None:
+        try:
+            self._wait_turn(k)
+            self._writers[k](self._bins_of_writer(k))
+        except BaseException as e:
+            self._errors.append(e)
+        finally:
+            with self._condition:
+                self._finished[k] = True
+                self._pass_turn(k)
+
+    def _bins_of_writer(self, k: int) -> Iterator[OutputBin]:
+        while self._bin is not _SWEEP_DONE:
+            yield self._bin
+            with self._condition:
+                self._pass_turn(k)
+            self._wait_turn(k)
+
+    def _wait_turn(self, k: int) -> None:
+        with self._condition:
+            self._condition.wait_for(lambda: self._turn == k)
+
+    def _pass_turn(self, k: int) -> None:
+        """Hand the turn to the next unfinished writer after `k`, taking the
+        next bin if all have handled the current one."""
+        waiting = [j for j in range(len(self._writers)) if not self._finished[j]]
+        if not waiting:
+            return
+        later = [j for j in waiting if j > k]
+        if later:
+            self._turn = later[0]
+        else:
+            if self._bin is not _SWEEP_DONE:
+                self._advance()
+            self._turn = waiting[0]
+        self._condition.notify_all()
+
+    def _advance(self) -> None:
+        if self._hold_group_aggregates and self._bin is not None and self._bin.analyzer is not None:
+            self._bin.analyzer.release_group_chamber_aggregates()
+        try:
+            self._bin = next(self._bins, _SWEEP_DONE)
+        except BaseException as e:
+            self._errors.append(e)
+            self._bin = _SWEEP_DONE
+        if self._hold_group_aggregates and self._bin is not _SWEEP_DONE and self._bin.analyzer is not None:
+            self._bin.analyzer.hold_group_chamber_aggregates()
+
+
+def _trajectory_bins(
+    analysis_start_time: TimestampSeconds,
+    analysis_end_time: TimestampSeconds,
+    bin_seconds: List[int],
+    timezone: Optional[tzinfo],
+    window_seconds: Optional[int],
+) -> Tuple[Dict[int, List[OutputBin]], List[OutputBin]]:
+    """Bins without analyzers, for the tables computed from trajectories alone.
+
+    Returns:
+        The bins of each size (with the whole analysis interval first), and the
+        rolling windows, bounded as BinnedCoDwells would bound them.
+    """
+    if timezone is None:
+        bounds = bin_bounds(analysis_start_time, analysis_end_time, bin_seconds[0])
+    else:
+        bounds = aligned_bin_bounds(analysis_start_time, analysis_end_time, bin_seconds[0], timezone)
+    starts = [start for (start, _) in bounds]
+    whole = OutputBin(bin_number=0, bin_start=analysis_start_time, bin_end=analysis_end_time, analyzer=None)
+    bins_per_size = {
+        size: [whole] + [
+            OutputBin(bin_number=bin_number, bin_start=bounds[run[0]][0], bin_end=bounds[run[-1]][1], analyzer=None)
+            for (bin_number, run) in enumerate(
+                coarser_bin_runs(starts, bin_seconds[0], size, timezone), start=1
+            )
+        ]
+        for size in bin_seconds
+    }
+    window_bins = []
+    if window_seconds:
+        window_bins = _window_bins(bounds, window_seconds // bin_seconds[0])
+    return (bins_per_size, window_bins)
+
+
+def _window_bins(
+    bounds: List[Tuple[TimestampSeconds, TimestampSeconds]], bins_per_window: int
+) -> List[OutputBin]:
+    """Bins without analyzers spanning each run of `bins_per_window` of the
+    bins with the given bounds, as rolling_windows would."""
+    return [
+        OutputBin(
+            bin_number=window_number,
+            bin_start=bounds[first][0],
+            bin_end=bounds[first + bins_per_window - 1][1],
+            analyzer=None,
         )
+        for (window_number, first) in enumerate(range(len(bounds) - bins_per_window + 1), start=1)
+    ]
 
-    logging.debug(f"PROFILING: write_outputs total took {time.perf_counter() - t0:.3f} seconds")
 
+class _RollingWindowBins:
+    """The rolling windows over some bins (see rolling_windows), as OutputBins.
+
+    Each iteration computes the windows afresh, one at a time, so that a table
+    reading them holds only the current window.
+    """
+
+    def __init__(self, bins: List[CoDwellBin], bins_per_window: int):
+        self._bins = bins
+        self._bins_per_window = bins_per_window
+
+    def __iter__(self) -> Iterator[OutputBin]:
+        for (window_number, window) in enumerate(rolling_windows(self._bins, self._bins_per_window), start=1):
+            yield OutputBin(
+                bin_number=window_number,
+                bin_start=window.analysis_start_time,
+                bin_end=window.analysis_end_time,
+                analyzer=window,
+            )
+
+
+def _folded_bins(
+    bins: List[OutputBin], bin_seconds: int, period: str, timezone: tzinfo
+) -> List[OutputBin]:
+    """Fold bins aligned to the local clock over a day or week (see fold_slots).
+
+    Args:
+        bins: The bins to fold, without the whole-analysis bin.
+
+    Returns:
+        A bin per slot of the period, numbered from 1, with bin_start and
+        bin_end giving the offset into the period, and the bins falling in the
+        slot as its parts.  Its co-dwell totals (if the bins have any) are the
+        sums over the parts.
+    """
+    folded = []
+    for (slot_number, (offset, indexes)) in enumerate(
+        fold_slots([bin.bin_start for bin in bins], bin_seconds, period, timezone), start=1
+    ):
+        parts = [bins[i] for i in indexes]
+        slot_start = TimestampSeconds(offset)
+        slot_end = TimestampSeconds(offset + bin_seconds)
+        analyzer = None
+        if parts[0].analyzer is not None:
+            analyzer = CoDwellBin.summed([part.analyzer for part in parts], slot_start, slot_end)
+        folded.append(OutputBin(slot_number, slot_start, slot_end, analyzer, parts))
+    return folded
+
+
+def _analyzer_bins(
+    co_dwells: CoDwellStore,
+    analysis_start_time: TimestampSeconds,
+    analysis_end_time: TimestampSeconds,
+    bounds: List[Tuple[TimestampSeconds, TimestampSeconds]],
+) -> List[OutputBin]:
+    """Build a TimeSpanAnalyzer for the whole analysis interval and each bin."""
+    bins: List[OutputBin] = []
+
+    # Sort co-dwells by end time.
+    # Co-dwells are already mostly sorted by start time from CoDwellAccumulator.
+    sorted_co_dwells = sorted(range(len(co_dwells)), key=co_dwells.ends.__getitem__)
+
+    # Add whole experiment bin
+    full_analyzer = TimeSpanAnalyzer(co_dwells, analysis_start_time, analysis_end_time)
+    bins.append(OutputBin(
+        bin_number=0,
+        bin_start=analysis_start_time, 
+        bin_end=analysis_end_time, 
+        analyzer=full_analyzer
+    ))
+
+    # Sweep over the co-dwells once, handing each to exactly the bins it
+    # overlaps.  Within each bin, co-dwells remain in order of end time.
+    bin_starts = [start for (start, _) in bounds]
+    bin_ends = [end for (_, end) in bounds]
+    dwells_per_bin: List[List[int]] = [[] for _ in bounds]
+    starts = co_dwells.starts
+    ends = co_dwells.ends
+    for d in sorted_co_dwells:
+        for i in overlapping_bins(bin_starts, bin_ends, starts[d], ends[d]):
+            dwells_per_bin[i].append(d)
+
+    for (bin_counter, ((current_start, current_end), bin_dwells)) in enumerate(
+        zip(bounds, dwells_per_bin), start=1
+    ):
+        bin_analyzer = TimeSpanAnalyzer(co_dwells, current_start, current_end, bin_dwells)
+        bins.append(OutputBin(
+            bin_number=bin_counter,
+            bin_start=current_start, 
+            bin_end=current_end,
+            analyzer=bin_analyzer
+        ))
+    return bins
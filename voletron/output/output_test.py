@@ -0,0 +1,246 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import sqlite3
+import tempfile
+import unittest
+from unittest import mock
+
+import pytz
+
+from voletron.apparatus_config import all_chambers, load_apparatus_config
+from voletron.binned_co_dwells import BinnedCoDwells
+from voletron.co_dwell_accumulator import CoDwellAccumulator
+from voletron.output.output import _BinSweep, write_outputs
+from voletron.output.types import OutputBin
+from voletron.time_span_analyzer import TimeSpanAnalyzer
+from voletron.trajectory import AllAnimalTrajectories
+from voletron.types import AnimalConfig, AnimalName, Antenna, ChamberName, HabitatName, Read, TagID, TimestampSeconds
+
+START = TimestampSeconds(100)
+END = TimestampSeconds(1600)
+
+
+def _read(tag_id, timestamp, tube, cage):
+    return Read(TagID(tag_id), TimestampSeconds(timestamp), Antenna(ChamberName(tube), ChamberName(cage)))
+
+
+def _read_lines(path):
+    with open(path) as f:
+        return f.read().splitlines()
+
+
+def _bin_columns(path):
+    """The distinct (bin_number, bin_start, bin_end) of a CSV table."""
+    return sorted({tuple(int(value) for value in line.split(",")[:3]) for line in _read_lines(path)[1:]})
+
+
+class TestWriteOutputs(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        load_apparatus_config("example_apparatus.json")
+
+    def setUp(self):
+        # Two animals in HabitatA, meeting in Cage2 and then in CentralA.
+        self.config = AnimalConfig(
+            {TagID("tag_a"): AnimalName("Alice"), TagID("tag_b"): AnimalName("Bob")},
+            {TagID("tag_a"): ChamberName("CentralA"), TagID("tag_b"): ChamberName("CentralA")},
+        )
+        reads_per_animal = {
+            TagID("tag_a"): [
+                _read("tag_a", 200, "Tube2", "CentralA"),
+                _read("tag_a", 210, "Tube2", "Cage2"),
+                _read("tag_a", 700, "Tube2", "Cage2"),
+                _read("tag_a", 710, "Tube2", "CentralA"),
+            ],
+            TagID("tag_b"): [
+                _read("tag_b", 400, "Tube2", "CentralA"),
+                _read("tag_b", 405, "Tube2", "Cage2"),
+                _read("tag_b", 1100, "Tube2", "Cage2"),
+                _read("tag_b", 1110, "Tube2", "CentralA"),
+            ],
+        }
+        self.trajectories = AllAnimalTrajectories(
+            START, END, self.config.tag_id_to_start_chamber, reads_per_animal, 10.0
+        )
+        self.out_dir = tempfile.mkdtemp()
+
+    def _co_dwells(self):
+        state = CoDwellAccumulator(START, self.config.tag_id_to_start_chamber, all_chambers)
+        for t in self.trajectories.traversals():
+            state.update_state_from_traversal(t)
+        return state.end(END)
+
+    def _write(self, co_dwells, out_dir=None, **kwargs):
+        write_outputs(
+            out_dir or self.out_dir, self.config, self.trajectories, co_dwells, START, END, [], False, [300],
+            [HabitatName("HabitatA")], **kwargs
+        )
+
+    def test_group_aggregates_computed_once_per_bin(self):
+        analyzers = []
+        original = TimeSpanAnalyzer._compute_group_chamber_exclusive_durations
+
+        def compute(analyzer):
+            # The bins before this one no longer hold their aggregates.
+            for earlier in analyzers:
+                self.assertIsNone(earlier._group_chamber_aggregates._aggregates)
+            analyzers.append(analyzer)
+            return original(analyzer)
+
+        with mock.patch.object(
+            TimeSpanAnalyzer, "_compute_group_chamber_exclusive_durations", autospec=True, side_effect=compute
+        ):
+            self._write(self._co_dwells(), outputs=["pair_cohab", "group_chamber_cohab", "group_size"])
+        # The whole analysis and five bins, each once.
+        self.assertEqual(len(analyzers), 6)
+        self.assertEqual(len({id(analyzer) for analyzer in analyzers}), 6)
+        self.assertIsNone(analyzers[-1]._group_chamber_aggregates._aggregates)
+        self.assertEqual(
+            sorted(os.listdir(os.path.join(self.out_dir, "voletron", "HabitatA"))),
+            [
+                os.path.basename(self.out_dir) + ".group_chamber_cohab.csv",
+                os.path.basename(self.out_dir) + ".group_size.csv",
+                os.path.basename(self.out_dir) + ".pair-inclusive.cohab.csv",
+            ],
+        )
+
+    def test_threads_match_sequential(self):
+        out_dirs = {}
+        for threads in [1, 4]:
+            out_dirs[threads] = os.path.join(tempfile.mkdtemp(), "exp")
+            with mock.patch.object(
+                TimeSpanAnalyzer, "_compute_group_chamber_exclusive_durations",
+                autospec=True, side_effect=TimeSpanAnalyzer._compute_group_chamber_exclusive_durations,
+            ) as compute:
+                self._write(self._co_dwells(), out_dirs[threads], output_threads=threads)
+            # The tables sharing each bin's group aggregates still compute
+            # them once, whatever the number of output threads.
+            self.assertEqual(compute.call_count, 6)
+
+        habitat_dirs = {
+            threads: os.path.join(out_dir, "voletron", "HabitatA") for (threads, out_dir) in out_dirs.items()
+        }
+        names = sorted(os.listdir(habitat_dirs[1]))
+        self.assertEqual(sorted(os.listdir(habitat_dirs[4])), names)
+        self.assertIn("exp.group_size.csv", names)
+        for name in names:
+            with open(os.path.join(habitat_dirs[1], name), "rb") as sequential:
+                with open(os.path.join(habitat_dirs[4], name), "rb") as threaded:
+                    self.assertEqual(threaded.read(), sequential.read(), name)
+
+    def test_trajectory_outputs_skip_co_dwells(self):
+        with mock.patch.object(TimeSpanAnalyzer, "__init__", autospec=True) as analyzer, mock.patch.object(
+            BinnedCoDwells, "from_store"
+        ) as from_store:
+            self._write(None, outputs=["chambers", "longdwells"], window_seconds=600)
+        analyzer.assert_not_called()
+        from_store.assert_not_called()
+
+        exp_name = os.path.basename(self.out_dir)
+        self.assertEqual(
+            sorted(os.listdir(os.path.join(self.out_dir, "voletron", "HabitatA"))),
+            [
+                exp_name + ".chambers.csv",
+                exp_name + ".longdwells.csv",
+                exp_name + ".window_600s.chambers.csv",
+            ],
+        )
+
+    def test_trajectory_bins_match_full_run(self):
+        # Without co-dwells, the bins of each series are those the co-dwell
+        # tables of a full run would have: the chamber time tables are
+        # identical, and so are the bins recorded in a database.
+        for kwargs in [
+            {"bin_seconds": [300]},
+            {"bin_seconds": [60, 300], "window_seconds": 600},
+            {"bin_seconds": [60, 300], "timezone": pytz.timezone("America/Los_Angeles"), "window_seconds": 180},
+        ]:
+            with self.subTest(**kwargs):
+                habitat_dirs = {}
+                for (name, outputs, output_format) in [
+                    ("full", None, "csv"), ("chambers", ["chambers"], "csv"), ("sqlite", ["chambers"], "sqlite")
+                ]:
+                    out_dir = os.path.join(tempfile.mkdtemp(), "exp")
+                    os.makedirs(os.path.join(out_dir, "voletron"))
+                    write_outputs(
+                        out_dir, self.config, self.trajectories, None if outputs else self._co_dwells(), START, END,
+                        [], False, habitats=[HabitatName("HabitatA")], output_format=output_format,
+                        outputs=outputs, **kwargs
+                    )
+                    habitat_dirs[name] = os.path.join(out_dir, "voletron", "HabitatA")
+                connection = sqlite3.connect(os.path.join(os.path.dirname(habitat_dirs["sqlite"]), "results.sqlite"))
+
+                names = sorted(os.listdir(habitat_dirs["chambers"]))
+                self.assertEqual(len(names), len(kwargs["bin_seconds"]) + ("window_seconds" in kwargs))
+                for name in names:
+                    self.assertEqual(
+                        _read_lines(os.path.join(habitat_dirs["chambers"], name)),
+                        _read_lines(os.path.join(habitat_dirs["full"], name)),
+                    )
+                    series = name[: -len(".chambers.csv")]
+                    self.assertEqual(
+                        connection.execute(
+                            "SELECT bin_number, bin_start, bin_end FROM bins WHERE series = ? ORDER BY bin_number",
+                            (series,),
+                        ).fetchall(),
+                        _bin_columns(os.path.join(habitat_dirs["full"], series + ".pair-inclusive.cohab.csv")),
+                    )
+                connection.close()
+
+class TestBinSweep(unittest.TestCase):
+    def test_writers_take_turns(self):
+        log = []
+
+        def bins():
+            for bin_number in range(3):
+                log.append(("bin", bin_number))
+                yield OutputBin(bin_number, TimestampSeconds(0), TimestampSeconds(1), None)
+
+        def writer(name):
+            def write(bins):
+                for bin in bins:
+                    log.append((name, bin.bin_number))
+                log.append((name, "done"))
+            return write
+
+        _BinSweep(bins(), [writer("a"), writer("b")], False).run()
+
+        self.assertEqual(
+            log,
+            [
+                ("bin", 0), ("a", 0), ("b", 0),
+                ("bin", 1), ("a", 1), ("b", 1),
+                ("bin", 2), ("a", 2), ("b", 2),
+                ("a", "done"), ("b", "done"),
+            ],
+        )
+
+    def test_error(self):
+        written = []
+
+        def failing(bins):
+            for bin in bins:
+                raise ValueError("failed")
+
+        bins = [OutputBin(bin_number, TimestampSeconds(0), TimestampSeconds(1), None) for bin_number in range(3)]
+        with self.assertRaisesRegex(ValueError, "failed"):
+            _BinSweep(bins, [failing, lambda bins: written.extend(bins)], False).run()
+        # The other writer still sees every bin.
+        self.assertEqual(written, bins)
+
+
+if __name__ == "__main__":
+    unittest.main()
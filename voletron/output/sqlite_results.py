@@ -0,0 +1,424 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Writing output tables to a shared SQLite database.
+
+All habitats (and all bin sizes, folds and windows) go into one database,
+`voletron/results.sqlite`, in normalized tables:
+
+    bins(bin_id, habitat, series, bin_number, bin_start, bin_end, bin_duration, period_count)
+    animals(animal_id, habitat, name, tag_id)
+    chambers(chamber_id, habitat, name)
+    chamber_times(bin_id, animal_id, chamber_id, seconds)
+    pair_cohabs(bin_id, animal_a, animal_b, dwells, seconds)
+    groups(group_id, habitat), group_members(group_id, animal_id)
+    group_cohabs(bin_id, group_id, chamber_id, dwells, seconds)
+    group_sizes(bin_id, animal_id, group_size, seconds)
+    long_dwells(bin_id, animal_id, chamber_id, start_time, seconds)
+    validation(bin_id, animal_id, timestamp, expected_chamber_id, observed, correct)
+
+`series` names the set of tables a bin belongs to, as the CSV files would be
+named (e.g. `raw_reads`, `raw_reads.3600s`, `raw_reads.fold_day`), and
+period_count is the number of periods summed into a folded bin (NULL for
+other bins).  In pair_cohabs, animal_b is NULL for time in an unknown location
+(the UNKNOWN rows of the CSV).  group_sizes has rows only for sizes with
+nonzero time.
+"""
+
+import itertools
+import os
+import sqlite3
+import tempfile
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+from voletron.output.types import (
+    ChamberTimeRow,
+    GroupChamberCohabRow,
+    GroupSizeRow,
+    LongDwellRow,
+    OutputBin,
+    PairCohabRow,
+    ValidationRow,
+)
+from voletron.types import AnimalConfig, ChamberName, HabitatName, TagID
+
+RESULTS_FILE_NAME = "results.sqlite"
+
+_TABLES = """
+CREATE TABLE IF NOT EXISTS bins (
+    bin_id INTEGER PRIMARY KEY,
+    habitat TEXT NOT NULL,
+    series TEXT NOT NULL,
+    bin_number INTEGER NOT NULL,
+    bin_start REAL NOT NULL,
+    bin_end REAL NOT NULL,
+    bin_duration REAL NOT NULL,
+    period_count INTEGER
+);
+CREATE TABLE IF NOT EXISTS animals (
+    animal_id INTEGER PRIMARY KEY,
+    habitat TEXT NOT NULL,
+    name TEXT NOT NULL,
+    tag_id TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS chambers (
+    chamber_id INTEGER PRIMARY KEY,
+    habitat TEXT NOT NULL,
+    name TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS chamber_times (
+    bin_id INTEGER NOT NULL REFERENCES bins,
+    animal_id INTEGER NOT NULL REFERENCES animals,
+    chamber_id INTEGER NOT NULL REFERENCES chambers,
+    seconds REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS pair_cohabs (
+    bin_id INTEGER NOT NULL REFERENCES bins,
+    animal_a INTEGER NOT NULL REFERENCES animals,
+    animal_b INTEGER REFERENCES animals,
+    dwells INTEGER NOT NULL,
+    seconds REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS groups (
+    group_id INTEGER PRIMARY KEY,
+    habitat TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS group_members (
+    group_id INTEGER NOT NULL REFERENCES groups,
+    animal_id INTEGER NOT NULL REFERENCES animals
+);
+CREATE TABLE IF NOT EXISTS group_cohabs (
+    bin_id INTEGER NOT NULL REFERENCES bins,
+    group_id INTEGER NOT NULL REFERENCES groups,
+    chamber_id INTEGER NOT NULL REFERENCES chambers,
+    dwells INTEGER NOT NULL,
+    seconds REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS group_sizes (
+    bin_id INTEGER NOT NULL REFERENCES bins,
+    animal_id INTEGER NOT NULL REFERENCES animals,
+    group_size INTEGER NOT NULL,
+    seconds REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS long_dwells (
+    bin_id INTEGER NOT NULL REFERENCES bins,
+    animal_id INTEGER NOT NULL REFERENCES animals,
+    chamber_id INTEGER NOT NULL REFERENCES chambers,
+    start_time REAL NOT NULL,
+    seconds REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS validation (
+    bin_id INTEGER NOT NULL REFERENCES bins,
+    animal_id INTEGER NOT NULL REFERENCES animals,
+    timestamp REAL NOT NULL,
+    expected_chamber_id INTEGER NOT NULL REFERENCES chambers,
+    observed TEXT NOT NULL,
+    correct INTEGER NOT NULL
+);
+"""
+
+_INDEXES = """
+CREATE INDEX IF NOT EXISTS bins_habitat_series ON bins (habitat, series, bin_number);
+CREATE INDEX IF NOT EXISTS chamber_times_bin_animal ON chamber_times (bin_id, animal_id);
+CREATE INDEX IF NOT EXISTS pair_cohabs_bin_animal ON pair_cohabs (bin_id, animal_a);
+CREATE INDEX IF NOT EXISTS pair_cohabs_animals ON pair_cohabs (animal_a, animal_b);
+CREATE INDEX IF NOT EXISTS group_members_group ON group_members (group_id, animal_id);
+CREATE INDEX IF NOT EXISTS group_members_animal ON group_members (animal_id, group_id);
+CREATE INDEX IF NOT EXISTS group_cohabs_bin_group ON group_cohabs (bin_id, group_id);
+CREATE INDEX IF NOT EXISTS group_sizes_bin_animal ON group_sizes (bin_id, animal_id);
+CREATE INDEX IF NOT EXISTS long_dwells_bin_animal ON long_dwells (bin_id, animal_id);
+CREATE INDEX IF NOT EXISTS validation_bin_animal ON validation (bin_id, animal_id);
+"""
+
+# Tables whose rows belong to a habitat through their bin.
+_BIN_TABLES = ["chamber_times", "pair_cohabs", "group_cohabs", "group_sizes", "long_dwells", "validation"]
+
+# Rows are passed to executemany in batches of this many, so that tables are
+# streamed into the database rather than held in memory.
+_BATCH_ROWS = 10000
+
+# Other processes (analyzing other habitats) may hold the database while they
+# write their own results; wait this long for them.
+_LOCK_TIMEOUT_SECONDS = 3600
+
+# When the staged rows are copied into the shared database, these ID columns
+# are renumbered past the IDs of the table they refer to.  Tables are copied in
+# this order.
+_ID_TABLES = {
+    "bin_id": "bins",
+    "animal_id": "animals",
+    "animal_a": "animals",
+    "animal_b": "animals",
+    "chamber_id": "chambers",
+    "expected_chamber_id": "chambers",
+    "group_id": "groups",
+}
+_COPIED_TABLES = ["bins", "animals", "chambers", "groups", "group_members"] + _BIN_TABLES
+
+
+class SqliteResults:
+    """The output tables of one habitat, written to the shared database.
+
+    Rows are first staged in a private database next to the shared one, so
+    that computing the tables does not hold the shared database's write lock.
+    Use as a context manager: on leaving the block normally, the staged rows
+    are copied into the shared database in a single transaction, which
+    replaces any results for the habitat from an earlier run.  If the block
+    raises, the shared database is left unchanged.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        habitat: HabitatName,
+        config: AnimalConfig,
+        tag_ids: List[TagID],
+        chambers: List[ChamberName],
+    ):
+        self._path = path
+        self._habitat = habitat
+        shared = sqlite3.connect(path, timeout=_LOCK_TIMEOUT_SECONDS)
+        try:
+            shared.executescript(_TABLES + _INDEXES)
+        finally:
+            shared.close()
+
+        (fd, self._staging_path) = tempfile.mkstemp(
+            prefix="voletron-", suffix=".sqlite", dir=os.path.dirname(os.path.abspath(path))
+        )
+        os.close(fd)
+        # The staged rows are only needed until they are copied, so they need
+        # not survive a crash.
+        # The co-dwell tables are written from several threads, though one at a
+        # time (see voletron.output.output._BinSweep).
+        self._connection = sqlite3.connect(self._staging_path, isolation_level=None, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode = OFF")
+        self._connection.execute("PRAGMA synchronous = OFF")
+        self._connection.executescript(_TABLES)
+        self._connection.execute("BEGIN")
+
+        self._animal_ids: Dict[str, int] = {}
+        for tag_id in sorted(tag_ids):
+            name = config.tag_id_to_name[tag_id]
+            self._animal_ids[name] = self._connection.execute(
+                "INSERT INTO animals (habitat, name, tag_id) VALUES (?, ?, ?)", (habitat, name, tag_id)
+            ).lastrowid
+        self._chamber_ids: Dict[str, int] = {}
+        for chamber in chambers:
+            self._chamber_id(chamber)
+        self._group_ids: Dict[Tuple[str, ...], int] = {}
+        self._bin_ids: Dict[Tuple[str, int], int] = {}
+        self._next_bin_id = 1
+
+    def __enter__(self) -> "SqliteResults":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        try:
+            self._connection.execute("COMMIT")
+            if exc_type is None:
+                self._copy_staged()
+        finally:
+            self._connection.close()
+            os.remove(self._staging_path)
+
+    def _copy_staged(self) -> None:
+        """Replace the habitat's results in the shared database by the staged rows.
+
+        The staged IDs count from 1, so each is offset by the largest ID of its
+        table in the shared database once the habitat's old rows are deleted.
+        """
+        shared = sqlite3.connect(self._path, timeout=_LOCK_TIMEOUT_SECONDS, isolation_level=None)
+        try:
+            shared.execute("ATTACH DATABASE ? AS staged", (self._staging_path,))
+            shared.execute("BEGIN IMMEDIATE")
+            try:
+                self._delete_habitat(shared)
+                # Each ID is its table's INTEGER PRIMARY KEY, so its rowid.
+                offsets = {
+                    table: shared.execute(f"SELECT COALESCE(MAX(rowid), 0) FROM main.{table}").fetchone()[0]
+                    for table in set(_ID_TABLES.values())
+                }
+                for table in _COPIED_TABLES:
+                    columns = [row[1] for row in shared.execute(f"PRAGMA staged.table_info({table})")]
+                    values = [
+                        f"{column} + {offsets[_ID_TABLES[column]]}" if column in _ID_TABLES else column
+                        for column in columns
+                    ]
+                    shared.execute(
+                        f"INSERT INTO main.{table} ({', '.join(columns)}) "
+                        f"SELECT {', '.join(values)} FROM staged.{table} ORDER BY rowid"
+                    )
+                shared.execute("COMMIT")
+            except BaseException:
+                shared.execute("ROLLBACK")
+                raise
+        finally:
+            shared.close()
+
+    def _delete_habitat(self, shared: sqlite3.Connection) -> None:
+        habitat = (self._habitat,)
+        for table in _BIN_TABLES:
+            shared.execute(
+                f"DELETE FROM {table} WHERE bin_id IN (SELECT bin_id FROM bins WHERE habitat = ?)", habitat
+            )
+        shared.execute(
+            "DELETE FROM group_members WHERE group_id IN (SELECT group_id FROM groups WHERE habitat = ?)", habitat
+        )
+        for table in ["bins", "animals", "chambers", "groups"]:
+            shared.execute(f"DELETE FROM {table} WHERE habitat = ?", habitat)
+
+    def _chamber_id(self, chamber: str) -> int:
+        chamber_id = self._chamber_ids.get(chamber)
+        if chamber_id is None:
+            chamber_id = self._chamber_ids[chamber] = self._connection.execute(
+                "INSERT INTO chambers (habitat, name) VALUES (?, ?)", (self._habitat, chamber)
+            ).lastrowid
+        return chamber_id
+
+    def _group_id(self, animal_names: List[str]) -> int:
+        group = tuple(animal_names)
+        group_id = self._group_ids.get(group)
+        if group_id is None:
+            group_id = self._group_ids[group] = self._connection.execute(
+                "INSERT INTO groups (habitat) VALUES (?)", (self._habitat,)
+            ).lastrowid
+            self._connection.executemany(
+                "INSERT INTO group_members (group_id, animal_id) VALUES (?, ?)",
+                [(group_id, self._animal_ids[name]) for name in animal_names],
+            )
+        return group_id
+
+    def _insert(self, sql: str, values: Iterator[tuple]) -> None:
+        """Insert rows in batches; `values` may itself look up (and create) IDs."""
+        while True:
+            batch = list(itertools.islice(values, _BATCH_ROWS))
+            if not batch:
+                return
+            self._connection.executemany(sql, batch)
+
+    def add_bins(self, series: str, bins: List[OutputBin]) -> None:
+        """Add the bins of a series, which rows of that series then refer to."""
+        values = []
+        for bin in bins:
+            period_count = None if bin.parts is None else len(bin.parts)
+            values.append((
+                self._next_bin_id,
+                self._habitat,
+                series,
+                bin.bin_number,
+                bin.bin_start,
+                bin.bin_end,
+                bin.duration,
+                period_count,
+            ))
+            self._bin_ids[(series, bin.bin_number)] = self._next_bin_id
+            self._next_bin_id += 1
+        self._connection.executemany(
+            "INSERT INTO bins (bin_id, habitat, series, bin_number, bin_start, bin_end, bin_duration, period_count) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            values,
+        )
+
+    def add_chamber_times(
+        self,
+        series: str,
+        rows: Iterable[ChamberTimeRow],
+        chambers: List[ChamberName],
+        include_empty: bool = True,
+    ) -> None:
+        chamber_ids = [(chamber, self._chamber_id(chamber)) for chamber in chambers]
+        self._insert(
+            "INSERT INTO chamber_times (bin_id, animal_id, chamber_id, seconds) VALUES (?, ?, ?, ?)",
+            (
+                (self._bin_ids[(series, row.bin_number)], self._animal_ids[row.animal_name], chamber_id, seconds)
+                for row in rows
+                for (chamber, chamber_id) in chamber_ids
+                for seconds in (row.chamber_times.get(chamber, 0.0),)
+                if seconds or include_empty
+            ),
+        )
+
+    def add_pair_cohabs(self, series: str, rows: Iterable[PairCohabRow]) -> None:
+        self._insert(
+            "INSERT INTO pair_cohabs (bin_id, animal_a, animal_b, dwells, seconds) VALUES (?, ?, ?, ?, ?)",
+            (
+                (
+                    self._bin_ids[(series, row.bin_number)],
+                    self._animal_ids[row.animal_a_name],
+                    self._animal_ids.get(row.animal_b_name),
+                    row.dwell_count,
+                    row.duration_seconds,
+                )
+                for row in rows
+            ),
+        )
+
+    def add_group_cohabs(self, series: str, rows: Iterable[GroupChamberCohabRow]) -> None:
+        self._insert(
+            "INSERT INTO group_cohabs (bin_id, group_id, chamber_id, dwells, seconds) VALUES (?, ?, ?, ?, ?)",
+            (
+                (
+                    self._bin_ids[(series, row.bin_number)],
+                    self._group_id(row.animal_names),
+                    self._chamber_id(row.chamber_name),
+                    row.dwell_count,
+                    row.duration_seconds,
+                )
+                for row in rows
+            ),
+        )
+
+    def add_group_sizes(self, series: str, rows: Iterable[GroupSizeRow]) -> None:
+        self._insert(
+            "INSERT INTO group_sizes (bin_id, animal_id, group_size, seconds) VALUES (?, ?, ?, ?)",
+            (
+                (self._bin_ids[(series, row.bin_number)], self._animal_ids[row.animal_name], size, seconds)
+                for row in rows
+                for (size, seconds) in sorted(row.size_seconds.items())
+                if size and seconds
+            ),
+        )
+
+    def add_long_dwells(self, series: str, rows: Iterable[LongDwellRow]) -> None:
+        self._insert(
+            "INSERT INTO long_dwells (bin_id, animal_id, chamber_id, start_time, seconds) VALUES (?, ?, ?, ?, ?)",
+            (
+                (
+                    self._bin_ids[(series, row.bin_number)],
+                    self._animal_ids[row.animal_name],
+                    self._chamber_id(row.chamber_name),
+                    row.start_time,
+                    row.duration_seconds,
+                )
+                for row in rows
+            ),
+        )
+
+    def add_validation(self, series: str, rows: Iterable[ValidationRow]) -> None:
+        self._insert(
+            "INSERT INTO validation (bin_id, animal_id, timestamp, expected_chamber_id, observed, correct) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (
+                (
+                    self._bin_ids[(series, row.bin_number)],
+                    self._animal_ids[row.animal_name],
+                    row.timestamp,
+                    self._chamber_id(row.expected_chamber),
+                    " ".join(sorted(row.observed_chambers)),
+                    row.correct,
+                )
+                for row in rows
+            ),
+        )
@@ -0,0 +1,147 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import sqlite3
+import tempfile
+import unittest
+from unittest.mock import MagicMock
+
+from voletron.output.sqlite_results import SqliteResults
+from voletron.output.types import BinHeader, OutputBin, PairCohabRow, ValidationRow
+from voletron.types import AnimalConfig, AnimalName, ChamberName, HabitatName, TagID, TimestampSeconds
+
+
+class TestSqliteResults(unittest.TestCase):
+    def setUp(self):
+        self.path = os.path.join(tempfile.mkdtemp(), "results.sqlite")
+        self.config = MagicMock(spec=AnimalConfig)
+        self.config.tag_id_to_name = {
+            TagID("tag1"): AnimalName("a1"),
+            TagID("tag2"): AnimalName("a2"),
+        }
+        analyzer = MagicMock()
+        analyzer.duration = 10.0
+        self.bins = [
+            OutputBin(bin_number=0, bin_start=TimestampSeconds(0), bin_end=TimestampSeconds(10), analyzer=analyzer)
+        ]
+        self.header = BinHeader(0, TimestampSeconds(0), TimestampSeconds(10), 10.0)
+
+    def _write(self, habitat, dwells):
+        with SqliteResults(
+            self.path, HabitatName(habitat), self.config, [TagID("tag1"), TagID("tag2")], [ChamberName("c1")]
+        ) as results:
+            results.add_bins("exp", self.bins)
+            results.add_pair_cohabs("exp", [
+                PairCohabRow("a1", "a2", dwells, 5.0, bin=self.header),
+                PairCohabRow("a1", "UNKNOWN", 1, 2.0, bin=self.header),
+            ])
+            results.add_validation("exp", [
+                ValidationRow(True, TimestampSeconds(5), "a2", "c2", {"c1", "c2"}, bin=self.header),
+            ])
+
+    def test_tables(self):
+        self._write("HabitatA", 3)
+
+        connection = sqlite3.connect(self.path)
+        self.assertEqual(
+            connection.execute(
+                "SELECT b.series, b.bin_number, a.name, bb.name, p.dwells, p.seconds "
+                "FROM pair_cohabs p JOIN bins b USING (bin_id) "
+                "JOIN animals a ON a.animal_id = p.animal_a "
+                "LEFT JOIN animals bb ON bb.animal_id = p.animal_b "
+                "ORDER BY p.rowid"
+            ).fetchall(),
+            [("exp", 0, "a1", "a2", 3, 5.0), ("exp", 0, "a1", None, 1, 2.0)],
+        )
+        self.assertEqual(
+            connection.execute(
+                "SELECT a.name, c.name, v.observed, v.correct FROM validation v "
+                "JOIN animals a USING (animal_id) JOIN chambers c ON c.chamber_id = v.expected_chamber_id"
+            ).fetchall(),
+            [("a2", "c2", "c1 c2", 1)],
+        )
+
+    def test_rerun_replaces_habitat(self):
+        self._write("HabitatA", 3)
+        self._write("HabitatB", 4)
+        self._write("HabitatA", 5)
+
+        connection = sqlite3.connect(self.path)
+        self.assertEqual(
+            connection.execute(
+                "SELECT b.habitat, p.dwells FROM pair_cohabs p JOIN bins b USING (bin_id) "
+                "WHERE p.animal_b IS NOT NULL ORDER BY b.habitat"
+            ).fetchall(),
+            [("HabitatA", 5), ("HabitatB", 4)],
+        )
+        self.assertEqual(connection.execute("SELECT COUNT(*) FROM animals").fetchone(), (4,))
+
+    def test_period_count(self):
+        parts = [
+            OutputBin(bin_number=1, bin_start=TimestampSeconds(0), bin_end=TimestampSeconds(10), analyzer=None),
+            OutputBin(bin_number=3, bin_start=TimestampSeconds(20), bin_end=TimestampSeconds(25), analyzer=None),
+        ]
+        folded = [OutputBin(1, TimestampSeconds(0), TimestampSeconds(10), None, parts)]
+
+        with SqliteResults(
+            self.path, HabitatName("HabitatA"), self.config, [TagID("tag1")], [ChamberName("c1")]
+        ) as results:
+            results.add_bins("exp", self.bins)
+            results.add_bins("exp.fold_day", folded)
+
+        connection = sqlite3.connect(self.path)
+        self.assertEqual(
+            connection.execute("SELECT series, bin_duration, period_count FROM bins ORDER BY bin_id").fetchall(),
+            [("exp", 10.0, None), ("exp.fold_day", 15.0, 2)],
+        )
+
+    def test_shared_database_unlocked_while_staging(self):
+        with SqliteResults(
+            self.path, HabitatName("HabitatA"), self.config, [TagID("tag1"), TagID("tag2")], [ChamberName("c1")]
+        ) as results:
+            results.add_bins("exp", self.bins)
+            results.add_pair_cohabs("exp", [PairCohabRow("a1", "a2", 3, 5.0, bin=self.header)])
+            # Another habitat's results are written meanwhile, without waiting.
+            connection = sqlite3.connect(self.path, timeout=0)
+            connection.execute("BEGIN IMMEDIATE")
+            connection.execute("ROLLBACK")
+            connection.close()
+            self._write("HabitatB", 4)
+
+        connection = sqlite3.connect(self.path)
+        self.assertEqual(
+            connection.execute(
+                "SELECT b.habitat, b.bin_id, a.name, a.animal_id, p.dwells FROM pair_cohabs p "
+                "JOIN bins b USING (bin_id) JOIN animals a ON a.animal_id = p.animal_a "
+                "WHERE p.animal_b IS NOT NULL ORDER BY b.habitat"
+            ).fetchall(),
+            [("HabitatA", 2, "a1", 3, 3), ("HabitatB", 1, "a1", 1, 4)],
+        )
+        self.assertEqual(os.listdir(os.path.dirname(self.path)), ["results.sqlite"])
+
+    def test_rollback_on_error(self):
+        with self.assertRaises(KeyError):
+            with SqliteResults(
+                self.path, HabitatName("HabitatA"), self.config, [TagID("tag1")], [ChamberName("c1")]
+            ) as results:
+                results.add_bins("exp", self.bins)
+                results.add_pair_cohabs("exp", [PairCohabRow("nobody", "a1", 1, 1.0, bin=self.header)])
+
+        connection = sqlite3.connect(self.path)
+        self.assertEqual(connection.execute("SELECT COUNT(*) FROM bins").fetchone(), (0,))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -12,71 +12,254 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from dataclasses import dataclass
-from typing import Dict, List, Union, Set
-from voletron.types import TimestampSeconds
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union, Set
+from voletron.types import DurationSeconds, TimestampSeconds
+from voletron.binned_co_dwells import CoDwellBin
 from voletron.time_span_analyzer import TimeSpanAnalyzer
 
-@dataclass
-class OutputBin:
-    bin_number: int
-    bin_start: TimestampSeconds
-    bin_end: TimestampSeconds
-    analyzer: TimeSpanAnalyzer
-
-@dataclass
-class ChamberTimeRow:
-    bin_number: int
-    bin_start: TimestampSeconds
-    bin_end: TimestampSeconds
-    bin_duration: float
-    animal_name: str
-    chamber_times: Dict[str, float]
-    total_time: float
-
-@dataclass
-class PairCohabRow:
-    bin_number: int
-    bin_start: TimestampSeconds
-    bin_end: TimestampSeconds
-    bin_duration: float
-    animal_a_name: str
-    animal_b_name: str
-    dwell_count: int
-    duration_seconds: float
-
-@dataclass
-class GroupChamberCohabRow:
-    bin_number: int
-    bin_start: TimestampSeconds
-    bin_end: TimestampSeconds
-    bin_duration: float
-    animal_names: List[str]
-    chamber_name: str
-    dwell_count: int
-    duration_seconds: float
-
-@dataclass
-class GroupSizeRow:
-    bin_number: int
-    bin_start: TimestampSeconds
-    bin_end: TimestampSeconds
-    bin_duration: float
-    animal_name: str
-    size_seconds: Dict[int, float]
-    avg_group_size: float
-    avg_group_size_nosolo: Union[float, str]
-
-@dataclass
-class LongDwellRow:
-    bin_number: int
-    bin_start: TimestampSeconds
-    bin_end: TimestampSeconds
-    bin_duration: float
-    animal_name: str
-    chamber_name: str
-    start_time: TimestampSeconds
-    duration_seconds: float
+# Output records are produced in the millions for large colonies, so they are
+# plain classes with __slots__ rather than dataclasses: a slotted instance
+# carries no per-instance __dict__. (dataclass(slots=True) needs Python 3.10.)
+# The bin columns shared by every row of a bin live in one BinHeader that all
+# of those rows reference.  Rows are constructed with keyword `bin=header`, or
+# as before with keywords bin_number, bin_start, bin_end and bin_duration.
+
+
+class _Record:
+    """Value semantics (==, repr) over the __slots__ of a record class."""
+    __slots__ = ()
+
+    def _fields(self) -> Iterator[Tuple[str, Any]]:
+        for cls in reversed(type(self).__mro__):
+            for name in cls.__dict__.get("__slots__", ()):
+                yield (name, getattr(self, name))
+
+    def __eq__(self, other: object) -> bool:
+        if other.__class__ is not self.__class__:
+            return NotImplemented
+        return list(self._fields()) == list(other._fields())
+
+    def __repr__(self) -> str:
+        fields = ", ".join(f"{name}={value!r}" for (name, value) in self._fields())
+        return f"{type(self).__name__}({fields})"
+
+    __hash__ = None  # Mutable, like an unfrozen dataclass.
+
+
+class OutputBin(_Record):
+    __slots__ = ("bin_number", "bin_start", "bin_end", "analyzer", "parts")
+
+    def __init__(
+        self,
+        bin_number: int,
+        bin_start: TimestampSeconds,
+        bin_end: TimestampSeconds,
+        analyzer: Optional[Union[TimeSpanAnalyzer, CoDwellBin]],
+        parts: Optional[List["OutputBin"]] = None,
+    ):
+        """
+        Args:
+            analyzer: The co-dwell totals over the bin, or None if only
+                trajectory-based tables use it.
+            parts: For a bin folded over a day or week, the bins (one per
+                period) that it sums; its values are totals over them.
+        """
+        self.bin_number = bin_number
+        self.bin_start = bin_start
+        self.bin_end = bin_end
+        self.analyzer = analyzer
+        self.parts = parts
+
+    @property
+    def duration(self) -> float:
+        """The time the bin covers; for a folded bin, the sum over its parts."""
+        if self.analyzer is not None:
+            return self.analyzer.duration
+        if self.parts is not None:
+            return sum(part.duration for part in self.parts)
+        return self.bin_end - self.bin_start
+
+
+class BinHeader(_Record):
+    """The bin columns of an output row, shared by all rows of the bin."""
+    __slots__ = ("bin_number", "bin_start", "bin_end", "bin_duration", "period_count")
+
+    def __init__(
+        self,
+        bin_number: int,
+        bin_start: TimestampSeconds,
+        bin_end: TimestampSeconds,
+        bin_duration: float,
+        period_count: Optional[int] = None,
+    ):
+        """
+        Args:
+            period_count: For a folded bin, the number of periods summed.
+        """
+        self.bin_number = bin_number
+        self.bin_start = bin_start
+        self.bin_end = bin_end
+        self.bin_duration = bin_duration
+        self.period_count = period_count
+
+    @classmethod
+    def of(cls, bin: OutputBin, bin_duration: float = None) -> "BinHeader":
+        """The header of an output bin, by default lasting from start to end."""
+        if bin_duration is None:
+            bin_duration = bin.bin_end - bin.bin_start
+        period_count = None if bin.parts is None else len(bin.parts)
+        return cls(bin.bin_number, bin.bin_start, bin.bin_end, bin_duration, period_count)
+
+
+def _bin_header(
+    bin: Optional[BinHeader],
+    bin_number: Optional[int],
+    bin_start: Optional[TimestampSeconds],
+    bin_end: Optional[TimestampSeconds],
+    bin_duration: Optional[float],
+) -> BinHeader:
+    """The header given, or one made from the given bin columns."""
+    columns = (bin_number, bin_start, bin_end, bin_duration)
+    if bin is not None:
+        if any(column is not None for column in columns):
+            raise TypeError("Give either bin or the bin columns, not both")
+        return bin
+    if any(column is None for column in columns):
+        raise TypeError("Missing bin, or one of bin_number, bin_start, bin_end and bin_duration")
+    return BinHeader(bin_number, bin_start, bin_end, bin_duration)
+
+
+class _BinRow(_Record):
+    """A row of some bin; the bin columns are read through its header.
+
+    Subclasses take the bin as keyword arguments, `bin` or the bin columns,
+    and pass them on here.
+    """
+    __slots__ = ("bin",)
+
+    def __init__(
+        self,
+        bin: Optional[BinHeader] = None,
+        bin_number: Optional[int] = None,
+        bin_start: Optional[TimestampSeconds] = None,
+        bin_end: Optional[TimestampSeconds] = None,
+        bin_duration: Optional[float] = None,
+    ):
+        self.bin = _bin_header(bin, bin_number, bin_start, bin_end, bin_duration)
+
+    @property
+    def bin_number(self) -> int:
+        return self.bin.bin_number
+
+    @property
+    def bin_start(self) -> TimestampSeconds:
+        return self.bin.bin_start
+
+    @property
+    def bin_end(self) -> TimestampSeconds:
+        return self.bin.bin_end
+
+    @property
+    def bin_duration(self) -> float:
+        return self.bin.bin_duration
+
+
+class ChamberTimeRow(_BinRow):
+    __slots__ = ("animal_name", "chamber_times", "total_time")
+
+    def __init__(
+        self,
+        animal_name: str,
+        chamber_times: Dict[str, float],
+        total_time: float,
+        *,
+        bin: Optional[BinHeader] = None,
+        **bin_columns,
+    ):
+        super().__init__(bin, **bin_columns)
+        self.animal_name = animal_name
+        self.chamber_times = chamber_times
+        self.total_time = total_time
+
+
+class PairCohabRow(_BinRow):
+    __slots__ = ("animal_a_name", "animal_b_name", "dwell_count", "duration_seconds")
+
+    def __init__(
+        self,
+        animal_a_name: str,
+        animal_b_name: str,
+        dwell_count: int,
+        duration_seconds: DurationSeconds,
+        *,
+        bin: Optional[BinHeader] = None,
+        **bin_columns,
+    ):
+        super().__init__(bin, **bin_columns)
+        self.animal_a_name = animal_a_name
+        self.animal_b_name = animal_b_name
+        self.dwell_count = dwell_count
+        self.duration_seconds = duration_seconds
+
+
+class GroupChamberCohabRow(_BinRow):
+    __slots__ = ("animal_names", "chamber_name", "dwell_count", "duration_seconds")
+
+    def __init__(
+        self,
+        animal_names: List[str],
+        chamber_name: str,
+        dwell_count: int,
+        duration_seconds: DurationSeconds,
+        *,
+        bin: Optional[BinHeader] = None,
+        **bin_columns,
+    ):
+        super().__init__(bin, **bin_columns)
+        self.animal_names = animal_names
+        self.chamber_name = chamber_name
+        self.dwell_count = dwell_count
+        self.duration_seconds = duration_seconds
+
+
+class GroupSizeRow(_BinRow):
+    __slots__ = ("animal_name", "size_seconds", "avg_group_size", "avg_group_size_nosolo")
+
+    def __init__(
+        self,
+        animal_name: str,
+        size_seconds: Dict[int, float],
+        avg_group_size: float,
+        avg_group_size_nosolo: Union[float, str],
+        *,
+        bin: Optional[BinHeader] = None,
+        **bin_columns,
+    ):
+        super().__init__(bin, **bin_columns)
+        self.animal_name = animal_name
+        self.size_seconds = size_seconds
+        self.avg_group_size = avg_group_size
+        self.avg_group_size_nosolo = avg_group_size_nosolo
+
+
+class LongDwellRow(_BinRow):
+    __slots__ = ("animal_name", "chamber_name", "start_time", "duration_seconds")
+
+    def __init__(
+        self,
+        animal_name: str,
+        chamber_name: str,
+        start_time: TimestampSeconds,
+        duration_seconds: DurationSeconds,
+        *,
+        bin: Optional[BinHeader] = None,
+        **bin_columns,
+    ):
+        super().__init__(bin, **bin_columns)
+        self.animal_name = animal_name
+        self.chamber_name = chamber_name
+        self.start_time = start_time
+        self.duration_seconds = duration_seconds
 
 # @dataclass
 # class ActivityRow:
@@ -88,14 +271,24 @@ class LongDwellRow:
 #     avg_dwell_sizes: List[float]  # [size1, size2, size3, size4]
 #     traversal_count: int
 
-@dataclass
-class ValidationRow:
-    bin_number: int
-    bin_start: TimestampSeconds
-    bin_end: TimestampSeconds
-    bin_duration: float
-    correct: bool
-    timestamp: TimestampSeconds
-    animal_name: str
-    expected_chamber: str
-    observed_chambers: Set[str]
+
+class ValidationRow(_BinRow):
+    __slots__ = ("correct", "timestamp", "animal_name", "expected_chamber", "observed_chambers")
+
+    def __init__(
+        self,
+        correct: bool,
+        timestamp: TimestampSeconds,
+        animal_name: str,
+        expected_chamber: str,
+        observed_chambers: Set[str],
+        *,
+        bin: Optional[BinHeader] = None,
+        **bin_columns,
+    ):
+        super().__init__(bin, **bin_columns)
+        self.correct = correct
+        self.timestamp = timestamp
+        self.animal_name = animal_name
+        self.expected_chamber = expected_chamber
+        self.observed_chambers = observed_chambers
@@ -0,0 +1,53 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+
+from voletron.output.types import BinHeader, ChamberTimeRow, PairCohabRow
+from voletron.types import TimestampSeconds
+
+
+class TestBinRow(unittest.TestCase):
+    def test_bin_columns_by_keyword(self):
+        header = BinHeader(1, TimestampSeconds(0), TimestampSeconds(100), 90.0)
+        row = PairCohabRow(
+            bin_number=1,
+            bin_start=TimestampSeconds(0),
+            bin_end=TimestampSeconds(100),
+            bin_duration=90.0,
+            animal_a_name="a1",
+            animal_b_name="a2",
+            dwell_count=1,
+            duration_seconds=5.0,
+        )
+
+        self.assertEqual(row, PairCohabRow("a1", "a2", 1, 5.0, bin=header))
+        self.assertEqual(row.bin, header)
+        self.assertEqual(row.bin_duration, 90.0)
+
+    def test_bin_required(self):
+        with self.assertRaises(TypeError):
+            ChamberTimeRow("a1", {}, 0.0)
+        with self.assertRaises(TypeError):
+            ChamberTimeRow("a1", {}, 0.0, bin_number=1, bin_start=TimestampSeconds(0))
+        with self.assertRaises(TypeError):
+            ChamberTimeRow(
+                "a1", {}, 0.0,
+                bin=BinHeader(1, TimestampSeconds(0), TimestampSeconds(100), 100.0),
+                bin_number=1,
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()
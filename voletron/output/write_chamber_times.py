@@ -16,53 +16,210 @@
 import os
 import time
 import logging
-from typing import List, Tuple
+from collections import deque
+from typing import Deque, Dict, Iterable, Iterator, List, Optional, Tuple
 from voletron.trajectory import AllAnimalTrajectories
 from voletron.types import ChamberName, AnimalConfig, TagID, TimestampSeconds, DurationSeconds
-from voletron.output.types import ChamberTimeRow, OutputBin
+from voletron.output.columnar import ColumnTable, bin_columns, bin_values, write_columnar
+from voletron.output.npy import FLOAT, STR
+from voletron.output.files import CsvTable
+from voletron.output.types import BinHeader, ChamberTimeRow, OutputBin
 
 def compute_chamber_times(
     config: AnimalConfig,
     tag_ids: List[TagID],
     trajectories: AllAnimalTrajectories,
     bins: List[OutputBin],
-) -> List[ChamberTimeRow]:
+) -> Iterator[ChamberTimeRow]:
+    """Yield the chamber time rows of each bin in turn.
+
+    The times of a folded bin are summed over the bins it folds.
+    """
     t0 = time.perf_counter()
-    rows = []
     
     for bin in bins:
-        b_start = bin.bin_start
-        b_end = bin.bin_end
+        if bin.parts is None:
+            spans = [(bin.bin_start, bin.bin_end)]
+            header = BinHeader.of(bin)
+        else:
+            spans = [(part.bin_start, part.bin_end) for part in bin.parts]
+            header = BinHeader.of(bin, bin.duration)
         for (tag_id, trajectory) in trajectories.animalTrajectories.items():
             if tag_id not in tag_ids:
                 continue
             
-            ct = trajectory.time_per_chamber(b_start, b_end)
+            ct = trajectory.time_per_chamber(*spans[0])
+            for (b_start, b_end) in spans[1:]:
+                for (chamber, seconds) in trajectory.time_per_chamber(b_start, b_end).items():
+                    ct[chamber] = ct.get(chamber, 0.0) + seconds
             
-            rows.append(ChamberTimeRow(
-                bin_number=bin.bin_number,
-                bin_start=b_start,
-                bin_end=b_end,
-                bin_duration=b_end - b_start,
+            yield ChamberTimeRow(
+                bin=header,
                 animal_name=config.tag_id_to_name[tag_id],
                 chamber_times=ct,
                 total_time=sum(ct.values())
-            ))
+            )
     logging.debug(f"PROFILING: compute_chamber_times took {time.perf_counter() - t0:.3f} seconds")
-    return rows
+
+def rolling_chamber_times(
+    rows: Iterable[ChamberTimeRow],
+    bins_per_window: int,
+) -> Iterator[ChamberTimeRow]:
+    """Chamber times over each run of `bins_per_window` consecutive bins.
+
+    Args:
+        rows: Rows from compute_chamber_times, for consecutive bins in order
+            (excluding the whole-analysis bin 0).
+
+    Yields:
+        Rows per window, numbered from 1, as the window steps by one bin.
+        Running totals per animal are kept, adding the entering bin's times and
+        subtracting the leaving bin's, so only the rows of the bins in the
+        current window are held.
+    """
+    # The rows of the bins in the window, plus the one entering it.
+    window: Deque[List[ChamberTimeRow]] = deque()
+    running: Dict[str, Dict[str, float]] = {}
+    # The number of bins in the window with nonzero time per animal and
+    # chamber; when it drops to zero, the total is removed rather than left
+    # with a rounding error.
+    nonzero_bins: Dict[str, Dict[str, int]] = {}
+    window_number = 0
+
+    def bins_of_rows() -> Iterator[List[ChamberTimeRow]]:
+        bin_rows: List[ChamberTimeRow] = []
+        for row in rows:
+            if bin_rows and bin_rows[0].bin_number != row.bin_number:
+                yield bin_rows
+                bin_rows = []
+            bin_rows.append(row)
+        if bin_rows:
+            yield bin_rows
+
+    for entering in bins_of_rows():
+        window.append(entering)
+        for row in entering:
+            chamber_times = running.setdefault(row.animal_name, {})
+            counts = nonzero_bins.setdefault(row.animal_name, {})
+            for (chamber, seconds) in row.chamber_times.items():
+                if seconds:
+                    chamber_times[chamber] = chamber_times.get(chamber, 0.0) + seconds
+                    counts[chamber] = counts.get(chamber, 0) + 1
+        if len(window) > bins_per_window:
+            for row in window.popleft():
+                chamber_times = running[row.animal_name]
+                counts = nonzero_bins[row.animal_name]
+                for (chamber, seconds) in row.chamber_times.items():
+                    if not seconds:
+                        continue
+                    counts[chamber] -= 1
+                    if counts[chamber]:
+                        chamber_times[chamber] -= seconds
+                    else:
+                        del counts[chamber]
+                        del chamber_times[chamber]
+        if len(window) < bins_per_window:
+            continue
+        window_number += 1
+        window_start = window[0][0].bin_start
+        window_end = entering[0].bin_end
+        header = BinHeader(window_number, window_start, window_end, window_end - window_start)
+        for row in entering:
+            chamber_times = dict(running[row.animal_name])
+            yield ChamberTimeRow(
+                bin=header,
+                animal_name=row.animal_name,
+                chamber_times=chamber_times,
+                total_time=sum(chamber_times.values())
+            )
 
 def write_chamber_times(
-    rows: List[ChamberTimeRow],
+    rows: Iterable[ChamberTimeRow],
     chambers: List[ChamberName],
     out_dir: str,
     exp_name: str,
+    output_format: str = "csv",
+    long_format: bool = False,
+    compression: Optional[str] = None,
+    folded: bool = False,
 ):
-    with open(os.path.join(out_dir, exp_name + ".chambers.csv"), "w") as f:
-        f.write("bin_number,bin_start,bin_end,bin_duration,animal," + ",".join(chambers) + ",total\n")
+    """Write the chamber time table, as CSV or (with output_format "columnar")
+    as a columnar file; see voletron.output.columnar.
+
+    The default (wide) format has one row per bin and animal, with a column per
+    chamber.  The long format (`*.chambers.long.csv`) instead has one row per
+    bin, animal and chamber, for the chambers in which the animal spent any
+    time.
+
+    If `folded`, the bins are folded over a day or week, and a period_count column
+    follows the bin columns.
+    """
+    if long_format:
+        _write_chamber_times_long(rows, chambers, out_dir, exp_name, output_format, compression, folded)
+        return
+
+    if output_format == "columnar":
+        table = ColumnTable(
+            bin_columns(folded) + [("animal", STR)] + [(chamber, FLOAT) for chamber in chambers] + [("total", FLOAT)]
+        )
         for row in rows:
-            aaa = ",".join(map(lambda c: "{:.0f}".format(row.chamber_times.get(c, 0.0)), chambers))
-            f.write(
-                "{},{:.0f},{:.0f},{:.0f},{},{},{:.0f}\n".format(
-                    row.bin_number, row.bin_start, row.bin_end, row.bin_duration, row.animal_name, aaa, row.total_time
-                )
+            table.append(
+                bin_values(row, folded)
+                + (row.animal_name,)
+                + tuple(row.chamber_times.get(chamber, 0.0) for chamber in chambers)
+                + (row.total_time,)
             )
+        write_columnar(table, out_dir, exp_name + ".chambers")
+        return
+
+    format_fields = ("{}," + ",".join(["{:.0f}"] * len(chambers)) + ",{:.0f}").format
+    with CsvTable(
+        os.path.join(out_dir, exp_name + ".chambers.csv"),
+        "animal," + ",".join(chambers) + ",total",
+        compression,
+        folded,
+    ) as table:
+        for row in rows:
+            chamber_times = row.chamber_times
+            table.add(
+                row.bin,
+                format_fields(
+                    row.animal_name,
+                    *[chamber_times.get(chamber, 0.0) for chamber in chambers],
+                    row.total_time,
+                ),
+            )
+
+
+def _write_chamber_times_long(
+    rows: Iterable[ChamberTimeRow],
+    chambers: List[ChamberName],
+    out_dir: str,
+    exp_name: str,
+    output_format: str,
+    compression: Optional[str],
+    folded: bool,
+):
+    if output_format == "columnar":
+        table = ColumnTable(bin_columns(folded) + [("animal", STR), ("chamber", STR), ("seconds", FLOAT)])
+        for row in rows:
+            for chamber in chambers:
+                seconds = row.chamber_times.get(chamber, 0.0)
+                if seconds:
+                    table.append(bin_values(row, folded) + (row.animal_name, chamber, seconds))
+        write_columnar(table, out_dir, exp_name + ".chambers.long")
+        return
+
+    format_fields = "{},{},{:.0f}".format
+    with CsvTable(
+        os.path.join(out_dir, exp_name + ".chambers.long.csv"),
+        "animal,chamber,seconds",
+        compression,
+        folded,
+    ) as table:
+        for row in rows:
+            for chamber in chambers:
+                seconds = row.chamber_times.get(chamber, 0.0)
+                if not seconds:
+                    continue
+                table.add(row.bin, format_fields(row.animal_name, chamber, seconds))
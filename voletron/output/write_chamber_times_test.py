@@ -3,9 +3,9 @@ import unittest
 import tempfile
 import os
 from unittest.mock import MagicMock
-from voletron.output.write_chamber_times import compute_chamber_times, write_chamber_times
+from voletron.output.write_chamber_times import compute_chamber_times, rolling_chamber_times, write_chamber_times
 from voletron.types import AnimalConfig, TagID, TimestampSeconds, ChamberName, AnimalName, DurationSeconds
-from voletron.output.types import OutputBin
+from voletron.output.types import BinHeader, OutputBin
 from voletron.trajectory import AllAnimalTrajectories
 
 class TestWriteChamberTimes(unittest.TestCase):
@@ -42,7 +42,7 @@ class TestWriteChamberTimes(unittest.TestCase):
             OutputBin(bin_number=0, bin_start=TimestampSeconds(0), bin_end=TimestampSeconds(20), analyzer=MagicMock())
         ]
 
-        rows = compute_chamber_times(config, tag_ids, mock_trajectories, bins)
+        rows = list(compute_chamber_times(config, tag_ids, mock_trajectories, bins))
 
         self.assertEqual(len(rows), 3)
         
@@ -83,10 +83,7 @@ class TestWriteChamberTimes(unittest.TestCase):
         
         rows = [
              ChamberTimeRow(
-                bin_number=0,
-                bin_start=TimestampSeconds(0),
-                bin_end=TimestampSeconds(100),
-                bin_duration=100.0,
+                bin=BinHeader(0, TimestampSeconds(0), TimestampSeconds(100), 100.0),
                 animal_name="a1",
                 chamber_times={ChamberName("c1"): 50.0},
                 total_time=50.0
@@ -103,6 +100,129 @@ class TestWriteChamberTimes(unittest.TestCase):
             self.assertIn("bin_number,bin_start,bin_end,bin_duration,animal,c1,c2,total", content)
             self.assertIn("0,0,100,100,a1,50,0,50", content)
 
+    def test_write_chamber_times_long(self):
+        from voletron.output.types import ChamberTimeRow
+
+        out_dir = tempfile.mkdtemp()
+        chambers = [ChamberName("c1"), ChamberName("c2"), ChamberName("c3")]
+        rows = [
+            ChamberTimeRow(
+                bin=BinHeader(1, TimestampSeconds(0), TimestampSeconds(100), 100.0),
+                animal_name="a1",
+                chamber_times={ChamberName("c1"): 0.0, ChamberName("c3"): 60.0, ChamberName("c2"): 40.0},
+                total_time=100.0,
+            )
+        ]
+
+        write_chamber_times(rows, chambers, out_dir, "test_exp", long_format=True)
+
+        with open(os.path.join(out_dir, "test_exp.chambers.long.csv")) as f:
+            self.assertEqual(
+                f.read(),
+                "bin_number,bin_start,bin_end,bin_duration,animal,chamber,seconds\n"
+                "1,0,100,100,a1,c2,40\n"
+                "1,0,100,100,a1,c3,60\n",
+            )
+
+    def test_rolling_chamber_times(self):
+        from voletron.output.types import ChamberTimeRow
+
+        def row(bin_number, animal, c1):
+            start = TimestampSeconds(10 * (bin_number - 1))
+            return ChamberTimeRow(
+                bin=BinHeader(bin_number, start, TimestampSeconds(start + 10), 10.0),
+                animal_name=animal,
+                chamber_times={ChamberName("c1"): c1},
+                total_time=c1,
+            )
+
+        rows = [row(1, "a1", 1.0), row(1, "a2", 2.0), row(2, "a1", 3.0), row(2, "a2", 4.0), row(3, "a1", 5.0), row(3, "a2", 6.0)]
+        windows = list(rolling_chamber_times(rows, 2))
+
+        self.assertEqual(
+            [(r.bin_number, r.bin_start, r.bin_end, r.animal_name, r.chamber_times[ChamberName("c1")]) for r in windows],
+            [(1, 0, 20, "a1", 4.0), (1, 0, 20, "a2", 6.0), (2, 10, 30, "a1", 8.0), (2, 10, 30, "a2", 10.0)],
+        )
+        self.assertEqual(windows[0].bin_duration, 20)
+        # Rows of one window share its header, and carry no __dict__.
+        self.assertIs(windows[0].bin, windows[1].bin)
+        self.assertFalse(hasattr(windows[0], "__dict__"))
+
+    def test_rolling_chamber_times_chamber_leaves(self):
+        from voletron.output.types import ChamberTimeRow
+
+        def row(bin_number, c2):
+            start = TimestampSeconds(10 * (bin_number - 1))
+            return ChamberTimeRow(
+                bin=BinHeader(bin_number, start, TimestampSeconds(start + 10), 10.0),
+                animal_name="a1",
+                chamber_times={ChamberName("c1"): 10.0 - c2, ChamberName("c2"): c2},
+                total_time=10.0,
+            )
+
+        # c2 enters the window and then fully leaves it; subtracting 0.1 and
+        # 0.2 from their float sum would leave about -3e-17 behind.
+        rows = [row(1, 0.1), row(2, 0.2), row(3, 0.0), row(4, 0.0)]
+        windows = list(rolling_chamber_times(rows, 2))
+        self.assertEqual(list(windows[2].chamber_times), [ChamberName("c1")])
+
+        out_dir = tempfile.mkdtemp()
+        chambers = [ChamberName("c1"), ChamberName("c2")]
+        write_chamber_times(windows, chambers, out_dir, "exp")
+        write_chamber_times(windows, chambers, out_dir, "exp", long_format=True)
+        with open(os.path.join(out_dir, "exp.chambers.csv")) as f:
+            self.assertEqual(f.read().splitlines()[-1], "3,20,40,20,a1,20,0,20")
+        with open(os.path.join(out_dir, "exp.chambers.long.csv")) as f:
+            self.assertEqual(f.read().splitlines()[-1], "3,20,40,20,a1,c1,20")
+
+    def test_folded_chamber_times(self):
+        config = MagicMock(spec=AnimalConfig)
+        config.tag_id_to_name = {TagID("tag1"): AnimalName("animal1")}
+        trajectory = MagicMock()
+        trajectory.time_per_chamber.side_effect = lambda start, end: {
+            ChamberName("c1"): 5.0 if start < 86400 else 10.0,
+            ChamberName("c2"): 5.0,
+        }
+        trajectories = MagicMock(spec=AllAnimalTrajectories)
+        trajectories.animalTrajectories = {TagID("tag1"): trajectory}
+        # The first ten seconds of two days, the first half-observed.
+        parts = [
+            OutputBin(bin_number=1, bin_start=TimestampSeconds(5), bin_end=TimestampSeconds(10), analyzer=None),
+            OutputBin(bin_number=9, bin_start=TimestampSeconds(86400), bin_end=TimestampSeconds(86410), analyzer=None),
+        ]
+        folded = OutputBin(1, TimestampSeconds(0), TimestampSeconds(10), None, parts)
+
+        rows = list(compute_chamber_times(config, [TagID("tag1")], trajectories, [folded]))
+
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0].bin, BinHeader(1, TimestampSeconds(0), TimestampSeconds(10), 15.0, 2))
+        self.assertEqual(rows[0].chamber_times, {ChamberName("c1"): 15.0, ChamberName("c2"): 10.0})
+        self.assertEqual(rows[0].total_time, 25.0)
+
+        out_dir = tempfile.mkdtemp()
+        write_chamber_times(rows, [ChamberName("c1"), ChamberName("c2")], out_dir, "exp", folded=True)
+        with open(os.path.join(out_dir, "exp.chambers.csv")) as f:
+            self.assertEqual(
+                f.read(),
+                "bin_number,bin_start,bin_end,bin_duration,period_count,animal,c1,c2,total\n"
+                "1,0,10,15,2,animal1,15,10,25\n",
+            )
+
+    def test_row_equality(self):
+        from voletron.output.types import ChamberTimeRow
+
+        def row(c1):
+            return ChamberTimeRow(
+                bin=BinHeader(1, TimestampSeconds(0), TimestampSeconds(10), 10.0),
+                animal_name="a1",
+                chamber_times={ChamberName("c1"): c1},
+                total_time=c1,
+            )
+
+        self.assertEqual(row(1.0), row(1.0))
+        self.assertNotEqual(row(1.0), row(2.0))
+        self.assertIn("animal_name='a1'", repr(row(1.0)))
+
 
 if __name__ == '__main__':
     unittest.main()
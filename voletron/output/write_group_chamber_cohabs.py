@@ -16,18 +16,26 @@
 import os
 import time
 import logging
-from typing import List, Dict
+from typing import Dict, Iterable, Iterator, List, Optional
 
 from voletron.types import AnimalName, TagID, TimestampSeconds, DurationSeconds
-from voletron.output.types import GroupChamberCohabRow, OutputBin
+from voletron.output.columnar import ColumnTable, bin_columns, bin_values, write_columnar
+from voletron.output.npy import INT, FLOAT, STR
+from voletron.output.files import CsvTable
+from voletron.output.types import BinHeader, GroupChamberCohabRow, OutputBin
 
 def compute_group_chamber_cohabs(
     tag_ids: List[TagID],
     tag_id_to_name: Dict[TagID, AnimalName],
-    bins: List[OutputBin],
-) -> List[GroupChamberCohabRow]:
+    bins: Iterable[OutputBin],
+    include_empty: bool = True,
+) -> Iterator[GroupChamberCohabRow]:
+    """Yield the group chamber cohabitation rows of each bin in turn.
+
+    Unless `include_empty`, groups left with no co-dwells in a bin (as can
+    happen in rolling windows) are omitted.
+    """
     t0 = time.perf_counter()
-    rows = []
     
     for bin in bins:
         if bin.analyzer is None:
@@ -35,42 +43,59 @@ def compute_group_chamber_cohabs(
         analyzer = bin.analyzer
         start = bin.bin_start
         end = bin.bin_end
+        header = BinHeader.of(bin, analyzer.duration)
         for group_dwell_aggregate in analyzer.get_group_chamber_exclusive_durations():
             # Skip groups with tag_ids not in the requested list
             if not all(tag_id in tag_ids for tag_id in group_dwell_aggregate.tag_ids):
                 continue
+            if not group_dwell_aggregate.count and not include_empty:
+                continue
 
             names = sorted(tag_id_to_name[tag_id] for tag_id in group_dwell_aggregate.tag_ids)
-            rows.append(GroupChamberCohabRow(
-                bin_number=bin.bin_number,
-                bin_start=start,
-                bin_end=end,
-                bin_duration=analyzer.duration,
+            yield GroupChamberCohabRow(
+                bin=header,
                 animal_names=names,
                 chamber_name=group_dwell_aggregate.chamber,
                 dwell_count=group_dwell_aggregate.count,
                 duration_seconds=group_dwell_aggregate.duration_seconds,
-            ))
+            )
     logging.debug(f"PROFILING: compute_group_chamber_cohabs took {time.perf_counter() - t0:.3f} seconds")
-    return rows
 
 def write_group_chamber_cohabs(
-    rows: List[GroupChamberCohabRow],
+    rows: Iterable[GroupChamberCohabRow],
     out_dir: str,
     exp_name: str,
+    output_format: str = "csv",
+    compression: Optional[str] = None,
+    folded: bool = False,
 ):
-    with open(os.path.join(out_dir, exp_name + ".group_chamber_cohab.csv"), "w") as f:
-        f.write("bin_number,bin_start,bin_end,bin_duration,animals,chamber,dwells,seconds\n")
+    """Write the group chamber cohabitation table, as CSV or (with
+    output_format "columnar") as a columnar file; see voletron.output.columnar.
+
+    If `folded`, the bins are folded over a day or week, and a period_count column
+    follows the bin columns.
+    """
+    if output_format == "columnar":
+        table = ColumnTable(
+            bin_columns(folded) + [("animals", STR), ("chamber", STR), ("dwells", INT), ("seconds", FLOAT)]
+        )
+        for row in rows:
+            table.append(
+                bin_values(row, folded)
+                + (" ".join(row.animal_names), row.chamber_name, row.dwell_count, row.duration_seconds)
+            )
+        write_columnar(table, out_dir, exp_name + ".group_chamber_cohab")
+        return
+
+    format_fields = "{},{},{},{:.0f}".format
+    with CsvTable(
+        os.path.join(out_dir, exp_name + ".group_chamber_cohab.csv"),
+        "animals,chamber,dwells,seconds",
+        compression,
+        folded,
+    ) as table:
         for row in rows:
-            f.write(
-                "{},{:.0f},{:.0f},{:.0f},{},{},{},{:.0f}\n".format(
-                    row.bin_number,
-                    row.bin_start,
-                    row.bin_end,
-                    row.bin_duration,
-                    " ".join(row.animal_names),
-                    row.chamber_name,
-                    row.dwell_count,
-                    row.duration_seconds,
-                )
+            table.add(
+                row.bin,
+                format_fields(" ".join(row.animal_names), row.chamber_name, row.dwell_count, row.duration_seconds),
             )
@@ -44,7 +44,7 @@ class TestWriteGroupChamberCohabs(unittest.TestCase):
 
         tag_ids = [TagID("tag1"), TagID("tag2")]
 
-        rows = compute_group_chamber_cohabs(tag_ids, tag_id_to_name, bins)
+        rows = list(compute_group_chamber_cohabs(tag_ids, tag_id_to_name, bins))
 
         # Expected same as pair cohabs basically but different row structure
         self.assertEqual(len(rows), 3)
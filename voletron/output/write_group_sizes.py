@@ -14,55 +14,76 @@
 
 
 import os
+import math
 import time
 import logging
 from collections import defaultdict
-from typing import List, Dict, Union
+import itertools
+from typing import Dict, Iterable, Iterator, List, Optional, Union
 
 from voletron.types import AnimalName, DurationSeconds, TagID, TimestampSeconds
-from voletron.output.types import GroupSizeRow, OutputBin
+from voletron.output.columnar import ColumnTable, bin_columns, bin_values, write_columnar
+from voletron.output.npy import INT, FLOAT, STR
+from voletron.output.files import CsvTable
+from voletron.output.types import BinHeader, GroupSizeRow, OutputBin
+
+# The wide CSV format always has columns for at least these group sizes, so
+# that its layout does not depend on the data for typical habitats.
+MIN_GROUP_SIZE_COLUMNS = 8
 
 def compute_group_sizes(
     tag_ids: List[TagID],
     tag_id_to_name: Dict[TagID, AnimalName],
-    bins: List[OutputBin],
-) -> List[GroupSizeRow]:
+    bins: Iterable[OutputBin],
+) -> Iterator[GroupSizeRow]:
+    """Yield the group size rows of each bin in turn, ordered by animal name.
+
+    Every row has the same group sizes: from 0 up to the larger of 8 and the
+    number of animals in the bins' TagIndex, the largest group possible.  Each
+    bin's group aggregates are read once, and its rows are yielded as soon as
+    it is done.
+    """
     t0 = time.perf_counter()
-    rows = []
-    
+
+    tag_ids_by_name = sorted(tag_ids, key=lambda tag_id: tag_id_to_name[tag_id])
+    largest_group_size = None
     for bin in bins:
-        if bin.analyzer is None:
-            continue
         analyzer = bin.analyzer
-        start = bin.bin_start
-        end = bin.bin_end
-        
+        if analyzer is None:
+            continue
+        if largest_group_size is None:
+            # All bins share one TagIndex.
+            largest_group_size = max(MIN_GROUP_SIZE_COLUMNS, len(analyzer.tag_index))
+
         # Tracks time spent by each animal in groups of various sizes.
-        # Key: TagID, Value: List of durations where index is group size (e.g. index 2 is time spent in a pair).
-        # Obviously, the value for index 0 is always 0.
-        tag_id_group_size_seconds : Dict[TagID, List[DurationSeconds]] = {
-            tag_id: [DurationSeconds(0)] * 9 for tag_id in tag_ids
+        # Key: TagID, Value: group size -> duration (e.g. key 2 is time spent
+        # in a pair), for the sizes observed.
+        tag_id_group_size_seconds : Dict[TagID, Dict[int, DurationSeconds]] = {
+            tag_id: {} for tag_id in tag_ids
         }
 
         for group_dwell in analyzer.get_group_chamber_exclusive_durations():
+            size = len(group_dwell.tag_ids)
             for tag_id in group_dwell.tag_ids:
                 if tag_id in tag_ids:
-                    tag_id_group_size_seconds[tag_id][
-                        len(group_dwell.tag_ids)
-                    ] = DurationSeconds(tag_id_group_size_seconds[tag_id][
-                        len(group_dwell.tag_ids)
-                    ] + group_dwell.duration_seconds)
-
-        for tag_id in tag_ids:
-            group_size_seconds = tag_id_group_size_seconds[tag_id]
-            if analyzer.duration == 0:
+                    size_seconds = tag_id_group_size_seconds[tag_id]
+                    size_seconds[size] = DurationSeconds(size_seconds.get(size, 0) + group_dwell.duration_seconds)
+
+        header = BinHeader.of(bin, analyzer.duration)
+        duration = header.bin_duration
+        for tag_id in tag_ids_by_name:
+            # Index is group size.  Obviously, the value for index 0 is always 0.
+            group_size_seconds = [DurationSeconds(0)] * (largest_group_size + 1)
+            for (size, seconds) in tag_id_group_size_seconds[tag_id].items():
+                group_size_seconds[size] = seconds
+            if duration == 0:
                 avg_group_size = 0.0
             else:
                 # Average size of the group this animal belongs to.
                 # Weighted sum: (group size * duration at that size) / total duration
                 avg_group_size = (
                     sum(size * secs for size, secs in enumerate(group_size_seconds)) 
-                    / analyzer.duration
+                    / duration
                 )
            
             # Total time when an animal was not alone (group size >= 2)
@@ -79,48 +100,120 @@ def compute_group_sizes(
             
             size_secs_dict = {i: group_size_seconds[i] for i in range(len(group_size_seconds))}
 
-            rows.append(GroupSizeRow(
-                bin_number=bin.bin_number,
-                bin_start=start,
-                bin_end=end,
-                bin_duration=analyzer.duration,
+            yield GroupSizeRow(
+                bin=header,
                 animal_name=tag_id_to_name[tag_id],
                 size_seconds=size_secs_dict,
                 avg_group_size=avg_group_size,
                 avg_group_size_nosolo=avg_group_size_nosolo,
-            ))
+            )
     logging.debug(f"PROFILING: compute_group_sizes took {time.perf_counter() - t0:.3f} seconds")
-    return rows
 
 def write_group_sizes(
-    rows: List[GroupSizeRow],
+    rows: Iterable[GroupSizeRow],
     out_dir: str,
     exp_name: str,
+    long_format: bool = False,
+    output_format: str = "csv",
+    compression: Optional[str] = None,
+    folded: bool = False,
 ):
-    group_sizes = range(0, 9)
+    """Write the group size table, with rows in the order given.
+
+    The default (wide) format has one row per bin and animal, with a column per
+    group size from 1 up to the larger of 8 and the largest size in the first
+    row (compute_group_sizes gives every row the same sizes).  The long format
+    (`*.group_size.long.csv`) instead has one row per bin, animal and group
+    size, for the sizes in which the animal spent any time.
+
+    With output_format "columnar", the table is written as a columnar file (see
+    voletron.output.columnar), with avg_group_size_nosolo NaN where it is N/A.
+
+    If `folded`, the bins are folded over a day or week, and a period_count column
+    follows the bin columns.
+    """
+    if long_format:
+        _write_group_sizes_long(rows, out_dir, exp_name, output_format, compression, folded)
+        return
 
-    with open(os.path.join(out_dir, exp_name + ".group_size.csv"), "w") as f:
-        f.write("bin_number,bin_start,bin_end,bin_duration,animal,1,2,3,4,5,6,7,8,avg_group_size,avg_group_size_nosolo\n")
-        # Sort rows to ensure deterministic output order
-        rows.sort(key=lambda r: (r.bin_number, r.animal_name))
+    rows = iter(rows)
+    first_row = next(rows, None)
+    largest_group_size = MIN_GROUP_SIZE_COLUMNS
+    if first_row is not None:
+        largest_group_size = max(largest_group_size, max(first_row.size_seconds, default=0))
+        rows = itertools.chain([first_row], rows)
+    group_sizes = range(0, largest_group_size + 1)
+
+    if output_format == "columnar":
+        table = ColumnTable(
+            bin_columns(folded)
+            + [("animal", STR)]
+            + [(str(size), FLOAT) for size in group_sizes[1:]]
+            + [("avg_group_size", FLOAT), ("avg_group_size_nosolo", FLOAT)]
+        )
         for row in rows:
-            aaa = ",".join(map(lambda a: "{:.0f}".format(row.size_seconds.get(a, 0.0)), group_sizes[1:]))
-            
+            table.append(
+                bin_values(row, folded)
+                + (row.animal_name,)
+                + tuple(row.size_seconds.get(size, 0.0) for size in group_sizes[1:])
+                + (
+                    row.avg_group_size,
+                    math.nan if isinstance(row.avg_group_size_nosolo, str) else row.avg_group_size_nosolo,
+                )
+            )
+        write_columnar(table, out_dir, exp_name + ".group_size")
+        return
+
+    sizes = group_sizes[1:]
+    format_fields = ("{}," + ",".join(["{:.0f}"] * len(sizes)) + ",{:.2f},{}").format
+    with CsvTable(
+        os.path.join(out_dir, exp_name + ".group_size.csv"),
+        "animal," + ",".join(str(size) for size in sizes) + ",avg_group_size,avg_group_size_nosolo",
+        compression,
+        folded,
+    ) as table:
+        for row in rows:
+            size_seconds = row.size_seconds
             avg_group_size_nosolo_str = (
                 row.avg_group_size_nosolo
                 if isinstance(row.avg_group_size_nosolo, str)
                 else "{:.2f}".format(row.avg_group_size_nosolo)
             )
-
-            f.write(
-                "{},{:.0f},{:.0f},{:.0f},{},{},{:.2f},{}\n".format(
-                    row.bin_number,
-                    row.bin_start,
-                    row.bin_end,
-                    row.bin_duration,
+            table.add(
+                row.bin,
+                format_fields(
                     row.animal_name,
-                    aaa,
+                    *[size_seconds.get(size, 0.0) for size in sizes],
                     row.avg_group_size,
                     avg_group_size_nosolo_str,
-                )
+                ),
             )
+
+
+def _write_group_sizes_long(
+    rows: Iterable[GroupSizeRow],
+    out_dir: str,
+    exp_name: str,
+    output_format: str,
+    compression: Optional[str],
+    folded: bool,
+):
+    if output_format == "columnar":
+        table = ColumnTable(bin_columns(folded) + [("animal", STR), ("group_size", INT), ("seconds", FLOAT)])
+        for row in rows:
+            for (size, seconds) in sorted(row.size_seconds.items()):
+                if size == 0 or not seconds:
+                    continue
+                table.append(bin_values(row, folded) + (row.animal_name, size, seconds))
+        write_columnar(table, out_dir, exp_name + ".group_size.long")
+        return
+
+    format_fields = "{},{},{:.0f}".format
+    with CsvTable(
+        os.path.join(out_dir, exp_name + ".group_size.long.csv"), "animal,group_size,seconds", compression, folded
+    ) as table:
+        for row in rows:
+            for (size, seconds) in sorted(row.size_seconds.items()):
+                if size == 0 or not seconds:
+                    continue
+                table.add(row.bin, format_fields(row.animal_name, size, seconds))
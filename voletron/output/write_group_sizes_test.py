@@ -13,11 +13,14 @@
 # limitations under the License.
 
 
+import os
+import tempfile
 import unittest
 from unittest.mock import MagicMock
-from voletron.output.write_group_sizes import compute_group_sizes
+from voletron.output.write_group_sizes import compute_group_sizes, write_group_sizes
 from voletron.types import AnimalName, TagID, TimestampSeconds
-from voletron.output.types import OutputBin
+from voletron.output.types import BinHeader, GroupSizeRow, OutputBin
+from voletron.tag_index import TagIndex
 
 class TestComputeGroupSizes(unittest.TestCase):
     def setUp(self):
@@ -25,12 +28,14 @@ class TestComputeGroupSizes(unittest.TestCase):
         self.tag_ids = [self.tag_id]
         self.tag_id_to_name = {self.tag_id: AnimalName('foo_name')}
 
-    def _create_mock_bin(self, bin_number, start, end, durations):
+    def _create_mock_bin(self, bin_number, start, end, durations, animals=3):
         """
         durations: list of (tag_ids, duration_seconds) tuples
+        animals: the number of animals in the analyzer's TagIndex
         """
         mock_analyzer = MagicMock()
         mock_analyzer.duration = float(end - start)
+        mock_analyzer.tag_index = TagIndex([TagID('tag{}'.format(i)) for i in range(animals)])
         
         dwells = []
         for tags, duration in durations:
@@ -48,7 +53,7 @@ class TestComputeGroupSizes(unittest.TestCase):
             ([TagID('foo')], 100.0)
         ])
         
-        rows = compute_group_sizes(self.tag_ids, self.tag_id_to_name, [bin])
+        rows = list(compute_group_sizes(self.tag_ids, self.tag_id_to_name, [bin]))
         
         self.assertEqual(len(rows), 1)
         row = rows[0]
@@ -64,7 +69,7 @@ class TestComputeGroupSizes(unittest.TestCase):
             ([TagID('foo'), TagID('bar')], 100.0)
         ])
         
-        rows = compute_group_sizes(self.tag_ids, self.tag_id_to_name, [bin])
+        rows = list(compute_group_sizes(self.tag_ids, self.tag_id_to_name, [bin]))
         
         self.assertEqual(len(rows), 1)
         row = rows[0]
@@ -82,7 +87,7 @@ class TestComputeGroupSizes(unittest.TestCase):
             ([TagID('foo'), TagID('bar'), TagID('baz')], 60.0)
         ])
         
-        rows = compute_group_sizes(self.tag_ids, self.tag_id_to_name, [bin])
+        rows = list(compute_group_sizes(self.tag_ids, self.tag_id_to_name, [bin]))
         
         self.assertEqual(len(rows), 1)
         row = rows[0]
@@ -97,7 +102,7 @@ class TestComputeGroupSizes(unittest.TestCase):
         bin1 = self._create_mock_bin(1, TimestampSeconds(0), TimestampSeconds(100), [([TagID('foo')], 100.0)])
         bin2 = self._create_mock_bin(2, TimestampSeconds(100), TimestampSeconds(200), [([TagID('foo'), TagID('bar')], 100.0)])
         
-        rows = compute_group_sizes(self.tag_ids, self.tag_id_to_name, [bin1, bin2])
+        rows = list(compute_group_sizes(self.tag_ids, self.tag_id_to_name, [bin1, bin2]))
         
         self.assertEqual(len(rows), 2)
         self.assertEqual(rows[0].bin_number, 1)
@@ -109,7 +114,7 @@ class TestComputeGroupSizes(unittest.TestCase):
         # Duration 0
         bin = self._create_mock_bin(1, TimestampSeconds(100), TimestampSeconds(100), [])
         
-        rows = compute_group_sizes(self.tag_ids, self.tag_id_to_name, [bin])
+        rows = list(compute_group_sizes(self.tag_ids, self.tag_id_to_name, [bin]))
         
         # If duration is 0, we still get an entry if it exists in tag_id_group_size_seconds?
         # Actually, tag_id_group_size_seconds is populated from analyzer.get_group_chamber_exclusive_durations()
@@ -119,10 +124,96 @@ class TestComputeGroupSizes(unittest.TestCase):
     def test_duration_zero_safe(self):
         # Explicitly test the duration == 0 check in compute_group_sizes
         bin = self._create_mock_bin(1, TimestampSeconds(100), TimestampSeconds(100), [([TagID('foo')], 0.0)])
-        rows = compute_group_sizes(self.tag_ids, self.tag_id_to_name, [bin])
+        rows = list(compute_group_sizes(self.tag_ids, self.tag_id_to_name, [bin]))
         
         self.assertEqual(len(rows), 1)
         self.assertEqual(rows[0].avg_group_size, 0.0)
 
+    def test_rows_by_animal_name(self):
+        tag_ids = [TagID('z'), TagID('a')]
+        tag_id_to_name = {TagID('z'): AnimalName('zed'), TagID('a'): AnimalName('ay')}
+        bin0 = self._create_mock_bin(0, TimestampSeconds(0), TimestampSeconds(100), [])
+        bin1 = self._create_mock_bin(1, TimestampSeconds(0), TimestampSeconds(100), [])
+
+        rows = compute_group_sizes(tag_ids, tag_id_to_name, [bin0, bin1])
+
+        self.assertEqual(
+            [(row.bin_number, row.animal_name) for row in rows],
+            [(0, 'ay'), (0, 'zed'), (1, 'ay'), (1, 'zed')],
+        )
+
+    def test_large_group(self):
+        # 'foo' spends 100 seconds in a group of 12, larger than the 8 default columns.
+        colony = [TagID('foo')] + [TagID('other{}'.format(i)) for i in range(11)]
+        bin = self._create_mock_bin(1, TimestampSeconds(0), TimestampSeconds(100), [(colony, 100.0)], animals=12)
+
+        rows = list(compute_group_sizes(self.tag_ids, self.tag_id_to_name, [bin]))
+
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0].size_seconds[12], 100.0)
+        self.assertEqual(rows[0].size_seconds[8], 0.0)
+        self.assertEqual(rows[0].avg_group_size, 12.0)
+
+
+    def test_bins_streamed(self):
+        colony = [TagID('foo')] + [TagID('other{}'.format(i)) for i in range(9)]
+        bin0 = self._create_mock_bin(0, TimestampSeconds(0), TimestampSeconds(100), [([TagID('foo')], 100.0)], animals=11)
+        bin1 = self._create_mock_bin(1, TimestampSeconds(0), TimestampSeconds(100), [(colony, 100.0)], animals=11)
+
+        rows = compute_group_sizes(self.tag_ids, self.tag_id_to_name, iter([bin0, bin1]))
+
+        # Bin 0's rows come before bin 1 is read.
+        self.assertEqual(next(rows).bin_number, 0)
+        bin1.analyzer.get_group_chamber_exclusive_durations.assert_not_called()
+        rows = list(rows)
+        self.assertEqual(bin0.analyzer.get_group_chamber_exclusive_durations.call_count, 1)
+        self.assertEqual(bin1.analyzer.get_group_chamber_exclusive_durations.call_count, 1)
+        # Every row is padded to the largest group possible, of all 11 animals.
+        self.assertEqual([row.bin_number for row in rows], [1])
+        self.assertEqual(max(rows[0].size_seconds), 11)
+        self.assertEqual(rows[0].size_seconds[10], 100.0)
+
+
+class TestWriteGroupSizes(unittest.TestCase):
+    def _row(self, size_seconds):
+        return GroupSizeRow(
+            bin=BinHeader(1, TimestampSeconds(0), TimestampSeconds(100), 100.0),
+            animal_name="foo",
+            size_seconds=size_seconds,
+            avg_group_size=2.0,
+            avg_group_size_nosolo=3.0,
+        )
+
+    def test_wide_columns_grow(self):
+        out_dir = tempfile.mkdtemp()
+        write_group_sizes([self._row({0: 0.0, 1: 50.0, 10: 50.0})], out_dir, "exp")
+        with open(os.path.join(out_dir, "exp.group_size.csv")) as f:
+            lines = f.read().splitlines()
+        self.assertEqual(
+            lines[0],
+            "bin_number,bin_start,bin_end,bin_duration,animal,1,2,3,4,5,6,7,8,9,10,avg_group_size,avg_group_size_nosolo",
+        )
+        self.assertEqual(lines[1], "1,0,100,100,foo,50,0,0,0,0,0,0,0,0,50,2.00,3.00")
+
+    def test_wide_columns_minimum(self):
+        out_dir = tempfile.mkdtemp()
+        write_group_sizes([self._row({1: 100.0})], out_dir, "exp")
+        with open(os.path.join(out_dir, "exp.group_size.csv")) as f:
+            self.assertTrue(f.readline().startswith("bin_number,bin_start,bin_end,bin_duration,animal,1,2,3,4,5,6,7,8,avg"))
+
+    def test_long_format(self):
+        out_dir = tempfile.mkdtemp()
+        write_group_sizes([self._row({0: 0.0, 1: 50.0, 2: 0.0, 10: 50.0})], out_dir, "exp", long_format=True)
+        with open(os.path.join(out_dir, "exp.group_size.long.csv")) as f:
+            self.assertEqual(
+                f.read().splitlines(),
+                [
+                    "bin_number,bin_start,bin_end,bin_duration,animal,group_size,seconds",
+                    "1,0,100,100,foo,1,50",
+                    "1,0,100,100,foo,10,50",
+                ],
+            )
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -16,11 +16,15 @@
 import os
 import time
 import logging
-from typing import List, Tuple
+from typing import Iterable, Iterator, List, Optional, Tuple
 from voletron.types import AnimalName, ChamberName, AnimalConfig, DurationMinutes, LongDwell, TagID, TimestampSeconds, DurationSeconds
 from voletron.trajectory import AllAnimalTrajectories
 from voletron.util import format_time
-from voletron.output.types import LongDwellRow, OutputBin
+from voletron.output.bin_events import events_per_bin
+from voletron.output.columnar import BIN_COLUMNS, ColumnTable, bin_values, write_columnar
+from voletron.output.npy import FLOAT, STR
+from voletron.output.files import CsvTable
+from voletron.output.types import BinHeader, LongDwellRow, OutputBin
 
 
 def compute_long_dwells(
@@ -28,59 +32,63 @@ def compute_long_dwells(
     tag_ids: List[TagID],
     trajectories: AllAnimalTrajectories,
     bins: List[OutputBin],
-) -> List[LongDwellRow]:
+) -> Iterator[LongDwellRow]:
+    """Yield the long dwell rows of each bin in turn."""
     t0 = time.perf_counter()
-    rows = []
     
     # Pre-fetch all long dwells for relevant tags
-    long_dwells = []
-    for (tag_id, trajectory) in trajectories.animalTrajectories.items():
-        if not tag_id in tag_ids:
-            continue
-        for d in trajectory.long_dwells():
-            # d is (tag_id_str, chamber_name, start_time, duration)
-            # trajectory.long_dwells() returns tuple with tag_id as first element? 
-            # Let's check previous code: `config.tag_id_to_name[d[0]]`. Yes.
-            long_dwells.append(d)
+    # d is (tag_id, chamber_name, start_time, duration)
+    long_dwells = [
+        d
+        for (tag_id, trajectory) in trajectories.animalTrajectories.items()
+        if tag_id in tag_ids
+        for d in trajectory.long_dwells()
+    ]
 
-    for bin in bins:
-        b_start = bin.bin_start
-        b_end = bin.bin_end
-        for d in long_dwells:
-            # d: (tag_id, chamber, start_time, duration)
-            start_time = d[2]
-            
-            # Check if dwell starts within this bin
-            # For the 'whole experiment' bin, we include everything within analysis range?
-            # Or just everything?
-            # Let's strictly respect analysis range for all bins including the whole one.
-            # But wait, if a dwell is outside analysis range, should it be reported?
-            # Assuming logic: dwell must start >= b_start and < b_end
-            
-            if start_time >= b_start and start_time < b_end:
-                rows.append(LongDwellRow(
-                    bin_number=bin.bin_number,
-                    bin_start=b_start,
-                    bin_end=b_end,
-                    bin_duration=b_end - b_start,
-                    animal_name=config.tag_id_to_name[d[0]],
-                    chamber_name=d[1],
-                    start_time=start_time,
-                    duration_seconds=d[3]
-                ))
+    # Each bin reports the dwells starting within it.
+    for (bin, indexes) in events_per_bin([d[2] for d in long_dwells], bins):
+        header = BinHeader.of(bin)
+        for i in indexes:
+            d = long_dwells[i]
+            yield LongDwellRow(
+                bin=header,
+                animal_name=config.tag_id_to_name[d[0]],
+                chamber_name=d[1],
+                start_time=d[2],
+                duration_seconds=d[3]
+            )
     logging.debug(f"PROFILING: compute_long_dwells took {time.perf_counter() - t0:.3f} seconds")
-    return rows
 
 def write_long_dwells(
-    rows: List[LongDwellRow],
+    rows: Iterable[LongDwellRow],
     out_dir: str,
     exp_name: str,
+    output_format: str = "csv",
+    compression: Optional[str] = None,
 ):
-    with open(os.path.join(out_dir, exp_name + ".longdwells.csv"), "w") as f:
-        f.write("bin_number,bin_start,bin_end,bin_duration,animal,chamber,start_time,seconds\n")
+    """Write the long dwell table, as CSV or (with output_format "columnar")
+    as a columnar file; see voletron.output.columnar.
+
+    In the columnar format, start_time is in epoch seconds.
+    """
+    if output_format == "columnar":
+        table = ColumnTable(
+            BIN_COLUMNS + [("animal", STR), ("chamber", STR), ("start_time", FLOAT), ("seconds", FLOAT)]
+        )
+        for row in rows:
+            table.append(
+                bin_values(row)
+                + (row.animal_name, row.chamber_name, row.start_time, row.duration_seconds)
+            )
+        write_columnar(table, out_dir, exp_name + ".longdwells")
+        return
+
+    format_fields = "{},{},{},{:.0f}".format
+    with CsvTable(
+        os.path.join(out_dir, exp_name + ".longdwells.csv"), "animal,chamber,start_time,seconds", compression
+    ) as table:
         for row in rows:
-            f.write(
-                "{},{:.0f},{:.0f},{:.0f},{},{},{},{:.0f}\n".format(
-                    row.bin_number, row.bin_start, row.bin_end, row.bin_duration, row.animal_name, row.chamber_name, format_time(row.start_time), row.duration_seconds
-                )
+            table.add(
+                row.bin,
+                format_fields(row.animal_name, row.chamber_name, format_time(row.start_time), row.duration_seconds),
             )
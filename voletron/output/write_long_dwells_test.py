@@ -33,7 +33,7 @@ class TestWriteLongDwells(unittest.TestCase):
             OutputBin(bin_number=0, bin_start=TimestampSeconds(0), bin_end=TimestampSeconds(30), analyzer=MagicMock()) # Whole
         ]
 
-        rows = compute_long_dwells(config, tag_ids, mock_trajectories, bins)
+        rows = list(compute_long_dwells(config, tag_ids, mock_trajectories, bins))
 
         # Expected:
         # Bin 1 (0-10): Dwell starting at 5 should be here.
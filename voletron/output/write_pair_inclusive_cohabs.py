@@ -16,17 +16,25 @@
 import os
 import time
 import logging
-from typing import List, Tuple
+from typing import Iterable, Iterator, List, Optional, Tuple
 from voletron.types import AnimalConfig, DurationSeconds, TagID, CHAMBER_ERROR
-from voletron.output.types import PairCohabRow, OutputBin
+from voletron.output.columnar import ColumnTable, bin_columns, bin_values, write_columnar
+from voletron.output.npy import INT, FLOAT, STR
+from voletron.output.files import CsvTable
+from voletron.output.types import BinHeader, PairCohabRow, OutputBin
 
 def compute_pair_inclusive_cohabs(
     config: AnimalConfig,
     tag_ids: List[TagID],
-    bins: List[OutputBin],
-) -> List[PairCohabRow]:
+    bins: Iterable[OutputBin],
+    include_empty: bool = True,
+) -> Iterator[PairCohabRow]:
+    """Yield the pair cohabitation rows of each bin in turn.
+
+    Unless `include_empty`, pairs that shared no co-dwells in a bin are
+    omitted.
+    """
     t0 = time.perf_counter()
-    rows = []
     
     tag_id_set = set(tag_ids)
     
@@ -37,41 +45,36 @@ def compute_pair_inclusive_cohabs(
         for j in range(i + 1, len(sorted_tag_ids)):
             all_pairs.append((sorted_tag_ids[i], sorted_tag_ids[j]))
 
+    # Matrix cells of each pair, per TagIndex (normally all bins share one).
+    cells_of_tag_index = {}
+
     for bin in bins:
         if bin.analyzer is None:
              continue
         analyzer = bin.analyzer
         start = bin.bin_start
         end = bin.bin_end
+        header = BinHeader.of(bin, analyzer.duration)
         
-        # Map pair -> aggregate
-        stats_map = {}
-        for agg in analyzer.get_pair_inclusive_stats():
-            # agg.tag_ids is a list [tag_a, tag_b]
-            pair_key = tuple(sorted(agg.tag_ids))
-            stats_map[pair_key] = agg
-            
-        for (animal_a, animal_b) in all_pairs:
-            pair_key = (animal_a, animal_b)
+        matrix = analyzer.get_pair_matrix()
+        cells = cells_of_tag_index.get(matrix.tag_index)
+        if cells is None:
+            index = matrix.tag_index.index
+            cells = cells_of_tag_index[matrix.tag_index] = [
+                (index(animal_a), index(animal_b)) for (animal_a, animal_b) in all_pairs
+            ]
             
-            if pair_key in stats_map:
-                agg = stats_map[pair_key]
-                count = agg.count
-                duration = agg.duration_seconds
-            else:
-                count = 0
-                duration = DurationSeconds(0)
-
-            rows.append(PairCohabRow(
-                bin_number=bin.bin_number,
-                bin_start=start,
-                bin_end=end,
-                bin_duration=analyzer.duration,
+        for ((animal_a, animal_b), (index_a, index_b)) in zip(all_pairs, cells):
+            dwell_count = matrix.count(index_a, index_b)
+            if not dwell_count and not include_empty:
+                continue
+            yield PairCohabRow(
+                bin=header,
                 animal_a_name=config.tag_id_to_name[animal_a],
                 animal_b_name=config.tag_id_to_name[animal_b],
-                dwell_count=count,
-                duration_seconds=duration,
-            ))
+                dwell_count=dwell_count,
+                duration_seconds=matrix.duration(index_a, index_b),
+            )
 
 
         # Add Unknown/Error rows
@@ -95,35 +98,51 @@ def compute_pair_inclusive_cohabs(
              if stat["duration"] == 0 and stat["count"] == 0:
                  continue
              
-             rows.append(PairCohabRow(
-                bin_number=bin.bin_number,
-                bin_start=start,
-                bin_end=end,
-                bin_duration=analyzer.duration,
+             yield PairCohabRow(
+                bin=header,
                 animal_a_name=config.tag_id_to_name[tag_id],
                 animal_b_name="UNKNOWN",
                 dwell_count=stat["count"],
                 duration_seconds=DurationSeconds(stat["duration"]),
-            ))
+            )
             
     logging.debug(f"PROFILING: compute_pair_inclusive_cohabs took {time.perf_counter() - t0:.3f} seconds")
-    return rows
 
 def write_pair_inclusive_cohabs(
-    rows: List[PairCohabRow], out_dir: str, exp_name: str
+    rows: Iterable[PairCohabRow],
+    out_dir: str,
+    exp_name: str,
+    output_format: str = "csv",
+    compression: Optional[str] = None,
+    folded: bool = False,
 ):
-    with open(os.path.join(out_dir, exp_name + ".pair-inclusive.cohab.csv"), "w") as f:
-        f.write("bin_number,bin_start,bin_end,bin_duration,Animal A,Animal B,dwells,seconds\n")
+    """Write the pair cohabitation table, as CSV or (with output_format
+    "columnar") as a columnar file; see voletron.output.columnar.
+
+    If `folded`, the bins are folded over a day or week, and a period_count column
+    follows the bin columns.
+    """
+    if output_format == "columnar":
+        table = ColumnTable(
+            bin_columns(folded) + [("Animal A", STR), ("Animal B", STR), ("dwells", INT), ("seconds", FLOAT)]
+        )
+        for row in rows:
+            table.append(
+                bin_values(row, folded)
+                + (row.animal_a_name, row.animal_b_name, row.dwell_count, row.duration_seconds)
+            )
+        write_columnar(table, out_dir, exp_name + ".pair-inclusive.cohab")
+        return
+
+    format_fields = "{},{},{},{:.0f}".format
+    with CsvTable(
+        os.path.join(out_dir, exp_name + ".pair-inclusive.cohab.csv"),
+        "Animal A,Animal B,dwells,seconds",
+        compression,
+        folded,
+    ) as table:
         for row in rows:
-            f.write(
-                "{},{:.0f},{:.0f},{:.0f},{},{},{},{:.0f}\n".format(
-                    row.bin_number,
-                    row.bin_start,
-                    row.bin_end,
-                    row.bin_duration,
-                    row.animal_a_name,
-                    row.animal_b_name,
-                    row.dwell_count,
-                    row.duration_seconds,
-                )
+            table.add(
+                row.bin,
+                format_fields(row.animal_a_name, row.animal_b_name, row.dwell_count, row.duration_seconds),
             )
@@ -5,7 +5,19 @@ import os
 from unittest.mock import MagicMock
 from voletron.output.write_pair_inclusive_cohabs import compute_pair_inclusive_cohabs, write_pair_inclusive_cohabs
 from voletron.types import TagID, TimestampSeconds, ChamberName, AnimalName, AnimalConfig
-from voletron.output.types import PairCohabRow, OutputBin
+from voletron.output.types import BinHeader, PairCohabRow, OutputBin
+from voletron.pair_matrix import PairMatrix
+from voletron.tag_index import TagIndex
+
+tag_index = TagIndex([TagID("tag1"), TagID("tag2")])
+
+def _pair_matrix(count, duration):
+    """A matrix in which tag1 and tag2 shared `count` co-dwells of `duration` in total."""
+    matrix = PairMatrix(tag_index)
+    offsets = matrix.offsets(tag_index.mask([TagID("tag1"), TagID("tag2")]))
+    for _ in range(count):
+        matrix.add(offsets, duration / count)
+    return matrix
 
 class TestWritePairInclusiveCohabs(unittest.TestCase):
     def test_compute_pair_inclusive_cohabs(self):
@@ -21,23 +33,17 @@ class TestWritePairInclusiveCohabs(unittest.TestCase):
         # Mocks for analyzers
         # Bin 1
         mock_analyzer_1 = MagicMock()
-        mock_analyzer_1.get_pair_inclusive_stats.return_value = [
-            MagicMock(tag_ids=[TagID("tag1"), TagID("tag2")], count=1, duration_seconds=5.0)
-        ]
+        mock_analyzer_1.get_pair_matrix.return_value = _pair_matrix(1, 5.0)
         mock_analyzer_1.duration = 10.0
         
         # Bin 2
         mock_analyzer_2 = MagicMock()
-        mock_analyzer_2.get_pair_inclusive_stats.return_value = [
-            MagicMock(tag_ids=[TagID("tag1"), TagID("tag2")], count=1, duration_seconds=5.0)
-        ]
+        mock_analyzer_2.get_pair_matrix.return_value = _pair_matrix(1, 5.0)
         mock_analyzer_2.duration = 10.0
         
         # Bin 3
         mock_analyzer_3 = MagicMock()
-        mock_analyzer_3.get_pair_inclusive_stats.return_value = [
-             MagicMock(tag_ids=[TagID("tag1"), TagID("tag2")], count=1, duration_seconds=10.0)
-        ]
+        mock_analyzer_3.get_pair_matrix.return_value = _pair_matrix(1, 10.0)
         mock_analyzer_3.duration = 20.0
         
         bins = [
@@ -47,7 +53,7 @@ class TestWritePairInclusiveCohabs(unittest.TestCase):
         ]
 
         tag_ids = [TagID("tag1"), TagID("tag2")]
-        rows = compute_pair_inclusive_cohabs(config, tag_ids, bins)
+        rows = list(compute_pair_inclusive_cohabs(config, tag_ids, bins))
 
         # Bin 1 (0-10): Overlap is 5 to 10. Duration 5.
         # Bin 2 (10-20): Overlap is 10 to 15. Duration 5.
@@ -78,16 +84,37 @@ class TestWritePairInclusiveCohabs(unittest.TestCase):
         self.assertEqual(r3.duration_seconds, 10.0)
         self.assertEqual(r3.bin_duration, 20.0)
 
+    def test_compute_pair_inclusive_cohabs_omits_empty(self):
+        config = MagicMock(spec=AnimalConfig)
+        config.tag_id_to_name = {
+            TagID("tag1"): AnimalName("animal1"),
+            TagID("tag2"): AnimalName("animal2")
+        }
+        empty_analyzer = MagicMock()
+        empty_analyzer.get_pair_matrix.return_value = _pair_matrix(0, 0.0)
+        empty_analyzer.get_group_chamber_exclusive_durations.return_value = []
+        empty_analyzer.duration = 10.0
+        analyzer = MagicMock()
+        analyzer.get_pair_matrix.return_value = _pair_matrix(1, 5.0)
+        analyzer.get_group_chamber_exclusive_durations.return_value = []
+        analyzer.duration = 10.0
+        bins = [
+            OutputBin(bin_number=1, bin_start=TimestampSeconds(0), bin_end=TimestampSeconds(10), analyzer=empty_analyzer),
+            OutputBin(bin_number=2, bin_start=TimestampSeconds(10), bin_end=TimestampSeconds(20), analyzer=analyzer),
+        ]
+        tag_ids = [TagID("tag1"), TagID("tag2")]
+
+        self.assertEqual(len(list(compute_pair_inclusive_cohabs(config, tag_ids, bins))), 2)
+        rows = list(compute_pair_inclusive_cohabs(config, tag_ids, bins, include_empty=False))
+        self.assertEqual([(row.bin_number, row.dwell_count) for row in rows], [(2, 1)])
+
     def test_write_pair_inclusive_cohabs(self):
         out_dir = tempfile.mkdtemp()
         exp_name = "test_exp"
         
         rows = [
              PairCohabRow(
-                bin_number=0,
-                bin_start=TimestampSeconds(0),
-                bin_end=TimestampSeconds(100),
-                bin_duration=100.0,
+                bin=BinHeader(0, TimestampSeconds(0), TimestampSeconds(100), 100.0),
                 animal_a_name="a1",
                 animal_b_name="a2",
                 dwell_count=1,
@@ -157,12 +184,12 @@ class TestWritePairInclusiveCohabs(unittest.TestCase):
             
             # Output.py binning logic emulation
             bin_dwells = []
-            for d in sorted(co_dwells, key=lambda x: x.end):
-                if d.end <= b_start: continue
-                if d.start >= b_end: continue
-                bin_dwells.append(d)
+            for i in sorted(range(len(co_dwells)), key=co_dwells.ends.__getitem__):
+                if co_dwells.ends[i] <= b_start: continue
+                if co_dwells.starts[i] >= b_end: continue
+                bin_dwells.append(i)
                 
-            analyzer = TimeSpanAnalyzer(bin_dwells, b_start, b_end)
+            analyzer = TimeSpanAnalyzer(co_dwells, b_start, b_end, bin_dwells)
             
             bin2 = OutputBin(
                 bin_number=2,
@@ -0,0 +1,127 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""The pairwise cohabitation table as a dense animal x animal matrix per bin."""
+
+import logging
+import os
+import sys
+import tempfile
+import time
+from array import array
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from voletron.output.npy import FLOAT, INT, STR, write_npz
+from voletron.output.types import OutputBin
+from voletron.pair_matrix import cell_pairs
+from voletron.tag_index import TagIndex
+from voletron.types import AnimalConfig, TagID
+
+
+def write_pair_matrix(
+    config: AnimalConfig,
+    tag_ids: List[TagID],
+    bins: Iterable[OutputBin],
+    out_dir: str,
+    exp_name: str,
+    folded: bool = False,
+):
+    """Write the pair cohabitation totals of each bin as `*.pair_matrix.npz`.
+
+    This holds the same totals as `*.pair-inclusive.cohab.csv` (apart from the
+    UNKNOWN rows), as NumPy arrays:
+
+        animals: the N animal names, ordered by tag ID.
+        bin_number, bin_start, bin_end, bin_duration: per bin, in order.
+        dwells: (bins, N, N) int64 co-dwell counts.
+        seconds: (bins, N, N) float64 seconds together.
+
+    The matrices are symmetric, with zero diagonals.  If `folded`, the bins
+    are folded over a day or week, and a period_count array gives the number
+    of periods summed into each.
+    """
+    t0 = time.perf_counter()
+    sorted_tag_ids = sorted(tag_ids)
+    n = len(sorted_tag_ids)
+    position_of_tag_id = {tag_id: position for (position, tag_id) in enumerate(sorted_tag_ids)}
+
+    headers: Dict[str, list] = {
+        "bin_number": [], "bin_start": [], "bin_end": [], "bin_duration": [], "period_count": []
+    }
+    empty_matrix = bytes(8 * n * n)
+    # The positions (i * n + j, j * n + i) in the output matrix of each
+    # PairMatrix cell, per TagIndex (normally all bins share one); None for
+    # cells of animals not written.
+    slots_of_tag_index: Dict[TagIndex, List[Optional[Tuple[int, int]]]] = {}
+    # A zip file is written one member at a time, and the number of bins is
+    # not known until they have all been read (bins arrive one by one, shared
+    # with the other tables).  So each bin's matrices are appended to
+    # temporary files as soon as the bin is read, and copied into the .npz
+    # members once the shape is known: only one bin's matrices are in memory.
+    with tempfile.TemporaryFile(dir=out_dir) as dwells_file, tempfile.TemporaryFile(dir=out_dir) as seconds_file:
+        for bin in bins:
+            if bin.analyzer is None:
+                continue
+            headers["bin_number"].append(bin.bin_number)
+            headers["bin_start"].append(bin.bin_start)
+            headers["bin_end"].append(bin.bin_end)
+            headers["bin_duration"].append(bin.analyzer.duration)
+            if folded:
+                headers["period_count"].append(len(bin.parts))
+            matrix = bin.analyzer.get_pair_matrix()
+            slots = slots_of_tag_index.get(matrix.tag_index)
+            if slots is None:
+                slots = slots_of_tag_index[matrix.tag_index] = _cell_slots(matrix.tag_index, position_of_tag_id)
+            dwells = array("q", empty_matrix)
+            seconds = array("d", empty_matrix)
+            for (cell, count, duration) in matrix.used_cells():
+                slot = slots[cell]
+                if slot is not None:
+                    (ij, ji) = slot
+                    dwells[ij] = dwells[ji] = count
+                    seconds[ij] = seconds[ji] = duration
+            if sys.byteorder == "big":
+                dwells.byteswap()
+                seconds.byteswap()
+            dwells.tofile(dwells_file)
+            seconds.tofile(seconds_file)
+
+        bin_count = len(headers["bin_number"])
+        arrays = {
+            "animals": (STR, [config.tag_id_to_name[tag_id] for tag_id in sorted_tag_ids], None),
+            "bin_number": (INT, headers["bin_number"], None),
+            "bin_start": (FLOAT, headers["bin_start"], None),
+            "bin_end": (FLOAT, headers["bin_end"], None),
+            "bin_duration": (FLOAT, headers["bin_duration"], None),
+        }
+        if folded:
+            arrays["period_count"] = (INT, headers["period_count"], None)
+        dwells_file.seek(0)
+        seconds_file.seek(0)
+        arrays["dwells"] = (INT, dwells_file, (bin_count, n, n))
+        arrays["seconds"] = (FLOAT, seconds_file, (bin_count, n, n))
+        write_npz(os.path.join(out_dir, exp_name + ".pair_matrix.npz"), arrays)
+    logging.debug(f"PROFILING: write_pair_matrix took {time.perf_counter() - t0:.3f} seconds")
+
+
+def _cell_slots(
+    tag_index: TagIndex, position_of_tag_id: Dict[TagID, int]
+) -> List[Optional[Tuple[int, int]]]:
+    n = len(position_of_tag_id)
+    positions = [position_of_tag_id.get(tag_id) for tag_id in tag_index.tag_ids]
+    slots: List[Optional[Tuple[int, int]]] = []
+    for (index_a, index_b) in cell_pairs(len(positions)):
+        (i, j) = (positions[index_a], positions[index_b])
+        slots.append(None if i is None or j is None else (i * n + j, j * n + i))
+    return slots
@@ -0,0 +1,118 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import struct
+import tempfile
+import unittest
+import zipfile
+from array import array
+from unittest.mock import MagicMock
+
+from voletron.output.types import OutputBin
+from voletron.output.write_pair_matrix import write_pair_matrix
+from voletron.pair_matrix import PairMatrix
+from voletron.tag_index import TagIndex
+from voletron.types import AnimalConfig, AnimalName, TagID, TimestampSeconds
+
+
+def _array_header_and_body(z: zipfile.ZipFile, name: str):
+    data = z.read(name + ".npy")
+    (header_length,) = struct.unpack("<H", data[8:10])
+    return (data[10:10 + header_length].decode("latin1"), data[10 + header_length:])
+
+
+class TestWritePairMatrix(unittest.TestCase):
+    def test_write_pair_matrix(self):
+        config = MagicMock(spec=AnimalConfig)
+        config.tag_id_to_name = {
+            TagID("tag1"): AnimalName("animal1"),
+            TagID("tag2"): AnimalName("animal2"),
+            TagID("tag3"): AnimalName("animal3"),
+        }
+        # The matrix indexes animals in a different order from the output.
+        tag_index = TagIndex([TagID("tag3"), TagID("tag1"), TagID("tag2")])
+        matrix = PairMatrix(tag_index)
+        matrix.add(matrix.offsets(tag_index.mask([TagID("tag1"), TagID("tag3")])), 5.0)
+        matrix.add(matrix.offsets(tag_index.mask([TagID("tag1"), TagID("tag3")])), 2.5)
+        analyzer = MagicMock()
+        analyzer.get_pair_matrix.return_value = matrix
+        analyzer.duration = 10.0
+        bins = [
+            OutputBin(bin_number=0, bin_start=TimestampSeconds(0), bin_end=TimestampSeconds(10), analyzer=analyzer),
+            OutputBin(bin_number=1, bin_start=TimestampSeconds(0), bin_end=TimestampSeconds(10), analyzer=analyzer),
+        ]
+
+        out_dir = tempfile.mkdtemp()
+        write_pair_matrix(config, [TagID("tag2"), TagID("tag3"), TagID("tag1")], bins, out_dir, "test_exp")
+
+        with zipfile.ZipFile(os.path.join(out_dir, "test_exp.pair_matrix.npz")) as z:
+            (header, body) = _array_header_and_body(z, "animals")
+            self.assertIn("'shape': (3,)", header)
+            self.assertEqual(body, "animal1animal2animal3".encode("utf-32-le"))
+
+            (header, body) = _array_header_and_body(z, "dwells")
+            self.assertIn("'descr': '<i8'", header)
+            self.assertIn("'shape': (2, 3, 3)", header)
+            self.assertEqual(struct.unpack("<18q", body)[:9], (0, 0, 2, 0, 0, 0, 2, 0, 0))
+
+            (header, body) = _array_header_and_body(z, "seconds")
+            self.assertEqual(struct.unpack("<18d", body)[9:], (0, 0, 7.5, 0, 0, 0, 7.5, 0, 0))
+
+            (_, body) = _array_header_and_body(z, "bin_number")
+            self.assertEqual(struct.unpack("<2q", body), (0, 1))
+
+    def test_bins_streamed(self):
+        # Bins arrive from an iterator, each with its own matrix: a dense one,
+        # and a sparse one of many animals, some of them not written.
+        tag_ids = [TagID("tag{:02}".format(i)) for i in range(12)]
+        config = MagicMock(spec=AnimalConfig)
+        config.tag_id_to_name = {tag_id: AnimalName(tag_id.replace("tag", "a")) for tag_id in tag_ids}
+        small_index = TagIndex(tag_ids[:2])
+        dense = PairMatrix(small_index)
+        dense.add(dense.offsets(small_index.mask(tag_ids[:2])), 4.0)
+        large_index = TagIndex(tag_ids)
+        sparse = PairMatrix(large_index)
+        sparse.add(sparse.offsets(large_index.mask([tag_ids[0], tag_ids[2]])), 3.0)
+        sparse.add(sparse.offsets(large_index.mask([tag_ids[1], tag_ids[11]])), 6.0)
+        self.assertIsInstance(dense.counts, array)
+        self.assertIsInstance(sparse.counts, dict)
+
+        def bins():
+            for (bin_number, matrix) in enumerate([dense, sparse]):
+                analyzer = MagicMock()
+                analyzer.get_pair_matrix.return_value = matrix
+                analyzer.duration = 10.0
+                yield OutputBin(
+                    bin_number=bin_number, bin_start=TimestampSeconds(0), bin_end=TimestampSeconds(10),
+                    analyzer=analyzer,
+                )
+
+        out_dir = tempfile.mkdtemp()
+        write_pair_matrix(config, tag_ids[:3], bins(), out_dir, "test_exp")
+
+        with zipfile.ZipFile(os.path.join(out_dir, "test_exp.pair_matrix.npz")) as z:
+            (header, body) = _array_header_and_body(z, "dwells")
+            self.assertIn("'shape': (2, 3, 3)", header)
+            self.assertEqual(struct.unpack("<18q", body), (0, 1, 0, 1, 0, 0, 0, 0, 0, 0, 0, 1, 0, 0, 0, 1, 0, 0))
+            (header, body) = _array_header_and_body(z, "seconds")
+            self.assertEqual(
+                struct.unpack("<18d", body), (0, 4, 0, 4, 0, 0, 0, 0, 0, 0, 0, 3, 0, 0, 0, 3, 0, 0)
+            )
+        # The temporary files are gone.
+        self.assertEqual(os.listdir(out_dir), ["test_exp.pair_matrix.npz"])
+
+
+if __name__ == "__main__":
+    unittest.main()
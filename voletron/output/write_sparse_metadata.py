@@ -0,0 +1,70 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""The metadata needed to read sparse output tables."""
+
+import json
+import os
+from typing import List, Optional
+
+from voletron.output.files import open_output
+from voletron.output.types import OutputBin
+from voletron.types import AnimalConfig, ChamberName, TagID
+
+# The key columns of each sparse table (by file name suffix).  For each bin,
+# every combination of keys missing from a table has all-zero values.
+SPARSE_TABLE_KEYS = {
+    "chambers.long": ["animal", "chamber"],
+    "pair-inclusive.cohab": ["Animal A", "Animal B"],
+    "group_chamber_cohab": ["animals", "chamber"],
+    "group_size.long": ["animal", "group_size"],
+}
+
+
+def write_sparse_metadata(
+    config: AnimalConfig,
+    tag_ids: List[TagID],
+    chambers: Optional[List[ChamberName]],
+    bins: List[OutputBin],
+    out_dir: str,
+    exp_name: str,
+    compression: Optional[str] = None,
+):
+    """Write `*.sparse.json`, from which the zeros omitted by sparse tables can
+    be restored.
+
+    It lists the animals (ordered by tag ID, which is also the order of Animal A
+    and Animal B within a pair), the chambers if the tables include chamber
+    times, every bin (including those with no rows at all), and the key
+    columns of each sparse table.  Folded bins also give their period_count.
+    """
+    bin_entries = []
+    for bin in bins:
+        entry = {
+            "bin_number": bin.bin_number,
+            "bin_start": bin.bin_start,
+            "bin_end": bin.bin_end,
+            "bin_duration": bin.duration,
+        }
+        if bin.parts is not None:
+            entry["period_count"] = len(bin.parts)
+        bin_entries.append(entry)
+    metadata = {
+        "animals": [config.tag_id_to_name[tag_id] for tag_id in sorted(tag_ids)],
+        "chambers": chambers,
+        "bins": bin_entries,
+        "tables": SPARSE_TABLE_KEYS,
+    }
+    with open_output(os.path.join(out_dir, exp_name + ".sparse.json"), compression) as f:
+        json.dump(metadata, f, indent=2)
@@ -0,0 +1,60 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import MagicMock
+
+from voletron.output.types import OutputBin
+from voletron.output.write_sparse_metadata import write_sparse_metadata
+from voletron.types import AnimalConfig, AnimalName, ChamberName, TagID, TimestampSeconds
+
+
+class TestWriteSparseMetadata(unittest.TestCase):
+    def test_write_sparse_metadata(self):
+        config = MagicMock(spec=AnimalConfig)
+        config.tag_id_to_name = {
+            TagID("tag2"): AnimalName("zed"),
+            TagID("tag1"): AnimalName("amy"),
+        }
+        analyzer = MagicMock()
+        analyzer.duration = 7.0
+        bins = [
+            OutputBin(bin_number=0, bin_start=TimestampSeconds(0), bin_end=TimestampSeconds(10), analyzer=analyzer),
+            OutputBin(bin_number=1, bin_start=TimestampSeconds(0), bin_end=TimestampSeconds(10), analyzer=None),
+        ]
+        out_dir = tempfile.mkdtemp()
+
+        write_sparse_metadata(
+            config, [TagID("tag2"), TagID("tag1")], [ChamberName("c1")], bins, out_dir, "test_exp"
+        )
+
+        with open(os.path.join(out_dir, "test_exp.sparse.json")) as f:
+            metadata = json.load(f)
+        self.assertEqual(metadata["animals"], ["amy", "zed"])
+        self.assertEqual(metadata["chambers"], ["c1"])
+        self.assertEqual(
+            metadata["bins"],
+            [
+                {"bin_number": 0, "bin_start": 0, "bin_end": 10, "bin_duration": 7.0},
+                {"bin_number": 1, "bin_start": 0, "bin_end": 10, "bin_duration": 10},
+            ],
+        )
+        self.assertEqual(metadata["tables"]["pair-inclusive.cohab"], ["Animal A", "Animal B"])
+
+
+if __name__ == "__main__":
+    unittest.main()
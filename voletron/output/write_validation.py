@@ -16,11 +16,16 @@
 import os
 import logging
 import time
-from typing import List, Dict, Set, Tuple
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+from voletron.constants import VALIDATION_SECONDS_AFTER, VALIDATION_SECONDS_BEFORE
 from voletron.types import AnimalName, TagID, Validation, TimestampSeconds, DurationSeconds, HabitatName
 from voletron.trajectory import AllAnimalTrajectories
 from voletron.util import format_time
-from voletron.output.types import ValidationRow, OutputBin
+from voletron.output.bin_events import events_per_bin
+from voletron.output.columnar import BIN_COLUMNS, ColumnTable, bin_values, write_columnar
+from voletron.output.npy import FLOAT, BOOL, STR
+from voletron.output.files import CsvTable
+from voletron.output.types import BinHeader, ValidationRow, OutputBin
 
 def compute_validation(
     tag_ids: List[TagID],
@@ -28,75 +33,128 @@ def compute_validation(
     tag_id_to_name: Dict[TagID, AnimalName],
     validations: List[Validation],
     bins: List[OutputBin],
-) -> List[ValidationRow]:
+    tolerance: Tuple[float, float] = (VALIDATION_SECONDS_BEFORE, VALIDATION_SECONDS_AFTER),
+) -> Iterator[ValidationRow]:
+    """Yield a row per validation point in each bin in turn.
+
+    A point is correct if the animal was in the expected chamber at any time
+    from tolerance[0] seconds before it to tolerance[1] seconds after it.
+    """
     t0 = time.perf_counter()
-    rows = []
     relevant_validations = [vv for vv in validations if vv.tag_id in tag_ids]
-    
-    if not bins:
-        return []
-        
-    bin = bins[0]
-    b_start = bin.bin_start
-    b_end = bin.bin_end
-    for v in relevant_validations:
-        if v.timestamp >= b_start and v.timestamp < b_end:
-            # Charitably use a 2-minute window.
-            trajectory = trajectories.animalTrajectories[v.tag_id]
-            actual = trajectory.get_locations_between(
-                v.timestamp - 30, v.timestamp + 90
-            )
-            
-            ok = v.chamber in actual
-            
-            rows.append(ValidationRow(
-                bin_number=bin.bin_number,
-                bin_start=b_start,
-                bin_end=b_end,
-                bin_duration=b_end - b_start,
-                correct=ok,
+    (before, after) = tolerance
+
+    # Score each point once, in a single pass over each animal's dwells.
+    observed: List[List[str]] = [[] for _ in relevant_validations]
+    indexes_per_animal: Dict[TagID, List[int]] = {}
+    for (i, v) in enumerate(relevant_validations):
+        indexes_per_animal.setdefault(v.tag_id, []).append(i)
+    for (tag_id, indexes) in indexes_per_animal.items():
+        indexes.sort(key=lambda i: relevant_validations[i].timestamp)
+        locations = trajectories.get_locations_around(
+            tag_id, [relevant_validations[i].timestamp for i in indexes], before, after
+        )
+        for (i, actual) in zip(indexes, locations):
+            observed[i] = actual
+
+    for (bin, indexes) in events_per_bin([v.timestamp for v in relevant_validations], bins):
+        header = BinHeader.of(bin)
+        for i in indexes:
+            v = relevant_validations[i]
+            yield ValidationRow(
+                bin=header,
+                correct=v.chamber in observed[i],
                 timestamp=v.timestamp,
                 animal_name=tag_id_to_name[v.tag_id],
                 expected_chamber=v.chamber,
-                observed_chambers=actual
-            ))
+                observed_chambers=observed[i]
+            )
 
     logging.debug(f"PROFILING: compute_validation took {time.perf_counter() - t0:.3f} seconds")
-    return rows
 
-def write_validation(rows: List[ValidationRow], out_dir: str, exp_name: str, habitat_name: HabitatName) -> None:
-    logging.info(f"\nValidation ({habitat_name}):")
-    logging.info("-----------------------------")
+def write_validation(
+    rows: Iterable[ValidationRow],
+    out_dir: str,
+    exp_name: str,
+    habitat_name: HabitatName,
+    output_format: str = "csv",
+    compression: Optional[str] = None,
+) -> None:
+    """Write the validation table, and log the accuracy (see
+    log_validation_accuracy).
 
-    if rows:
-        correct_count = sum(1 for row in rows if row.correct)
-        total_count = len(rows)
-        percentage = correct_count / total_count
-    else:
-        correct_count = 0
-        total_count = 0
-        percentage = 0.0
+    With output_format "columnar", the table is written as a columnar file (see
+    voletron.output.columnar), with Timestamp in epoch seconds and Observed as
+    the space-separated sorted chambers.
+    """
+    counts: Dict[int, List[int]] = {}
+    rows = count_validation(rows, counts)
 
-    with open(os.path.join(out_dir, exp_name + ".validate.csv"), "w") as f:
-        f.write("bin_number,bin_start,bin_end,bin_duration,Correct,Timestamp,AnimalName,Expected,Observed\n")
-        
+    if output_format == "columnar":
+        table = ColumnTable(BIN_COLUMNS + [
+            ("Correct", BOOL),
+            ("Timestamp", FLOAT),
+            ("AnimalName", STR),
+            ("Expected", STR),
+            ("Observed", STR),
+        ])
         for row in rows:
-            f.write("{},{:.0f},{:.0f},{:.0f},{},{},{},{},{}\n".format(
-                row.bin_number,
-                row.bin_start,
-                row.bin_end,
-                row.bin_duration,
+            table.append(bin_values(row) + (
                 row.correct,
-                format_time(row.timestamp),
+                row.timestamp,
                 row.animal_name,
                 row.expected_chamber,
-                row.observed_chambers
+                " ".join(sorted(row.observed_chambers)),
             ))
+        write_columnar(table, out_dir, exp_name + ".validate")
+    else:
+        format_fields = "{},{},{},{},{}".format
+        with CsvTable(
+            os.path.join(out_dir, exp_name + ".validate.csv"),
+            "Correct,Timestamp,AnimalName,Expected,Observed",
+            compression,
+        ) as table:
+            for row in rows:
+                table.add(row.bin, format_fields(
+                    row.correct,
+                    format_time(row.timestamp),
+                    row.animal_name,
+                    row.expected_chamber,
+                    row.observed_chambers
+                ))
+
+    log_validation_accuracy(habitat_name, counts)
+
+
+def count_validation(rows: Iterable[ValidationRow], counts: Dict[int, List[int]]) -> Iterator[ValidationRow]:
+    """Pass the rows through, tallying [correct, total] validation points in
+    `counts` by bin number."""
+    for row in rows:
+        tally = counts.get(row.bin_number)
+        if tally is None:
+            tally = counts[row.bin_number] = [0, 0]
+        tally[0] += row.correct
+        tally[1] += 1
+        yield row
+
 
+def log_validation_accuracy(habitat_name: HabitatName, counts: Dict[int, List[int]]) -> None:
+    """Log the accuracy over the whole analysis (bin 0), and, at debug level,
+    in each bin, given the tallies of count_validation."""
+    logging.info(f"\nValidation ({habitat_name}):")
+    logging.info("-----------------------------")
+    (correct_count, total_count) = counts.get(0, (0, 0))
     if total_count > 0:
+        percentage = correct_count / total_count
         logging.info(
-            "{} of {} ({:>6.2%}) validation points correct (across all bins).".format(
+            "{} of {} ({:>6.2%}) validation points correct (whole analysis).".format(
                 correct_count, total_count, percentage
             )
         )
-
+    for (bin_number, (correct_count, total_count)) in sorted(counts.items()):
+        if bin_number > 0:
+            logging.debug(
+                "Bin {}: {} of {} ({:>6.2%}) validation points correct.".format(
+                    bin_number, correct_count, total_count, correct_count / total_count
+                )
+            )
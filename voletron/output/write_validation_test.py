@@ -5,7 +5,7 @@ from unittest.mock import MagicMock
 from voletron.output.write_validation import compute_validation, write_validation
 from voletron.types import Validation, TagID, AnimalName, ChamberName, AnimalConfig, TimestampSeconds
 from voletron.trajectory import AllAnimalTrajectories
-from voletron.output.types import ValidationRow, OutputBin
+from voletron.output.types import BinHeader, ValidationRow, OutputBin
 
 class TestWriteValidation(unittest.TestCase):
     def test_compute_validation(self):
@@ -13,28 +13,10 @@ class TestWriteValidation(unittest.TestCase):
         tag_id_to_name = {TagID("tag1"): AnimalName("animal1")}
         
         mock_trajectories = MagicMock(spec=AllAnimalTrajectories)
-        # Mock get_locations_between
-        # It takes tag_id, start, end.
-        # We need it to return a set of chamber names.
-        
-        def get_locations_side_effect(tag_id, start, end):
-            # Let's say at approx time 5 (range -25 to 95), it is in "c1"
-            # at approx time 15 (range -15 to 105), it is in "c2"
-            if start <= 5 <= end or start <= 15 <= end:
-                 # It's crude but if query covers 5, return c1. If covers 15, return c2.
-                 # The call is always timestamp - 30 to timestamp + 90.
-                 # V1 timestamp 5: range -25 to 95. Covers 5 and 15 actually if we assume strict logic.
-                 pass
-            
-            # Simplified:
-            # V1 at 5 -> query -25 to 95. We return {"c1"}.
-            # V2 at 15 -> query -15 to 105. We return {"c1"} (incorrect) or {"c2"} (correct).
-            
-            # Let's rely on call args matching in a simple way or just static return if sufficient.
-            # But we have multiple calls.
-            return {"c1"}
-
-        mock_trajectories.get_locations_between.return_value = {"c1"}
+        # The animal is observed in "c1" around every validation point.
+        mock_trajectories.get_locations_around.side_effect = (
+            lambda tag_id, times, before, after: [["c1"] for _ in times]
+        )
         
         validations = [
             Validation(TimestampSeconds(5), TagID("tag1"), ChamberName("c1")), # Correct
@@ -49,7 +31,7 @@ class TestWriteValidation(unittest.TestCase):
             OutputBin(bin_number=0, bin_start=TimestampSeconds(0), bin_end=TimestampSeconds(20), analyzer=MagicMock())
         ]
 
-        rows = compute_validation(tag_ids, mock_trajectories, tag_id_to_name, validations, bins)
+        rows = list(compute_validation(tag_ids, mock_trajectories, tag_id_to_name, validations, bins))
 
         self.assertEqual(len(rows), 4)
         
@@ -72,16 +54,19 @@ class TestWriteValidation(unittest.TestCase):
         self.assertEqual(len(r3_list), 2)
         self.assertEqual(r3_list[0].bin_duration, 20.0)
 
+        # Each animal's points are scored together, in order of time.
+        mock_trajectories.get_locations_around.assert_called_once_with(TagID("tag1"), [5, 15], 30, 90)
+
+        list(compute_validation(tag_ids, mock_trajectories, tag_id_to_name, validations, bins, (5, 10)))
+        mock_trajectories.get_locations_around.assert_called_with(TagID("tag1"), [5, 15], 5, 10)
+
     def test_write_validation(self):
         out_dir = tempfile.mkdtemp()
         exp_name = "test_exp"
         
         rows = [
              ValidationRow(
-                bin_number=0,
-                bin_start=TimestampSeconds(0),
-                bin_end=TimestampSeconds(100),
-                bin_duration=100.0,
+                bin=BinHeader(0, TimestampSeconds(0), TimestampSeconds(100), 100.0),
                 correct=True,
                 timestamp=TimestampSeconds(50),
                 animal_name="a1",
@@ -0,0 +1,244 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Pairwise cohabitation totals.
+
+A PairMatrix holds, for one time span, the number of co-dwells and the total
+seconds that each pair of animals spent together (in the "inclusive" sense: an
+A+B+C co-dwell counts towards A+B, A+C and B+C).  Only the cells (i, j) with
+i < j are stored, numbered row-major through that upper triangle, so a
+co-dwell is added with one increment per contained pair, and a pair's totals
+are read out by direct indexing.
+
+Nothing is allocated for a matrix until its first co-dwell.  The totals are
+then kept in dicts of the cells in use, and move to flat typed arrays once
+more than DENSE_FRACTION of the cells are in use: most time bins see only a
+few of the possible pairs.
+"""
+
+from array import array
+from bisect import bisect_right
+from functools import lru_cache
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+from voletron.tag_index import TagIndex, pair_indexes
+from voletron.types import ChamberName, DurationSeconds, GroupDwellAggregate, GroupMask
+
+# The fraction of cells in use above which a matrix is stored densely.  A dict
+# entry costs roughly ten times the 16 bytes of a dense cell.
+DENSE_FRACTION = 0.1
+
+
+@lru_cache(maxsize=None)
+def _row_starts(size: int) -> List[int]:
+    """The offset of cell (i, i + 1) for each row i of a size x size triangle."""
+    starts = []
+    offset = 0
+    for index_a in range(size):
+        starts.append(offset)
+        offset += size - index_a - 1
+    return starts
+
+
+def group_cells(size: int, group: GroupMask) -> List[int]:
+    """The cells of every pair in the given group, in a size x size triangle."""
+    starts = _row_starts(size)
+    return [starts[index_a] + index_b - index_a - 1 for (index_a, index_b) in pair_indexes(group)]
+
+
+@lru_cache(maxsize=None)
+def cell_pairs(size: int) -> List[Tuple[int, int]]:
+    """The animal indexes (i, j), with i < j, of each cell of a size x size
+    triangle, in cell order."""
+    return [(index_a, index_b) for index_a in range(size) for index_b in range(index_a + 1, size)]
+
+
+class PairMatrix:
+    """An (animals x animals) matrix of pairwise co-dwell counts and seconds.
+
+    Lookups are symmetric.
+    """
+
+    def __init__(self, tag_index: TagIndex):
+        self.tag_index = tag_index
+        self.size = len(tag_index)
+        self.cells = self.size * (self.size - 1) // 2
+        # None until the first co-dwell; then cell -> total, either in dicts
+        # or in arrays indexed by cell.
+        self.counts: Optional[Union[Dict[int, int], array]] = None
+        self.seconds: Optional[Union[Dict[int, float], array]] = None
+
+    def offsets(self, group: GroupMask) -> List[int]:
+        """The cells of every pair in the given group.
+
+        Callers adding many co-dwells of the same group should reuse these.
+        """
+        return group_cells(self.size, group)
+
+    def _is_dense(self) -> bool:
+        return isinstance(self.counts, array)
+
+    def _reserve(self) -> None:
+        """Make sure there is storage to add to."""
+        if self.counts is None:
+            self.counts = {}
+            self.seconds = {}
+
+    def _check_density(self) -> None:
+        """Move to dense storage once enough cells are in use."""
+        counts = self.counts
+        if isinstance(counts, dict) and len(counts) > self.cells * DENSE_FRACTION:
+            dense_counts = array("q", bytes(8 * self.cells))
+            dense_seconds = array("d", bytes(8 * self.cells))
+            for (offset, count) in counts.items():
+                dense_counts[offset] = count
+                dense_seconds[offset] = self.seconds[offset]
+            self.counts = dense_counts
+            self.seconds = dense_seconds
+
+    def used_cells(self) -> Iterator[Tuple[int, int, float]]:
+        """(cell, count, seconds) of every cell with co-dwells, in cell order
+        (see cell_pairs)."""
+        counts = self.counts
+        seconds = self.seconds
+        if counts is None:
+            return
+        if self._is_dense():
+            for (offset, count) in enumerate(counts):
+                if count:
+                    yield (offset, count, seconds[offset])
+        else:
+            for offset in sorted(counts):
+                count = counts[offset]
+                if count:
+                    yield (offset, count, seconds[offset])
+
+    def add(self, offsets: Sequence[int], duration: float) -> None:
+        """Add one co-dwell, covering the given cells, of the given duration."""
+        if not offsets:
+            return
+        self._reserve()
+        counts = self.counts
+        seconds = self.seconds
+        if self._is_dense():
+            for offset in offsets:
+                counts[offset] += 1
+                seconds[offset] += duration
+        else:
+            for offset in offsets:
+                counts[offset] = counts.get(offset, 0) + 1
+                seconds[offset] = seconds.get(offset, 0.0) + duration
+            self._check_density()
+
+    def add_counts(self, offsets: Sequence[int], count: int) -> None:
+        """Adjust the co-dwell counts of the given cells, leaving the seconds."""
+        if not offsets:
+            return
+        self._reserve()
+        counts = self.counts
+        seconds = self.seconds
+        if self._is_dense():
+            for offset in offsets:
+                counts[offset] += count
+        else:
+            for offset in offsets:
+                counts[offset] = counts.get(offset, 0) + count
+                seconds.setdefault(offset, 0.0)
+            self._check_density()
+
+    def add_matrix(self, other: "PairMatrix") -> None:
+        """Add the totals of another matrix over the same animals."""
+        if other.counts is None:
+            return
+        self._reserve()
+        counts = self.counts
+        seconds = self.seconds
+        if self._is_dense():
+            for (offset, count, other_seconds) in other.used_cells():
+                counts[offset] += count
+                seconds[offset] += other_seconds
+        else:
+            for (offset, count, other_seconds) in other.used_cells():
+                counts[offset] = counts.get(offset, 0) + count
+                seconds[offset] = seconds.get(offset, 0.0) + other_seconds
+            self._check_density()
+
+    def subtract_matrix(self, other: "PairMatrix") -> None:
+        """Remove the totals of another matrix, previously added to this one.
+
+        Cells left with no co-dwells are reset to exactly zero seconds, so that
+        rounding errors do not accumulate.
+        """
+        if other.counts is None:
+            return
+        self._reserve()
+        counts = self.counts
+        seconds = self.seconds
+        dense = self._is_dense()
+        for (offset, count, other_seconds) in other.used_cells():
+            remaining = (counts[offset] if dense else counts.get(offset, 0)) - count
+            if remaining:
+                counts[offset] = remaining
+                seconds[offset] = (seconds[offset] if dense else seconds.get(offset, 0.0)) - other_seconds
+            elif dense:
+                counts[offset] = 0
+                seconds[offset] = 0.0
+            else:
+                counts.pop(offset, None)
+                seconds.pop(offset, None)
+
+    def copy(self) -> "PairMatrix":
+        result = PairMatrix(self.tag_index)
+        if self._is_dense():
+            result.counts = array("q", self.counts)
+            result.seconds = array("d", self.seconds)
+        elif self.counts is not None:
+            result.counts = dict(self.counts)
+            result.seconds = dict(self.seconds)
+        return result
+
+    def _offset(self, index_a: int, index_b: int) -> int:
+        if index_a > index_b:
+            (index_a, index_b) = (index_b, index_a)
+        return _row_starts(self.size)[index_a] + index_b - index_a - 1
+
+    def count(self, index_a: int, index_b: int) -> int:
+        if self.counts is None:
+            return 0
+        offset = self._offset(index_a, index_b)
+        if self._is_dense():
+            return self.counts[offset]
+        return self.counts.get(offset, 0)
+
+    def duration(self, index_a: int, index_b: int) -> DurationSeconds:
+        if self.seconds is None:
+            return DurationSeconds(0.0)
+        offset = self._offset(index_a, index_b)
+        if self._is_dense():
+            return DurationSeconds(self.seconds[offset])
+        return DurationSeconds(self.seconds.get(offset, 0.0))
+
+    def aggregates(self) -> Iterator[GroupDwellAggregate]:
+        """One aggregate per pair that shared at least one co-dwell."""
+        tag_ids = self.tag_index.tag_ids
+        starts = _row_starts(self.size)
+        for (offset, count, seconds) in self.used_cells():
+            index_a = bisect_right(starts, offset) - 1
+            index_b = offset - starts[index_a] + index_a + 1
+            yield GroupDwellAggregate(
+                tag_ids=[tag_ids[index_a], tag_ids[index_b]],
+                chamber=ChamberName("All"),
+                count=count,
+                duration_seconds=DurationSeconds(seconds),
+            )
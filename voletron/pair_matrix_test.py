@@ -0,0 +1,113 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+
+from voletron.pair_matrix import PairMatrix
+from voletron.tag_index import TagIndex
+from voletron.types import GroupDwellAggregate, TagID
+
+tag_index = TagIndex([TagID("a"), TagID("b"), TagID("c")])
+
+
+class TestPairMatrix(unittest.TestCase):
+    def test_add(self):
+        matrix = PairMatrix(tag_index)
+        abc = matrix.offsets(tag_index.mask([TagID("a"), TagID("b"), TagID("c")]))
+        ab = matrix.offsets(tag_index.mask([TagID("a"), TagID("b")]))
+        solo = matrix.offsets(tag_index.mask([TagID("c")]))
+        self.assertEqual(solo, [])
+
+        matrix.add(abc, 100.0)
+        matrix.add(ab, 50.0)
+        matrix.add(solo, 10.0)
+
+        self.assertEqual(matrix.count(0, 1), 2)
+        self.assertEqual(matrix.duration(0, 1), 150.0)
+        # Lookups are symmetric.
+        self.assertEqual(matrix.count(2, 1), 1)
+        self.assertEqual(matrix.duration(2, 0), 100.0)
+
+    def test_add_matrix_and_counts(self):
+        ab = tag_index.mask([TagID("a"), TagID("b")])
+        first = PairMatrix(tag_index)
+        first.add(first.offsets(ab), 20.0)
+        second = PairMatrix(tag_index)
+        second.add(second.offsets(ab), 5.0)
+
+        first.add_matrix(second)
+        first.add_counts(first.offsets(ab), -1)
+        self.assertEqual(first.count(0, 1), 1)
+        self.assertEqual(first.duration(0, 1), 25.0)
+
+    def test_aggregates(self):
+        matrix = PairMatrix(tag_index)
+        matrix.add(matrix.offsets(tag_index.mask([TagID("b"), TagID("c")])), 10.0)
+        matrix.add(matrix.offsets(tag_index.mask([TagID("a"), TagID("b")])), 20.0)
+        self.assertEqual(
+            list(matrix.aggregates()),
+            [
+                GroupDwellAggregate(["a", "b"], "All", 1, 20.0),
+                GroupDwellAggregate(["b", "c"], "All", 1, 10.0),
+            ],
+        )
+
+    def test_lazy_and_sparse(self):
+        large_index = TagIndex([TagID("t{:02d}".format(n)) for n in range(20)])
+        matrix = PairMatrix(large_index)
+        self.assertIsNone(matrix.counts)
+        self.assertEqual(matrix.count(3, 4), 0)
+        self.assertEqual(list(matrix.aggregates()), [])
+
+        last = large_index.mask([TagID("t18"), TagID("t19")])
+        first = large_index.mask([TagID("t00"), TagID("t01")])
+        matrix.add(matrix.offsets(last), 10.0)
+        matrix.add(matrix.offsets(first), 20.0)
+        self.assertIsInstance(matrix.counts, dict)
+        self.assertEqual(matrix.duration(19, 18), 10.0)
+        self.assertEqual(
+            list(matrix.aggregates()),
+            [
+                GroupDwellAggregate(["t00", "t01"], "All", 1, 20.0),
+                GroupDwellAggregate(["t18", "t19"], "All", 1, 10.0),
+            ],
+        )
+
+        everyone = PairMatrix(large_index)
+        everyone.add(everyone.offsets(large_index.mask(large_index.tag_ids)), 1.0)
+        self.assertNotIsInstance(everyone.counts, dict)
+        everyone.add_matrix(matrix)
+        self.assertEqual((everyone.count(0, 1), everyone.duration(0, 1)), (2, 21.0))
+        self.assertEqual((everyone.count(18, 19), everyone.duration(18, 19)), (2, 11.0))
+        everyone.subtract_matrix(matrix)
+        self.assertEqual((everyone.count(0, 1), everyone.duration(0, 1)), (1, 1.0))
+        self.assertEqual(len(list(everyone.aggregates())), 190)
+
+    def test_subtract_sparse(self):
+        large_index = TagIndex([TagID("t{:02d}".format(n)) for n in range(20)])
+        pair = large_index.mask([TagID("t05"), TagID("t07")])
+        running = PairMatrix(large_index)
+        added = PairMatrix(large_index)
+        added.add(added.offsets(pair), 0.1)
+        running.add(running.offsets(pair), 0.2)
+        running.add_matrix(added)
+        running.subtract_matrix(added)
+        self.assertEqual((running.count(5, 7), running.duration(5, 7)), (1, 0.2 + 0.1 - 0.1))
+        running.subtract_matrix(running.copy())
+        self.assertEqual((running.count(5, 7), running.duration(5, 7)), (0, 0.0))
+        self.assertEqual(running.counts, {})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,96 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Query a cohabitation index (written by `voletron --cohab_index`) for the
+pair cohabitation or group-size totals of an arbitrary time window, without
+re-running the analysis."""
+
+import argparse
+import datetime
+import sys
+
+import pytz
+
+from voletron.cohab_index import CohabIndex
+from voletron.types import TimestampSeconds
+
+
+def _parse_args(argv):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "index",
+        help="A `*.cohab_index` file, as written to a habitat output directory "
+        "by `voletron --cohab_index`.",
+    )
+    parser.add_argument(
+        "--start",
+        required=True,
+        help="Start of the window, in the form `DD.MM.YYYY HH:MM:SS:fff`.",
+    )
+    parser.add_argument(
+        "--end",
+        required=True,
+        help="End of the window, in the form `DD.MM.YYYY HH:MM:SS:fff`.",
+    )
+    parser.add_argument(
+        "--timezone",
+        default="US/Pacific",
+        help="The timezone in which --start and --end are given.  Defaults to 'US/Pacific'.",
+    )
+    parser.add_argument(
+        "--table",
+        choices=["pairs", "group_sizes"],
+        default="pairs",
+        help="Which totals to report: pairwise cohabitation seconds, or seconds "
+        "per animal in groups of each size.  Default: pairs",
+    )
+    return parser.parse_args(argv[1:])
+
+
+def _parse_time(value: str, timezone: datetime.tzinfo) -> TimestampSeconds:
+    return TimestampSeconds(timezone.localize(datetime.datetime.strptime(
+        value, "%d.%m.%Y %H:%M:%S:%f"
+    )).timestamp())
+
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv
+    args = _parse_args(argv)
+    timezone = pytz.timezone(args.timezone)
+    start = _parse_time(args.start, timezone)
+    end = _parse_time(args.end, timezone)
+    if end < start:
+        raise ValueError("The window must not end before it starts.")
+
+    index = CohabIndex.load(args.index)
+    names = index.tag_id_to_name
+    out = sys.stdout
+    if args.table == "pairs":
+        out.write("Animal A,Animal B,seconds\n")
+        for ((tag_a, tag_b), seconds) in index.pair_seconds(start, end).items():
+            (name_a, name_b) = sorted([names[tag_a], names[tag_b]])
+            out.write("{},{},{:.0f}\n".format(name_a, name_b, seconds))
+    else:
+        out.write("animal,{}\n".format(",".join(str(size) for size in range(1, index.max_group_size + 1))))
+        size_seconds = index.group_size_seconds(start, end)
+        for tag_id in sorted(size_seconds, key=names.__getitem__):
+            out.write("{},{}\n".format(
+                names[tag_id],
+                ",".join("{:.0f}".format(seconds) for seconds in size_seconds[tag_id][1:]),
+            ))
+
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -0,0 +1,49 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import io
+import os
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from datetime import datetime
+
+import pytz
+
+from voletron.co_dwell_store import CoDwellStore
+from voletron.cohab_index import CohabIndex
+from voletron.query import main
+from voletron.tag_index import TagIndex
+from voletron.types import AnimalName, CoDwell, TagID, ChamberName, TimestampSeconds
+
+
+class TestQuery(unittest.TestCase):
+    def test_pairs(self):
+        tag_id_to_name = {TagID("a"): AnimalName("A"), TagID("b"): AnimalName("B")}
+        tag_index = TagIndex(tag_id_to_name.keys())
+        t0 = pytz.timezone("US/Pacific").localize(datetime(2022, 1, 1, 12)).timestamp()
+        store = CoDwellStore.from_co_dwells(tag_index, [
+            CoDwell(tag_index.mask([TagID("a"), TagID("b")]), TimestampSeconds(t0 + 60), TimestampSeconds(t0 + 600), ChamberName("c1")),
+        ])
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "test.cohab_index")
+            CohabIndex.build(store, tag_id_to_name).save(path)
+            out = io.StringIO()
+            with redirect_stdout(out):
+                main(["voletron-query", path, "--start", "01.01.2022 12:00:00:000", "--end", "01.01.2022 12:05:00:000"])
+        self.assertEqual(out.getvalue(), "Animal A,Animal B,seconds\nA,B,240\n")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,77 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Compact representation of groups of animals as integer bitmasks.
+
+Each animal is assigned a bit position by a TagIndex, so that a group of
+animals is a GroupMask: an arbitrary-precision int with one bit set per member.
+Set operations on groups (arrival, departure, membership, hashing) are then
+plain integer operations, and a group costs a single int rather than a list or
+frozenset of tag IDs.
+"""
+
+from typing import Dict, Iterable, List, Tuple
+
+from voletron.types import GroupMask, TagID
+
+
+class TagIndex:
+    """Assigns each animal a bit position, in lexicographic order of tag ID.
+
+    Because bit order matches tag ID order, the members of a group (and the
+    pairs within it) are produced in sorted order.
+    """
+
+    def __init__(self, tag_ids: Iterable[TagID]):
+        self.tag_ids: List[TagID] = sorted(set(tag_ids))
+        self._index: Dict[TagID, int] = {tag_id: i for (i, tag_id) in enumerate(self.tag_ids)}
+
+    def __len__(self) -> int:
+        return len(self.tag_ids)
+
+    def index(self, tag_id: TagID) -> int:
+        return self._index[tag_id]
+
+    def bit(self, tag_id: TagID) -> GroupMask:
+        return GroupMask(1 << self._index[tag_id])
+
+    def mask(self, tag_ids: Iterable[TagID]) -> GroupMask:
+        result = 0
+        for tag_id in tag_ids:
+            result |= 1 << self._index[tag_id]
+        return GroupMask(result)
+
+    def members(self, mask: GroupMask) -> List[TagID]:
+        """The tag IDs in the given group, in sorted order."""
+        return [self.tag_ids[i] for i in bit_indexes(mask)]
+
+
+def bit_indexes(mask: GroupMask) -> List[int]:
+    """The positions of the set bits in `mask`, in increasing order."""
+    result = []
+    while mask:
+        low = mask & -mask
+        result.append(low.bit_length() - 1)
+        mask ^= low
+    return result
+
+
+def group_size(mask: GroupMask) -> int:
+    return bin(mask).count("1")
+
+
+def pair_indexes(mask: GroupMask) -> List[Tuple[int, int]]:
+    """All pairs (i, j) of set bit positions in `mask`, with i < j."""
+    indexes = bit_indexes(mask)
+    return [(a, b) for (n, a) in enumerate(indexes) for b in indexes[n + 1:]]
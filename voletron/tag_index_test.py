@@ -0,0 +1,60 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+
+from voletron.tag_index import TagIndex, bit_indexes, group_size, pair_indexes
+from voletron.types import GroupMask, TagID
+
+
+class TestTagIndex(unittest.TestCase):
+    def test_bits_follow_sorted_tag_ids(self):
+        index = TagIndex([TagID("tag_c"), TagID("tag_a"), TagID("tag_b")])
+        self.assertEqual(index.tag_ids, ["tag_a", "tag_b", "tag_c"])
+        self.assertEqual(len(index), 3)
+        self.assertEqual(index.bit(TagID("tag_a")), 0b001)
+        self.assertEqual(index.bit(TagID("tag_c")), 0b100)
+        self.assertEqual(index.index(TagID("tag_b")), 1)
+
+    def test_mask_and_members(self):
+        index = TagIndex([TagID("tag_a"), TagID("tag_b"), TagID("tag_c")])
+        mask = index.mask([TagID("tag_c"), TagID("tag_a")])
+        self.assertEqual(mask, 0b101)
+        self.assertEqual(index.members(mask), ["tag_a", "tag_c"])
+        self.assertEqual(index.members(GroupMask(0)), [])
+
+    def test_many_animals(self):
+        # Masks are arbitrary-precision, so groups may exceed 64 animals.
+        index = TagIndex([TagID("tag_{:03d}".format(i)) for i in range(100)])
+        mask = index.mask([TagID("tag_000"), TagID("tag_099")])
+        self.assertEqual(mask, (1 << 99) | 1)
+        self.assertEqual(index.members(mask), ["tag_000", "tag_099"])
+
+
+class TestBitHelpers(unittest.TestCase):
+    def test_bit_indexes(self):
+        self.assertEqual(bit_indexes(GroupMask(0)), [])
+        self.assertEqual(bit_indexes(GroupMask(0b10110)), [1, 2, 4])
+
+    def test_group_size(self):
+        self.assertEqual(group_size(GroupMask(0)), 0)
+        self.assertEqual(group_size(GroupMask(0b10110)), 3)
+
+    def test_pair_indexes(self):
+        self.assertEqual(pair_indexes(GroupMask(0b1)), [])
+        self.assertEqual(pair_indexes(GroupMask(0b111)), [(0, 1), (0, 2), (1, 2)])
+
+
+if __name__ == "__main__":
+    unittest.main()
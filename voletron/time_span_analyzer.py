@@ -13,58 +13,81 @@
 # limitations under the License.
 
 
-from typing import Dict, Optional
-
 from collections import defaultdict
-from typing import Dict, List
+from typing import Dict, Iterable, List, Optional
+from voletron.aggregates import GroupChamberAggregates, SharedAggregates
+from voletron.co_dwell_store import CoDwellStore
+from voletron.pair_matrix import PairMatrix
 from voletron.util import seconds_between_timestamps
-from voletron.types import ChamberName, CoDwell, DurationSeconds, GroupDwellAggregate, GroupID, TagID, TimestampSeconds
+from voletron.types import GroupDwellAggregate, TimestampSeconds
 
 
 class TimeSpanAnalyzer:
     def __init__(
         self,
-        co_dwells: List[CoDwell],
+        co_dwells: CoDwellStore,
         analysis_start_time: TimestampSeconds,
         analysis_end_time: TimestampSeconds,
+        indexes: Optional[Iterable[int]] = None,
     ):
+        """
+        Args:
+            co_dwells: All co-dwells of the experiment.
+            indexes: If given, only the co-dwells at these positions in
+                `co_dwells` are considered (e.g., those known to overlap the
+                analysis interval).
+        """
         # Note that the input CoDwells are "exclusive", i.e. an A+B+C CoDwell is
         # not also represented as an A+B CoDwell.
 
+        self.tag_index = co_dwells.tag_index
         self.analysis_start_time = analysis_start_time
         self.analysis_end_time = analysis_end_time
         self.duration = analysis_end_time - analysis_start_time
 
         # restrict to the analysis time interval
-        restricted_dwells = []
-        for d in co_dwells:
-             rd = _restrict_co_dwell(d, analysis_start_time, analysis_end_time)
-             if rd:
-                 restricted_dwells.append(rd)
-        self.co_dwells = restricted_dwells
+        self.co_dwells = co_dwells.restricted(analysis_start_time, analysis_end_time, indexes)
+        # The group aggregates can be shared by the output tables reading them
+        # (see hold_group_chamber_aggregates).
+        self._group_chamber_aggregates = SharedAggregates()
+
+    def hold_group_chamber_aggregates(self) -> None:
+        """Compute the group aggregates once for all calls to
+        get_group_chamber_exclusive_durations, until released."""
+        self._group_chamber_aggregates.hold()
 
-    def get_group_chamber_exclusive_durations(self) -> List[GroupDwellAggregate]:
+    def release_group_chamber_aggregates(self) -> None:
+        self._group_chamber_aggregates.release()
+
+    def get_group_chamber_exclusive_durations(self) -> GroupChamberAggregates:
         """Outputs dwell statistics for each group of animals in the "exclusive"
         sense, meaning that an A+B+C group dwell is *not* counted towards A+B,
         B+C, and A+C."""
-        dwells_by_group_and_chamber: Dict[GroupID, Dict[ChamberName, list[CoDwell]]] = defaultdict(lambda: defaultdict(list))
-        for d in self.co_dwells:
-            group_id : GroupID = GroupID(frozenset(d.tag_ids))
-            dwells_by_group_and_chamber[group_id][d.chamber].append(d)
-
-        result = []
-        for (group_id, chamber_dwells) in dwells_by_group_and_chamber.items():
-            for (chamber, dwells) in chamber_dwells.items():
-                result.append(
-                    GroupDwellAggregate(
-                        tag_ids=list(group_id),
-                        chamber=chamber,
-                        count=len(dwells),
-                        duration_seconds=_durations_sum_seconds(dwells),
-                    )
-                )
-
-        return result
+        return self._group_chamber_aggregates.get(self._compute_group_chamber_exclusive_durations)
+
+    def _compute_group_chamber_exclusive_durations(self) -> GroupChamberAggregates:
+        store = self.co_dwells
+        # group code -> chamber code -> [count, duration]
+        totals_by_group_and_chamber: Dict[int, Dict[int, List]] = defaultdict(dict)
+        for i in range(len(store)):
+            chamber_totals = totals_by_group_and_chamber[store.group_codes[i]]
+            chamber_code = store.chamber_codes[i]
+            totals = chamber_totals.get(chamber_code)
+            if totals is None:
+                totals = chamber_totals[chamber_code] = [0, 0.0]
+            totals[0] += 1
+            totals[1] += seconds_between_timestamps(store.starts[i], store.ends[i])
+
+        return GroupChamberAggregates(
+            self.tag_index,
+            {
+                store.groups[group_code]: {
+                    store.chambers[chamber_code]: totals
+                    for (chamber_code, totals) in chamber_totals.items()
+                }
+                for (group_code, chamber_totals) in totals_by_group_and_chamber.items()
+            },
+        )
 
     def get_pair_inclusive_stats(
         self,
@@ -75,51 +98,19 @@ class TimeSpanAnalyzer:
         
         This aggregates over chambers.
         """
-        dwells_by_pair : Dict[TagID, Dict[TagID, List[CoDwell]]] = defaultdict(lambda: defaultdict(list))
-        for d in self.co_dwells:
-            # tag_a < tag_b lexicographically
+        return list(self.get_pair_matrix().aggregates())
+
+    def get_pair_matrix(self) -> PairMatrix:
+        """Inclusive pair statistics (see get_pair_inclusive_stats), as a
+        matrix over all animals."""
+        store = self.co_dwells
+        matrix = PairMatrix(self.tag_index)
+        offsets_of_group: Dict[int, List[int]] = {}
+        for i in range(len(store)):
+            group_code = store.group_codes[i]
+            offsets = offsets_of_group.get(group_code)
+            if offsets is None:
+                offsets = offsets_of_group[group_code] = matrix.offsets(store.groups[group_code])
             # Note that a dwell of >2 animals gets added to each contained pair
-            for [tag_a, tag_b] in _all_pairs(d.tag_ids):
-                dwells_by_pair[tag_a][tag_b].append(d)
-
-        result = []
-        for (tag_a, tag_b_dwells) in dwells_by_pair.items():
-            for (tag_b, dwells) in tag_b_dwells.items():
-                result.append(
-                    GroupDwellAggregate(
-                        tag_ids=[tag_a, tag_b],
-                        chamber=ChamberName("All"),
-                        count=len(dwells),
-                        duration_seconds=_durations_sum_seconds(dwells),
-                    )
-                )
-
-        return result
-
-
-def _restrict_co_dwell(
-    codwell: CoDwell, analysis_start_time: TimestampSeconds, analysis_end_time: TimestampSeconds
-) -> Optional[CoDwell]:
-    """Limit co-dwells to the analysis start-end interval."""
-    if codwell.start >= analysis_start_time and codwell.end <= analysis_end_time:
-        return codwell
-    start = TimestampSeconds(max(codwell.start, analysis_start_time))
-    end = TimestampSeconds(min(codwell.end, analysis_end_time))
-    if end > start:
-        return CoDwell(codwell.tag_ids, start, end, codwell.chamber)
-    return None
-
-
-def _durations_sum_seconds(dwells: List[CoDwell]) -> DurationSeconds:
-    durations = [seconds_between_timestamps(cd.start, cd.end) for cd in dwells]
-    return DurationSeconds(sum(durations))
-
-
-# def _all_pairs(items: Iterable[T]) => List[Tuple[T, T]]:
-def _all_pairs(items):
-    result = []
-    for x in items:
-        for y in items:
-            if x < y:
-                result.append([x, y])
-    return result
\ No newline at end of file
+            matrix.add(offsets, seconds_between_timestamps(store.starts[i], store.ends[i]))
+        return matrix
@@ -13,50 +13,25 @@
 # limitations under the License.
 
 import unittest
-from voletron.time_span_analyzer import TimeSpanAnalyzer, _restrict_co_dwell
-from voletron.types import CoDwell, TagID, ChamberName, TimestampSeconds, GroupDwellAggregate, DurationSeconds
+from unittest import mock
+from voletron.co_dwell_store import CoDwellStore
+from voletron.tag_index import TagIndex
+from voletron.time_span_analyzer import TimeSpanAnalyzer
+from voletron.types import CoDwell, GroupMask, TagID, ChamberName, TimestampSeconds, GroupDwellAggregate, DurationSeconds
 
-class TestTimeSpanAnalyzer(unittest.TestCase):
-    def test_restrict_co_dwell_inside(self):
-        cd = CoDwell([TagID("a"), TagID("b")], TimestampSeconds(100), TimestampSeconds(200), ChamberName("c1"))
-        restricted = _restrict_co_dwell(cd, TimestampSeconds(50), TimestampSeconds(250))
-        self.assertEqual(restricted, cd)
-
-    def test_restrict_co_dwell_clipped(self):
-        cd = CoDwell([TagID("a"), TagID("b")], TimestampSeconds(100), TimestampSeconds(200), ChamberName("c1"))
-        restricted = _restrict_co_dwell(cd, TimestampSeconds(150), TimestampSeconds(180))
-        self.assertEqual(restricted.start, 150)
-        self.assertEqual(restricted.end, 180)
-
-    def test_restrict_co_dwell_clipped_start(self):
-        # Dwell starts before analysis window (50 < 100) but ends inside (150 < 200)
-        cd = CoDwell([TagID("a"), TagID("b")], TimestampSeconds(50), TimestampSeconds(150), ChamberName("c1"))
-        restricted = _restrict_co_dwell(cd, TimestampSeconds(100), TimestampSeconds(200))
-        self.assertEqual(restricted.start, 100)
-        self.assertEqual(restricted.end, 150)
-
-    def test_restrict_co_dwell_clipped_end(self):
-        # Dwell starts inside (150 > 100) but ends after analysis window (250 > 200)
-        cd = CoDwell([TagID("a"), TagID("b")], TimestampSeconds(150), TimestampSeconds(250), ChamberName("c1"))
-        restricted = _restrict_co_dwell(cd, TimestampSeconds(100), TimestampSeconds(200))
-        self.assertEqual(restricted.start, 150)
-        self.assertEqual(restricted.end, 200)
-
-    def test_restrict_co_dwell_outside(self):
-        cd = CoDwell([TagID("a"), TagID("b")], TimestampSeconds(100), TimestampSeconds(200), ChamberName("c1"))
-        restricted = _restrict_co_dwell(cd, TimestampSeconds(300), TimestampSeconds(400))
-        self.assertIsNone(restricted)
+tag_index = TagIndex([TagID("a"), TagID("b"), TagID("c")])
 
+class TestTimeSpanAnalyzer(unittest.TestCase):
     def test_get_group_chamber_exclusive_durations(self):
         # A+B in c1 for 100s
         # A+B in c1 for 50s
         # A+C in c2 for 10s
         co_dwells = [
-            CoDwell([TagID("a"), TagID("b")], TimestampSeconds(100), TimestampSeconds(200), ChamberName("c1")),
-            CoDwell([TagID("a"), TagID("b")], TimestampSeconds(300), TimestampSeconds(350), ChamberName("c1")),
-            CoDwell([TagID("a"), TagID("c")], TimestampSeconds(400), TimestampSeconds(410), ChamberName("c2")),
+            CoDwell(tag_index.mask([TagID("a"), TagID("b")]), TimestampSeconds(100), TimestampSeconds(200), ChamberName("c1")),
+            CoDwell(tag_index.mask([TagID("a"), TagID("b")]), TimestampSeconds(300), TimestampSeconds(350), ChamberName("c1")),
+            CoDwell(tag_index.mask([TagID("a"), TagID("c")]), TimestampSeconds(400), TimestampSeconds(410), ChamberName("c2")),
         ]
-        analyzer = TimeSpanAnalyzer(co_dwells, TimestampSeconds(0), TimestampSeconds(1000))
+        analyzer = TimeSpanAnalyzer(CoDwellStore.from_co_dwells(tag_index, co_dwells), TimestampSeconds(0), TimestampSeconds(1000))
         stats = analyzer.get_group_chamber_exclusive_durations()
         
         # We expect two aggregates: {a,b} in c1, and {a,c} in c2
@@ -76,9 +51,9 @@ class TestTimeSpanAnalyzer(unittest.TestCase):
         # A+B+C in c1 for 100s
         # This implies inclusive pairs: {A,B}, {B,C}, {A,C} all have 100s
         co_dwells = [
-            CoDwell([TagID("a"), TagID("b"), TagID("c")], TimestampSeconds(100), TimestampSeconds(200), ChamberName("c1")),
+            CoDwell(tag_index.mask([TagID("a"), TagID("b"), TagID("c")]), TimestampSeconds(100), TimestampSeconds(200), ChamberName("c1")),
         ]
-        analyzer = TimeSpanAnalyzer(co_dwells, TimestampSeconds(0), TimestampSeconds(1000))
+        analyzer = TimeSpanAnalyzer(CoDwellStore.from_co_dwells(tag_index, co_dwells), TimestampSeconds(0), TimestampSeconds(1000))
         stats = analyzer.get_pair_inclusive_stats()
 
         self.assertEqual(len(stats), 3)
@@ -90,5 +65,37 @@ class TestTimeSpanAnalyzer(unittest.TestCase):
         self.assertIn({"b", "c"}, pair_sets)
         self.assertIn({"a", "c"}, pair_sets)
 
+    def test_indexes_select_co_dwells(self):
+        co_dwells = [
+            CoDwell(tag_index.mask([TagID("a"), TagID("b")]), TimestampSeconds(100), TimestampSeconds(200), ChamberName("c1")),
+            CoDwell(tag_index.mask([TagID("a"), TagID("c")]), TimestampSeconds(150), TimestampSeconds(250), ChamberName("c2")),
+        ]
+        store = CoDwellStore.from_co_dwells(tag_index, co_dwells)
+        analyzer = TimeSpanAnalyzer(store, TimestampSeconds(0), TimestampSeconds(1000), indexes=[1])
+        stats = analyzer.get_group_chamber_exclusive_durations()
+
+        self.assertEqual(len(stats), 1)
+        self.assertEqual(stats[0].tag_ids, ["a", "c"])
+        self.assertEqual(stats[0].chamber, "c2")
+        self.assertEqual(stats[0].duration_seconds, 100.0)
+
+    def test_aggregates_computed_once_while_held(self):
+        co_dwells = [
+            CoDwell(tag_index.mask([TagID("a"), TagID("b")]), TimestampSeconds(100), TimestampSeconds(200), ChamberName("c1")),
+        ]
+        analyzer = TimeSpanAnalyzer(CoDwellStore.from_co_dwells(tag_index, co_dwells), TimestampSeconds(0), TimestampSeconds(1000))
+        # Three output tables read this bin's group aggregates.
+        analyzer.hold_group_chamber_aggregates()
+        with mock.patch.object(
+            analyzer, "_compute_group_chamber_exclusive_durations",
+            wraps=analyzer._compute_group_chamber_exclusive_durations,
+        ) as compute:
+            first = analyzer.get_group_chamber_exclusive_durations()
+            self.assertIs(analyzer.get_group_chamber_exclusive_durations(), first)
+            self.assertIs(analyzer.get_group_chamber_exclusive_durations(), first)
+            self.assertEqual(compute.call_count, 1)
+        analyzer.release_group_chamber_aggregates()
+        self.assertIsNone(analyzer._group_chamber_aggregates._aggregates)
+
 if __name__ == '__main__':
     unittest.main()
@@ -18,7 +18,12 @@ from bisect import bisect_right
 from collections import defaultdict
 from enum import Enum
 import heapq
-from typing import Dict, Generator, List, Iterator, Optional, Tuple
+import mmap
+import os
+import shutil
+import struct
+import tempfile
+from typing import Dict, Generator, List, Iterator, Optional, Sequence, Tuple
 
 from voletron.apparatus_config import all_antennae
 from voletron.constants import INFERRED_READ_EPSILON, LONG_DWELL_THRESHOLD_SECONDS
@@ -38,11 +43,19 @@ we may insert the inferred read substantially in the past--at a time that would
 already have been processed in a streaming approach.
 
 Thus, two passes are needed: one over the raw reads, and a second over the
-derived trajectories.  For now we simply hold the trajectories in memory to
-support the second pass.  Optionally they could be written to disk, and re-read
-for the next phase.
+derived trajectories.  By default we simply hold the trajectories in memory to
+support the second pass.  Optionally (see `spill_dir`) each animal's dwells are
+streamed to a compact binary file as they are built, and memory-mapped back for
+the next phase.
 """
 
+# Size in bytes of one spilled Dwell record; see _SpilledDwells.
+DWELL_RECORD_BYTES = struct.calcsize("<ddH")
+
+# The number of finished dwells each spilled trajectory buffers in memory
+# before appending them to its file (about 74 KB per animal).
+SPILL_BUFFER_RECORDS = 4096
+
 
 def short_dwell_chamber(antenna: Antenna):
     """Heuristic for which chamber an animal was likely in, given two
@@ -117,17 +130,166 @@ class ReadFate(Enum):
     TwoMissing = 4
 
 
+class _SpilledDwells:
+    """A list-like sequence of Dwells backed by a binary file on disk.
+
+    Each Dwell is stored as a fixed-size little-endian record (start and end as
+    doubles, plus a 16-bit index into a small in-memory table of chamber
+    names).  Finished records are buffered in memory, up to `buffer_records` of
+    them, and then appended to the file.  The most recent Dwell is held
+    separately, because _AnimalTrajectory may still extend it.
+
+    Once `close()` is called, the file is memory-mapped, so that reading the
+    dwells back (e.g. to produce Traversals) does not load them all into memory.
+    `remove()` unmaps and deletes the file once the dwells are no longer needed.
+    """
+
+    _RECORD = struct.Struct("<ddH")
+
+    def __init__(self, path: str, buffer_records: int):
+        self._path = path
+        self._file = open(path, "w+b")
+        self._buffer = bytearray()
+        self._buffer_records = max(1, buffer_records)
+        self._buffered = 0
+        self._flushed = 0
+        self._last: Optional[Dwell] = None
+        self._mmap: Optional[mmap.mmap] = None
+        self._chambers: List[ChamberName] = []
+        self._chamber_codes: Dict[ChamberName, int] = {}
+
+    def _chamber_code(self, chamber: ChamberName) -> int:
+        code = self._chamber_codes.get(chamber)
+        if code is None:
+            code = len(self._chambers)
+            self._chambers.append(chamber)
+            self._chamber_codes[chamber] = code
+        return code
+
+    def _unpack(self, buffer, offset: int) -> Dwell:
+        (start, end, code) = self._RECORD.unpack_from(buffer, offset)
+        return Dwell(start, end, self._chambers[code])
+
+    def _flush(self) -> None:
+        self._file.write(self._buffer)
+        self._flushed += self._buffered
+        self._buffer = bytearray()
+        self._buffered = 0
+
+    def append(self, dwell: Dwell) -> None:
+        if self._mmap is not None:
+            raise ValueError("Can't append to spilled dwells after close().")
+        if self._last is not None:
+            self._buffer += self._RECORD.pack(self._last.start, self._last.end, self._chamber_code(self._last.chamber))
+            self._buffered += 1
+            if self._buffered >= self._buffer_records:
+                self._flush()
+        self._last = dwell
+
+    def close(self) -> None:
+        """Write out all remaining dwells and memory-map the file for reading."""
+        if self._mmap is not None:
+            return
+        if self._last is not None:
+            self._buffer += self._RECORD.pack(self._last.start, self._last.end, self._chamber_code(self._last.chamber))
+            self._buffered += 1
+            self._last = None
+        self._flush()
+        self._file.close()
+        with open(self._path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def remove(self) -> None:
+        """Unmap and delete the file.  The dwells can't be read afterwards."""
+        if self._mmap is not None:
+            self._mmap.close()
+        self._file.close()
+        if os.path.exists(self._path):
+            os.remove(self._path)
+
+    def __len__(self) -> int:
+        return self._flushed + self._buffered + (1 if self._last is not None else 0)
+
+    def __getitem__(self, index: int) -> Dwell:
+        length = len(self)
+        if index < 0:
+            index += length
+        if index < 0 or index >= length:
+            raise IndexError("Dwell index out of range")
+        if self._mmap is not None:
+            return self._unpack(self._mmap, index * self._RECORD.size)
+        if index == length - 1 and self._last is not None:
+            return self._last
+        if index >= self._flushed:
+            return self._unpack(self._buffer, (index - self._flushed) * self._RECORD.size)
+        # Seek (which flushes the file's own write buffer) rather than
+        # os.pread, which Windows lacks; later appends go at the end again.
+        self._file.seek(index * self._RECORD.size)
+        record = self._file.read(self._RECORD.size)
+        self._file.seek(0, os.SEEK_END)
+        return self._unpack(record, 0)
+
+    def __setitem__(self, index: int, dwell: Dwell) -> None:
+        # Only the most recent Dwell may be replaced (i.e., extended).
+        if self._last is None or index not in (-1, len(self) - 1):
+            raise IndexError("Only the last spilled dwell can be replaced")
+        self._last = dwell
+
+    def __iter__(self) -> Iterator[Dwell]:
+        if self._mmap is not None:
+            for (start, end, code) in self._RECORD.iter_unpack(self._mmap):
+                yield Dwell(start, end, self._chambers[code])
+            return
+        for i in range(len(self)):
+            yield self[i]
+
+    def __eq__(self, other) -> bool:
+        return list(self) == list(other)
+
+
+class _SpilledDwellStarts:
+    """The start times of a _SpilledDwells, as a sequence suitable for bisect.
+
+    The start times are read from the dwells themselves, so `append` is a no-op.
+    """
+
+    def __init__(self, dwells: _SpilledDwells):
+        self._dwells = dwells
+
+    def append(self, start: TimestampSeconds) -> None:
+        pass
+
+    def __len__(self) -> int:
+        return len(self._dwells)
+
+    def __getitem__(self, index: int) -> TimestampSeconds:
+        return self._dwells[index].start
+
+
 class _AnimalTrajectory:
     """Tracks the path of a single animal through the apparatus over time."""
 
-    def __init__(self, tag_id: TagID, initial_chamber: ChamberName, start_time: TimestampSeconds, dwell_threshold: float):
+    def __init__(
+        self,
+        tag_id: TagID,
+        initial_chamber: ChamberName,
+        start_time: TimestampSeconds,
+        dwell_threshold: float,
+        spill_path: Optional[str] = None,
+        spill_buffer_records: int = SPILL_BUFFER_RECORDS,
+    ):
         self.tag_id = tag_id
         self.chamber = initial_chamber
         self.dwell_threshold = dwell_threshold
-        self.dwells = [
-            Dwell(start_time, start_time, CHAMBER_OUTSIDE)
-        ]  # The animal was outside the apparatus before the experiment.
-        self._dwell_starts = [start_time]
+        if spill_path:
+            self.dwells = _SpilledDwells(spill_path, spill_buffer_records)
+            self._dwell_starts = _SpilledDwellStarts(self.dwells)
+        else:
+            self.dwells = []
+            self._dwell_starts = []
+        # The animal was outside the apparatus before the experiment.
+        self.dwells.append(Dwell(start_time, start_time, CHAMBER_OUTSIDE))
+        self._dwell_starts.append(start_time)
         # The animal passes into the initial chamber at the start time.
         self.priorRead = Read(tag_id, start_time, Antenna(CHAMBER_OUTSIDE, initial_chamber))
 
@@ -236,6 +398,12 @@ class _AnimalTrajectory:
         self.priorRead = read
         return fate
 
+    def finish(self) -> None:
+        """Called when no more reads will arrive.  Spilled dwells are flushed to
+        disk and memory-mapped for reading."""
+        if isinstance(self.dwells, _SpilledDwells):
+            self.dwells.close()
+
     def traversals(self) -> Generator[Traversal, None, None]:
         """
         Represent the animal's Trajectory as a series of Traversals
@@ -246,11 +414,13 @@ class _AnimalTrajectory:
             order.
         """
         # Neglect the first "Dwell", which was outside the apparatus
+        prior_chamber = None
         for (i, d) in enumerate(self.dwells):
             if i:
                 yield Traversal(
-                    d.start, self.tag_id, self.dwells[i - 1].chamber, d.chamber
+                    d.start, self.tag_id, prior_chamber, d.chamber
                 )
+            prior_chamber = d.chamber
 
     def long_dwells(self) -> Generator[LongDwell, None, None]:
         for d in self.dwells:
@@ -301,6 +471,34 @@ class _AnimalTrajectory:
                 chambers.append(d.chamber)
         return chambers
 
+    def get_locations_around(
+        self, times: Sequence[TimestampSeconds], before: float, after: float
+    ) -> List[List[str]]:
+        """get_locations_between(t - before, t + after) for each of the given
+        times, which must be in increasing order.
+
+        The windows are answered in a single forward pass over the dwells,
+        bisecting only the dwells after the previous window's.
+        """
+        result = []
+        dwells = self.dwells
+        starts = self._dwell_starts
+        # The last dwell starting at or before the current window start.
+        first = 0
+        for t in times:
+            window_start = t - before
+            window_end = t + after
+            first = max(first, bisect_right(starts, window_start, first) - 1)
+            chambers = []
+            for i in range(first, len(dwells)):
+                d = dwells[i]
+                if d.start >= window_end:
+                    break
+                if min(d.end, window_end) > max(d.start, window_start):
+                    chambers.append(d.chamber)
+            result.append(chambers)
+        return result
+
     def count_traversals_between(
         self, analysis_start_time: TimestampSeconds, analysis_end_time: TimestampSeconds
     ) -> int:
@@ -317,6 +515,12 @@ class AllAnimalTrajectories:
     """
     Tracks the trajectories of all animals through the apparatus, based on
     a sequence of antenna reads.
+
+    If `spill_dir` is given, each animal's dwells are streamed to a binary file
+    rather than held in memory.  The files are kept in a new directory inside
+    `spill_dir`, so that concurrent runs sharing it do not collide, until
+    `close()` is called.  Each animal then holds at most `spill_buffer_records`
+    finished dwells in memory, however long the experiment.
     """
 
     def __init__(
@@ -326,9 +530,22 @@ class AllAnimalTrajectories:
         tag_id_to_start_chamber: Dict[TagID, ChamberName],
         reads_per_animal: Dict[TagID, List[Read]],
         dwell_threshold: float,
+        spill_dir: Optional[str] = None,
+        spill_buffer_records: int = SPILL_BUFFER_RECORDS,
     ):
+        self._spill_dir: Optional[str] = None
+        if spill_dir:
+            os.makedirs(spill_dir, exist_ok=True)
+            self._spill_dir = tempfile.mkdtemp(prefix="voletron-", dir=spill_dir)
         self.animalTrajectories = {
-            tag_id: _AnimalTrajectory(tag_id, initialChamber, start_time, dwell_threshold)
+            tag_id: _AnimalTrajectory(
+                tag_id,
+                initialChamber,
+                start_time,
+                dwell_threshold,
+                os.path.join(self._spill_dir, "{}.dwells".format(tag_id)) if self._spill_dir else None,
+                spill_buffer_records,
+            )
             for [tag_id, initialChamber] in tag_id_to_start_chamber.items()
         }
         fate_counts = {member: 0 for fate, member in ReadFate.__members__.items()}
@@ -337,24 +554,42 @@ class AllAnimalTrajectories:
         end_time = max(last_read_timestamps) if last_read_timestamps else analysis_end_time
         end_time = max(end_time, analysis_end_time)
 
-        for [tag_id, reads] in reads_per_animal.items():
-            if len(reads) == 0:
-                continue
-            animalTrajectory = self.animalTrajectories[tag_id]
-            last_read: Read = reads[0]
-            for read in reads:
-                fate = animalTrajectory.update_from_read(read)
+        try:
+            for [tag_id, reads] in reads_per_animal.items():
+                if len(reads) == 0:
+                    continue
+                animalTrajectory = self.animalTrajectories[tag_id]
+                last_read: Read = reads[0]
+                for read in reads:
+                    fate = animalTrajectory.update_from_read(read)
+                    fate_counts[fate] += 1
+                    last_read = read
+                end_read = Read(last_read.tag_id, end_time, last_read.antenna)
+                fate = animalTrajectory.update_from_read(end_read)
                 fate_counts[fate] += 1
-                last_read = read
-            end_read = Read(last_read.tag_id, end_time, last_read.antenna)
-            fate = animalTrajectory.update_from_read(end_read)
-            fate_counts[fate] += 1
+            for animalTrajectory in self.animalTrajectories.values():
+                animalTrajectory.finish()
+        except BaseException:
+            # Don't leave spilled dwells behind.
+            self.close()
+            raise
         count = sum(fate_counts.values())
         self.fate_percent = {
-            key.name: "{:>8} ({:>6.2%})".format(value, value / count)
+            key.name: "{:>8} ({:>6.2%})".format(value, value / count if count else 0.0)
             for key, value in fate_counts.items()
         }
 
+    def close(self) -> None:
+        """Delete the spilled dwells, if any.  The trajectories can't be read
+        afterwards."""
+        if self._spill_dir is None:
+            return
+        for trajectory in self.animalTrajectories.values():
+            if isinstance(trajectory.dwells, _SpilledDwells):
+                trajectory.dwells.remove()
+        shutil.rmtree(self._spill_dir, ignore_errors=True)
+        self._spill_dir = None
+
     def traversals(self) -> Iterator[Traversal]:
         """
         Provides all Traversals of all animals through the apparatus, in
@@ -377,3 +612,8 @@ class AllAnimalTrajectories:
 
     def get_locations_between(self, tag_id: TagID, start: TimestampSeconds, end: TimestampSeconds) -> List[str]:
         return self.animalTrajectories[tag_id].get_locations_between(start, end)
+
+    def get_locations_around(
+        self, tag_id: TagID, times: Sequence[TimestampSeconds], before: float, after: float
+    ) -> List[List[str]]:
+        return self.animalTrajectories[tag_id].get_locations_around(times, before, after)
@@ -13,11 +13,14 @@
 # limitations under the License.
 
 
+import os
+import tempfile
 import unittest
 
 from voletron.parse_olcus import parse_raw_line
 from voletron.types import Antenna, Dwell, LongDwell, Read, Traversal, CHAMBER_OUTSIDE, CHAMBER_ERROR, TagID, ChamberName, TimestampSeconds, DurationMinutes
 from voletron.trajectory import (
+    DWELL_RECORD_BYTES,
     AllAnimalTrajectories,
     ReadFate,
     TwoMissingReadsException,
@@ -372,6 +375,52 @@ class TestAnimalTrajectory(unittest.TestCase):
         self.assertEqual(t.get_locations_between(TimestampSeconds(150), TimestampSeconds(750)), ["CentralA", "Tube1", "CentralA", "Tube2", "Cage2"])
         self.assertEqual(t.get_locations_between(TimestampSeconds(325), TimestampSeconds(610)), ['Tube1', 'CentralA', 'Tube2'])
 
+        # One pass over the dwells gives the same locations for each window.
+        times = [TimestampSeconds(t) for t in (0, 140, 150, 330, 520, 1000, 1200)]
+        self.assertEqual(
+            t.get_locations_around(times, 10, 100),
+            [t.get_locations_between(TimestampSeconds(time - 10), TimestampSeconds(time + 100)) for time in times],
+        )
+
+    def test_spilled_dwells_match_in_memory(self):
+        spill_dir = tempfile.mkdtemp()
+        reads = [
+            Read(TagID("tag_a"), TimestampSeconds(200), Antenna(ChamberName("Tube1"), ChamberName("CentralA"))),
+            Read(TagID("tag_a"), TimestampSeconds(300), Antenna(ChamberName("Tube1"), ChamberName("Cage1"))),
+            Read(TagID("tag_a"), TimestampSeconds(305), Antenna(ChamberName("Tube1"), ChamberName("Cage1"))),
+            Read(TagID("tag_a"), TimestampSeconds(500), Antenna(ChamberName("Tube1"), ChamberName("CentralA"))),
+            Read(TagID("tag_a"), TimestampSeconds(600), Antenna(ChamberName("Tube1"), ChamberName("Cage1"))),
+            Read(TagID("tag_a"), TimestampSeconds(700), Antenna(ChamberName("Tube1"), ChamberName("Cage1"))),
+            Read(TagID("tag_a"), TimestampSeconds(800), Antenna(ChamberName("Tube2"), ChamberName("CentralA"))),
+            Read(TagID("tag_a"), TimestampSeconds(900), Antenna(ChamberName("Tube2"), ChamberName("Cage2"))),
+        ]
+        in_memory = _AnimalTrajectory(TagID("tag_a"), ChamberName("CentralA"), TimestampSeconds(100), 10.0)
+        # A tiny buffer forces most dwells to be written to disk while building.
+        spilled = _AnimalTrajectory(
+            TagID("tag_a"), ChamberName("CentralA"), TimestampSeconds(100), 10.0,
+            os.path.join(spill_dir, "tag_a.dwells"), spill_buffer_records=2
+        )
+        for read in reads:
+            in_memory.update_from_read(read)
+            spilled.update_from_read(read)
+            self.assertEqual(spilled.dwells, in_memory.dwells)
+        # Dwells were written out while the trajectory was still being built.
+        self.assertEqual(os.path.getsize(os.path.join(spill_dir, "tag_a.dwells")), 6 * DWELL_RECORD_BYTES)
+        spilled.finish()
+
+        self.assertEqual(os.path.getsize(os.path.join(spill_dir, "tag_a.dwells")), 7 * DWELL_RECORD_BYTES)
+        self.assertEqual(list(spilled.dwells), in_memory.dwells)
+        self.assertEqual(spilled.dwells[-1], in_memory.dwells[-1])
+        self.assertEqual(list(spilled.traversals()), list(in_memory.traversals()))
+        self.assertEqual(
+            dict(spilled.time_per_chamber(TimestampSeconds(205), TimestampSeconds(750))),
+            dict(in_memory.time_per_chamber(TimestampSeconds(205), TimestampSeconds(750))),
+        )
+        self.assertEqual(
+            spilled.get_locations_between(TimestampSeconds(325), TimestampSeconds(610)),
+            in_memory.get_locations_between(TimestampSeconds(325), TimestampSeconds(610)),
+        )
+
  
 class TestAllAnimalTrajectories(unittest.TestCase):
     @classmethod
@@ -421,6 +470,75 @@ class TestAllAnimalTrajectories(unittest.TestCase):
             ],
         )
 
+    def test_spill_dir_is_removed(self):
+        spill_dir = tempfile.mkdtemp()
+        tag_id_to_start_chamber = {TagID("tag_a"): ChamberName("CentralA")}
+        reads_per_animal = {
+            TagID("tag_a"): [
+                Read(TagID("tag_a"), TimestampSeconds(200), Antenna(ChamberName("Tube2"), ChamberName("CentralA"))),
+                Read(TagID("tag_a"), TimestampSeconds(400), Antenna(ChamberName("Tube2"), ChamberName("Cage2"))),
+            ],
+        }
+
+        runs = [
+            AllAnimalTrajectories(
+                TimestampSeconds(100), TimestampSeconds(500), tag_id_to_start_chamber, reads_per_animal, 10.0, spill_dir
+            )
+            for _ in range(2)
+        ]
+        # Each run spills to its own directory.
+        run_dirs = os.listdir(spill_dir)
+        self.assertEqual(len(run_dirs), 2)
+        for run_dir in run_dirs:
+            self.assertEqual(os.listdir(os.path.join(spill_dir, run_dir)), ["tag_a.dwells"])
+        self.assertEqual(list(runs[0].traversals()), list(runs[1].traversals()))
+
+        for run in runs:
+            run.close()
+        self.assertEqual(os.listdir(spill_dir), [])
+
+    def test_spilled_outputs_match_in_memory(self):
+        spill_dir = tempfile.mkdtemp()
+        tag_id_to_start_chamber = {TagID("tag_a"): ChamberName("CentralA"), TagID("tag_b"): ChamberName("CentralA")}
+        reads_per_animal = {
+            TagID("tag_a"): [
+                Read(TagID("tag_a"), TimestampSeconds(200), Antenna(ChamberName("Tube2"), ChamberName("CentralA"))),
+                Read(TagID("tag_a"), TimestampSeconds(400), Antenna(ChamberName("Tube2"), ChamberName("Cage2"))),
+                Read(TagID("tag_a"), TimestampSeconds(600), Antenna(ChamberName("Tube2"), ChamberName("Cage2"))),
+                Read(TagID("tag_a"), TimestampSeconds(800), Antenna(ChamberName("Tube2"), ChamberName("CentralA"))),
+                Read(TagID("tag_a"), TimestampSeconds(1000), Antenna(ChamberName("Tube4"), ChamberName("CentralA"))),
+            ],
+            TagID("tag_b"): [
+                Read(TagID("tag_b"), TimestampSeconds(300), Antenna(ChamberName("Tube3"), ChamberName("CentralA"))),
+                Read(TagID("tag_b"), TimestampSeconds(500), Antenna(ChamberName("Tube3"), ChamberName("Cage3"))),
+                Read(TagID("tag_b"), TimestampSeconds(2500), Antenna(ChamberName("Tube3"), ChamberName("Cage3"))),
+            ],
+        }
+        in_memory = AllAnimalTrajectories(
+            TimestampSeconds(100), TimestampSeconds(3000), tag_id_to_start_chamber, reads_per_animal, 10.0
+        )
+        # With a one-dwell buffer, all but the last dwell of each animal are
+        # written out as soon as they are finished.
+        spilled = AllAnimalTrajectories(
+            TimestampSeconds(100), TimestampSeconds(3000), tag_id_to_start_chamber, reads_per_animal, 10.0,
+            spill_dir, spill_buffer_records=1
+        )
+        try:
+            self.assertEqual(list(spilled.traversals()), list(in_memory.traversals()))
+            for tag_id in tag_id_to_start_chamber:
+                (spilled_trajectory, trajectory) = (spilled.animalTrajectories[tag_id], in_memory.animalTrajectories[tag_id])
+                self.assertEqual(list(spilled_trajectory.long_dwells()), list(trajectory.long_dwells()))
+                self.assertEqual(
+                    dict(spilled_trajectory.time_per_chamber(TimestampSeconds(150), TimestampSeconds(2000))),
+                    dict(trajectory.time_per_chamber(TimestampSeconds(150), TimestampSeconds(2000))),
+                )
+                self.assertEqual(
+                    spilled.get_locations_around(tag_id, [TimestampSeconds(450), TimestampSeconds(900)], 60, 60),
+                    in_memory.get_locations_around(tag_id, [TimestampSeconds(450), TimestampSeconds(900)], 60, 60),
+                )
+        finally:
+            spilled.close()
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -19,6 +19,9 @@ TagID = NewType('TagID', str)
 
 GroupID = NewType('GroupID', frozenset) # frozenset[TagID]
 
+# A group of animals, as a bitmask over animal indexes; see tag_index.TagIndex.
+GroupMask = NewType('GroupMask', int)
+
 AnimalName = NewType('AnimalName', str)
 
 HabitatName = NewType('HabitatName', str)
@@ -55,8 +58,9 @@ Validation = NamedTuple(
 Dwell = NamedTuple("Dwell", [("start", TimestampSeconds), ("end", TimestampSeconds), ("chamber", ChamberName)])
 
 # Describes pairs or groups of animals together in a given chamber during a
-# given time span.
-CoDwell = NamedTuple("CoDwell", [("tag_ids", List[TagID]), ("start", TimestampSeconds), ("end", TimestampSeconds), ("chamber", ChamberName)])
+# given time span.  The group members are given as a bitmask; see
+# tag_index.TagIndex.
+CoDwell = NamedTuple("CoDwell", [("group", GroupMask), ("start", TimestampSeconds), ("end", TimestampSeconds), ("chamber", ChamberName)])
 # An instance of an animal staying put for a very long time, which likely
 # indicates an error of some kind.
 LongDwell = NamedTuple(
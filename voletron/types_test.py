@@ -23,6 +23,7 @@ from voletron.types import (
     DurationSeconds,
     Dwell,
     GroupDwellAggregate,
+    GroupMask,
     LongDwell,
     Read,
     TagID,
@@ -59,8 +60,8 @@ class TestStructs(unittest.TestCase):
         self.assertEqual(d.chamber, "cage1")
 
     def test_codwell_instantiation(self):
-        cd = CoDwell(tag_ids=[TagID("tag1"), TagID("tag2")], start=TimestampSeconds(100), end=TimestampSeconds(200), chamber=ChamberName("cage1"))
-        self.assertEqual(cd.tag_ids, ["tag1", "tag2"])
+        cd = CoDwell(group=GroupMask(0b11), start=TimestampSeconds(100), end=TimestampSeconds(200), chamber=ChamberName("cage1"))
+        self.assertEqual(cd.group, 0b11)
         self.assertEqual(cd.start, 100)
         self.assertEqual(cd.end, 200)
         self.assertEqual(cd.chamber, "cage1")